@@ -1,5 +1,7 @@
 import { mutation, query } from "./_generated/server";
 import { v } from "convex/values";
+import { traits } from "./schema";
+import { applyFeedToDaemon } from "./feeds";
 
 export const get = query({ 
     args: { id: v.id("daemons") },
@@ -37,6 +39,19 @@ export const updateTraits = mutation({
     },
 });
 
+// Aggregated trait deltas of feedCount feeds completed with deferDaemonUpdate
+export const applyFeedDeltas = mutation({
+    args: {
+        daemonId: v.id("daemons"),
+        traitsDelta: traits,
+        feedCount: v.number(),
+        now: v.number(),
+    },
+    handler: async (ctx, args) => {
+        return await applyFeedToDaemon(ctx, args.daemonId, args.traitsDelta, args.now, args.feedCount);
+    },
+});
+
 export const ensureSeed = mutation({
     handler: async (ctx) => {
         const existing = await ctx.db.query("daemons").collect();
@@ -1,9 +1,81 @@
-import { mutation, query } from "./_generated/server";
+import { mutation, query, MutationCtx } from "./_generated/server";
+import { Id } from "./_generated/dataModel";
 import { v } from "convex/values";
+import { traits } from "./schema";
 
 // Helper thresholds per stage code: 0=Egg, 1=Baby, 2=Teen, 3=Adult
 const FEED_THRESHOLDS: Record<number, number> = { 0: 5, 1: 8, 2: 12, 3: 12 };
 
+const ZERO_TRAITS = {
+  Intelligence: 0,
+  Creativity: 0,
+  Empathy: 0,
+  Resilience: 0,
+  Curiosity: 0,
+  Humor: 0,
+  Kindness: 0,
+  Confidence: 0,
+  Discipline: 0,
+  Honesty: 0,
+  Patience: 0,
+  Optimism: 0,
+  Courage: 0,
+  OpenMindedness: 0,
+  Prudence: 0,
+  Adaptability: 0,
+  Gratitude: 0,
+  Ambition: 0,
+  Humility: 0,
+  Playfulness: 0,
+};
+
+// Apply trait deltas to daemon and perform evolution threshold logic.
+// feedCount > 1 applies an aggregate of several feeds (write-behind flush);
+// each feed still counts towards evolution, so one flush can cross several
+// thresholds.
+export async function applyFeedToDaemon(
+  ctx: MutationCtx,
+  daemonId: Id<"daemons">,
+  traitsDelta: Record<string, number>,
+  now: number,
+  feedCount = 1,
+) {
+  const daemon = await ctx.db.get(daemonId);
+  if (!daemon) throw new Error("Daemon not found for feed");
+
+  const newTraits = { ...daemon.traits };
+  for (const key of Object.keys(traitsDelta)) {
+    // @ts-ignore
+    newTraits[key] = (newTraits[key] || 0) + traitsDelta[key];
+  }
+
+  let feedsSince = daemon.feedsSinceEvolution || 0;
+  let stage = daemon.stage || 0;
+  let evolved = false;
+  for (let i = 0; i < feedCount; i++) {
+    feedsSince += 1;
+    const threshold = FEED_THRESHOLDS[stage] ?? 12;
+    if (feedsSince >= threshold && stage < 3) {
+      stage += 1; // advance stage
+      feedsSince = 0; // reset counter after evolution
+      evolved = true;
+    }
+  }
+
+  await ctx.db.patch(daemonId, {
+    traits: newTraits,
+    feedsSinceEvolution: feedsSince,
+    stage,
+    lastUpdated: now,
+  });
+
+  return {
+    evolved,
+    stage,
+    feedsSinceEvolution: feedsSince,
+  };
+}
+
 export const getByFeedId = query({
   args: { feedId: v.string() },
   handler: async (ctx, args) => {
@@ -15,6 +87,15 @@ export const getByFeedId = query({
   },
 });
 
+// Newest completed feed ids, used by the server to warm its idempotency filter
+export const recentCompletedIds = query({
+  args: { limit: v.number() },
+  handler: async (ctx, args) => {
+    const recent = await ctx.db.query("feeds").order("desc").take(args.limit);
+    return recent.filter((f) => f.status === "completed").map((f) => f.feedId);
+  },
+});
+
 export const startProcessing = mutation({
   args: {
     feedId: v.string(),
@@ -39,28 +120,7 @@ export const startProcessing = mutation({
       source: args.source,
       status: "processing",
       contentSummary: args.contentSummary,
-      traitsDelta: {
-        Intelligence: 0,
-        Creativity: 0,
-        Empathy: 0,
-        Resilience: 0,
-        Curiosity: 0,
-        Humor: 0,
-        Kindness: 0,
-        Confidence: 0,
-        Discipline: 0,
-        Honesty: 0,
-        Patience: 0,
-        Optimism: 0,
-        Courage: 0,
-        OpenMindedness: 0,
-        Prudence: 0,
-        Adaptability: 0,
-        Gratitude: 0,
-        Ambition: 0,
-        Humility: 0,
-        Playfulness: 0,
-      },
+      traitsDelta: ZERO_TRAITS,
       roast: "",
       attachmentsMeta: args.attachmentsMeta,
       createdAt: args.now,
@@ -101,6 +161,8 @@ export const complete = mutation({
     now: v.number(),
     newArchetypeId: v.optional(v.string()),
     topTraits: v.optional(v.array(v.string())),
+    // Leave the daemon document to a later daemons:applyFeedDeltas call
+    deferDaemonUpdate: v.optional(v.boolean()),
   },
   handler: async (ctx, args) => {
     const feed = await ctx.db
@@ -108,6 +170,8 @@ export const complete = mutation({
       .withIndex("by_feedId", (q) => q.eq("feedId", args.feedId))
       .first();
     if (!feed) throw new Error("Feed not found");
+    // Redelivered completion: report it instead of applying the deltas twice
+    if (feed.status === "completed") return { duplicate: true };
     if (feed.status !== "processing") throw new Error("Invalid status transition");
 
     // Update feed record to completed
@@ -119,51 +183,84 @@ export const complete = mutation({
       errorMessage: undefined,
     });
 
-    // Apply trait deltas to daemon and perform evolution threshold logic
-    const daemon = await ctx.db.get(feed.daemonId);
-    if (!daemon) throw new Error("Daemon not found for feed");
-
-    const newTraits = { ...daemon.traits };
-    for (const key of Object.keys(args.traitsDelta)) {
-      // @ts-ignore
-      newTraits[key] = (newTraits[key] || 0) + (args.traitsDelta as any)[key];
-    }
-
-    let feedsSince = (daemon.feedsSinceEvolution || 0) + 1;
-    let stage = daemon.stage || 0;
-    let evolved = false;
-    const threshold = FEED_THRESHOLDS[stage] ?? 12;
-    if (feedsSince >= threshold && stage < 3) {
-      stage += 1; // advance stage
-      feedsSince = 0; // reset counter after evolution
-      evolved = true;
-    }
-
-    // Build patch object with archetype data if provided
-    const daemonPatch: any = {
-      traits: newTraits,
-      feedsSinceEvolution: feedsSince,
-      stage,
-      lastUpdated: args.now,
-    };
+    if (args.deferDaemonUpdate) return { duplicate: false, deferred: true };
+    const applied = await applyFeedToDaemon(ctx, feed.daemonId, args.traitsDelta, args.now);
 
     // Update archetype if provided
+    const archetypePatch: any = {};
     if (args.newArchetypeId) {
-      daemonPatch.archetypeId = args.newArchetypeId;
-      daemonPatch.lastArchetypeUpdate = args.now;
+      archetypePatch.archetypeId = args.newArchetypeId;
+      archetypePatch.lastArchetypeUpdate = args.now;
     }
     if (args.topTraits) {
-      daemonPatch.topTraits = args.topTraits;
+      archetypePatch.topTraits = args.topTraits;
+    }
+    if (Object.keys(archetypePatch).length > 0) {
+      await ctx.db.patch(feed.daemonId, archetypePatch);
     }
 
-    await ctx.db.patch(feed.daemonId, daemonPatch);
+    return { ...applied, archetypeId: args.newArchetypeId };
+  },
+});
+
+// Single round trip for an analyzed feed: idempotent insert of the completed
+// record, delta application and evolution step in one transaction
+export const ingest = mutation({
+  args: {
+    feedId: v.string(),
+    daemonId: v.id("daemons"),
+    source: v.union(v.literal("email"), v.literal("drag-drop")),
+    contentSummary: v.string(),
+    attachmentsMeta: v.any(),
+    traitsDelta: traits,
+    roast: v.string(),
+    now: v.number(),
+    startedAt: v.optional(v.number()),
+    // Leave the daemon document to a later daemons:applyFeedDeltas call
+    deferDaemonUpdate: v.optional(v.boolean()),
+  },
+  handler: async (ctx, args) => {
+    const existing = await ctx.db
+      .query("feeds")
+      .withIndex("by_feedId", (q) => q.eq("feedId", args.feedId))
+      .first();
+    if (existing?.status === "completed") return { duplicate: true };
+    if (existing && existing.status !== "processing") throw new Error("Invalid status transition");
+
+    if (existing) {
+      // Started through the two-phase path; finish it here
+      await ctx.db.patch(existing._id, {
+        status: "completed",
+        traitsDelta: args.traitsDelta,
+        roast: args.roast,
+        completedAt: args.now,
+        errorMessage: undefined,
+      });
+    } else {
+      await ctx.db.insert("feeds", {
+        feedId: args.feedId,
+        daemonId: args.daemonId,
+        source: args.source,
+        status: "completed",
+        contentSummary: args.contentSummary,
+        traitsDelta: args.traitsDelta,
+        roast: args.roast,
+        attachmentsMeta: args.attachmentsMeta,
+        createdAt: args.startedAt ?? args.now,
+        startedAt: args.startedAt ?? args.now,
+        completedAt: args.now,
+        errorMessage: undefined,
+      });
+    }
 
-    return {
-      evolved,
-      stage,
-      feedsSinceEvolution: feedsSince,
-      archetypeId: args.newArchetypeId,
-    };
+    if (args.deferDaemonUpdate) return { duplicate: false, deferred: true };
+    const applied = await applyFeedToDaemon(
+      ctx,
+      existing ? existing.daemonId : args.daemonId,
+      args.traitsDelta,
+      args.now,
+    );
+    return { duplicate: false, ...applied };
   },
 });
 
@@ -172,12 +269,34 @@ export const errored = mutation({
     feedId: v.string(),
     errorMessage: v.string(),
     now: v.number(),
+    // Optional record fields: when given, a missing feed (single-call ingest
+    // path) is created directly in the errored state
+    daemonId: v.optional(v.id("daemons")),
+    source: v.optional(v.union(v.literal("email"), v.literal("drag-drop"))),
+    contentSummary: v.optional(v.string()),
+    attachmentsMeta: v.optional(v.any()),
   },
   handler: async (ctx, args) => {
     const feed = await ctx.db
       .query("feeds")
       .withIndex("by_feedId", (q) => q.eq("feedId", args.feedId))
       .first();
+    if (!feed && args.daemonId && args.source) {
+      return await ctx.db.insert("feeds", {
+        feedId: args.feedId,
+        daemonId: args.daemonId,
+        source: args.source,
+        status: "errored",
+        contentSummary: args.contentSummary ?? "",
+        traitsDelta: ZERO_TRAITS,
+        roast: "",
+        attachmentsMeta: args.attachmentsMeta,
+        createdAt: args.now,
+        startedAt: args.now,
+        completedAt: args.now,
+        errorMessage: args.errorMessage,
+      });
+    }
     if (!feed) throw new Error("Feed not found");
     if (feed.status !== "processing") throw new Error("Invalid status transition");
     await ctx.db.patch(feed._id, {
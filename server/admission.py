@@ -0,0 +1,125 @@
+"""
+Admission control for the expensive endpoints.
+
+Each controller admits up to `max_concurrency` requests at once and lets up
+to `max_queue` more wait for a slot. Anything beyond that is shed
+immediately with 429; a request that waits longer than `queue_timeout` is
+shed with 503. Both carry a Retry-After header.
+
+A controller also reports sustained overload (requests have been queueing
+or shed continuously for `degrade_after` seconds, without the endpoint going
+idle) so callers can switch to a cheaper code path instead of adding to the
+backlog.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from metrics import REGISTRY
+
+ADMISSION_SHED = REGISTRY.counter(
+    "admission_shed_total", "Requests rejected by admission control", ("endpoint", "reason"),
+)
+ADMISSION_DEGRADED = REGISTRY.counter(
+    "admission_degraded_total", "Requests served on the degraded path", ("endpoint",),
+)
+
+
+class AdmissionController:
+    """Concurrency cap plus bounded wait queue for one endpoint."""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float = 10.0,
+        retry_after: int = 5,
+        degrade_after: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.degrade_after = degrade_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self._overloaded_since: Optional[float] = None
+
+    def _shed(self, status_code: int, reason: str) -> HTTPException:
+        ADMISSION_SHED.inc(endpoint=self.name, reason=reason)
+        if self._overloaded_since is None:
+            self._overloaded_since = time.monotonic()
+        return HTTPException(
+            status_code=status_code,
+            detail=f"{self.name} is overloaded; retry later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Hold a slot for the duration of the block.
+
+        Raises:
+            HTTPException: 429 if the wait queue is full, 503 if no slot
+                frees up within queue_timeout
+        """
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._shed(429, "queue_full")
+            if self._overloaded_since is None:
+                self._overloaded_since = time.monotonic()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._shed(503, "queue_timeout")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+            # A request that got a slot without waiting ends the overload episode
+            self._overloaded_since = None
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            if self.active == 0 and self.waiting == 0:
+                self._overloaded_since = None
+
+    @property
+    def degraded(self) -> bool:
+        """True once overload has persisted for degrade_after seconds."""
+        if self.degrade_after is None or self._overloaded_since is None:
+            return False
+        return time.monotonic() - self._overloaded_since >= self.degrade_after
+
+    def note_degraded(self) -> None:
+        ADMISSION_DEGRADED.inc(endpoint=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "maxConcurrency": self.max_concurrency,
+            "maxQueue": self.max_queue,
+            "degraded": self.degraded,
+            "shed": {
+                reason: ADMISSION_SHED.value(endpoint=self.name, reason=reason)
+                for reason in ("queue_full", "queue_timeout")
+            },
+            "degradedServed": ADMISSION_DEGRADED.value(endpoint=self.name),
+        }
@@ -0,0 +1,199 @@
+"""
+Spill-to-disk storage for email attachments.
+
+Base64 attachment bodies are decoded in fixed-size chunks straight into a
+content-addressed file, so a large photo never exists as a second decoded
+copy in memory. Downstream code only sees metadata and a `sha256:` reference
+that can be resolved back to the file (or a read-only memory map of it).
+"""
+
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_IMAGE_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif"}
+
+# Characters of base64 decoded per step (a multiple of 4)
+_CHUNK_CHARS = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when a decoded attachment exceeds the configured size cap."""
+
+
+class AttachmentStore:
+    """Content-addressed directory of decoded attachments."""
+
+    def __init__(self, directory: str, max_bytes: int = 20 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Decoded bytes written since the last purge, used to trigger an early one
+        self.spilled_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, ref: str) -> str:
+        digest = ref.split(":", 1)[-1]
+        return os.path.join(self.directory, digest)
+
+    def spill_base64(self, data: str) -> Tuple[str, int]:
+        """
+        Decode a base64 string to disk incrementally.
+
+        Whitespace and a leading data-URL prefix are tolerated.
+
+        Args:
+            data: Base64-encoded attachment body
+
+        Returns:
+            Tuple of (reference, decoded size in bytes)
+
+        Raises:
+            AttachmentTooLarge: If the decoded body exceeds max_bytes
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                digest, size = decode_base64_to(data, out, self.max_bytes)
+            ref = f"sha256:{digest}"
+            os.replace(tmp_path, self.path_for(ref))
+            self.spilled_bytes += size
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return ref, size
+
+    def open_mapped(self, ref: str) -> Optional[mmap.mmap]:
+        """Return a read-only memory map of a stored attachment, or None if it is gone."""
+        try:
+            with open(self.path_for(ref), "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+    def purge(self, max_age_seconds: float, max_total_bytes: int = 0) -> int:
+        """
+        Delete stored attachments older than max_age_seconds.
+
+        With max_total_bytes set, the oldest remaining attachments are also
+        deleted until the store fits. Returns the count removed.
+        """
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        kept: List[Tuple[float, int, str]] = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+                elif not name.endswith(".part"):
+                    kept.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        total = sum(size for _mtime, size, _path in kept)
+        if max_total_bytes and total > max_total_bytes:
+            for _mtime, size, path in sorted(kept):
+                if total <= max_total_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+        self.spilled_bytes = 0
+        return removed
+
+
+def decode_base64_to(data: str, out: BinaryIO, max_bytes: int) -> Tuple[str, int]:
+    """
+    Decode a base64 string into `out` in fixed-size chunks.
+
+    Returns:
+        Tuple of (sha256 hex digest, decoded size in bytes)
+
+    Raises:
+        AttachmentTooLarge: If the decoded body exceeds max_bytes
+    """
+    start = 0
+    if data.startswith("data:"):
+        start = data.find(",") + 1
+    # Cheap upper-bound check before decoding anything
+    if (len(data) - start) * 3 // 4 > max_bytes * 1.05:
+        raise AttachmentTooLarge(f"attachment exceeds {max_bytes} bytes")
+
+    digest = hashlib.sha256()
+    size = 0
+    pending = ""
+    for offset in range(start, len(data), _CHUNK_CHARS):
+        piece = data[offset:offset + _CHUNK_CHARS]
+        # MIME bodies wrap lines; drop whitespace before aligning to 4 chars
+        if "\n" in piece or "\r" in piece or " " in piece:
+            piece = "".join(piece.split())
+        pending += piece
+        usable = len(pending) - len(pending) % 4
+        if not usable:
+            continue
+        chunk = base64.b64decode(pending[:usable])
+        pending = pending[usable:]
+        size += len(chunk)
+        if size > max_bytes:
+            raise AttachmentTooLarge(f"attachment exceeds {max_bytes} bytes")
+        digest.update(chunk)
+        out.write(chunk)
+    if pending:
+        chunk = base64.b64decode(pending + "=" * (-len(pending) % 4))
+        size += len(chunk)
+        digest.update(chunk)
+        out.write(chunk)
+    return digest.hexdigest(), size
+
+
+def spill_attachment(store: AttachmentStore, att: Dict[str, Any], content_type: str) -> Dict[str, Any]:
+    """
+    Replace an attachment's inline body with a stored reference.
+
+    The base64 body is popped from `att` so the webhook payload stops
+    holding it once decoding finishes.
+
+    Args:
+        store: Destination store
+        att: Raw attachment dict from the webhook payload
+        content_type: Normalized MIME type
+
+    Returns:
+        Metadata dict safe to pass to Convex and the analysis pipeline
+    """
+    body = att.pop("base64", None) or att.pop("content", None)
+    meta: Dict[str, Any] = {
+        "filename": att.get("filename"),
+        "contentType": content_type,
+        "size": att.get("size"),
+        "url": att.get("url"),
+    }
+    if not body:
+        return meta
+    try:
+        ref, size = store.spill_base64(body)
+    except AttachmentTooLarge as e:
+        logger.warning(f"Skipping attachment {meta['filename']!r}: {e}")
+        meta["skipped"] = "too_large"
+        return meta
+    except (ValueError, OSError) as e:
+        logger.warning(f"Skipping attachment {meta['filename']!r}: {e}")
+        meta["skipped"] = "unreadable"
+        return meta
+    meta["size"] = size
+    meta["ref"] = ref
+    return meta
@@ -0,0 +1,140 @@
+"""
+Microbenchmarks for the pure-Python hot paths of the server.
+
+Each benchmark makes one pass over its fixtures (webhook files, generated
+trait vectors, LLM outputs, roasts) and reports the best-of-repeat time per
+pass. Results can be saved as a baseline and later runs compared against
+it; a comparison exits with status 1 when any benchmark is slower than its
+baseline by more than the threshold.
+
+Usage (from server/):
+    python benchmarks/bench_hot_paths.py                       # print timings
+    python benchmarks/bench_hot_paths.py --save                # record benchmarks/baseline.json
+    python benchmarks/bench_hot_paths.py --compare             # compare against it
+    python benchmarks/bench_hot_paths.py --filter archetype --repeat 9 --json
+"""
+
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# main.py is imported for its webhook helpers; keep it offline and quiet
+os.environ.setdefault("MOCK_MODE", "true")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("ATTACHMENT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "data-daemons-bench-attachments"))
+
+import fixtures  # noqa: E402
+from harness import compare, load_baseline, save_baseline, time_call  # noqa: E402
+from stubs import MemoryAttachmentStore  # noqa: E402
+
+from archetypes import ARCHETYPES, assign_archetype, cosine_similarity, normalize_traits  # noqa: E402
+from llm_providers import LLMResponse  # noqa: E402
+from personality import build_personality_context  # noqa: E402
+from prompt_builder import build_analysis_prompt  # noqa: E402
+from schemas import AnalyzeResponse, PersonalityTraits  # noqa: E402
+from validators import validate_roast  # noqa: E402
+import main  # noqa: E402
+
+# Spilled attachments stay in memory: file creation and renames would make
+# whitelist_attachments a filesystem benchmark with run-to-run noise
+main.attachment_store = MemoryAttachmentStore()
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def build_benchmarks():
+    """
+    Return (name, fn, arg[, setup]) tuples; fn(arg) is one timed pass.
+
+    Benchmarks whose fn mutates its input add a setup that copies it, so
+    every pass sees the original fixtures.
+    """
+    traits = [PersonalityTraits(values=v) for v in fixtures.trait_vectors()]
+    normalized = [normalize_traits(v) for v in fixtures.trait_vectors()]
+    centroids = [a.trait_centroid for a in ARCHETYPES]
+    texts = [json.loads(raw).get("text", "") for _name, raw in fixtures.load_fixtures()]
+    prompt_inputs = [(texts[i % len(texts)], traits[i]) for i in range(len(traits))]
+    responses = [LLMResponse(content) for content in fixtures.llm_outputs()]
+    analyze_kwargs = [
+        {
+            "caption": text[:64],
+            "tags": ["text", "long"],
+            "roast": "Guardian says: Your vibe screams mystery — try harder.",
+            "traitDeltas": [{"trait": k, "delta": i % 4} for i, k in enumerate(fixtures.TRAIT_KEYS)],
+            "newArchetypeId": "guardian",
+            "topTraits": ["Empathy", "Kindness", "Patience"],
+        }
+        for text in texts
+    ]
+
+    return [
+        ("cosine_similarity", lambda vs: [cosine_similarity(v, c) for v in vs for c in centroids], normalized),
+        ("assign_archetype", lambda ts: [assign_archetype(t, "guardian") for t in ts], traits),
+        ("build_personality_context", lambda ts: [build_personality_context(t, "guardian") for t in ts], traits),
+        ("build_analysis_prompt", lambda xs: [build_analysis_prompt(text, None, t, "guardian") for text, t in xs], prompt_inputs),
+        ("llm_parse_json", lambda rs: [r.parse_json() for r in rs], responses),
+        ("extract_message_fields", lambda ps: [main._extract_message_fields(p) for p in ps], fixtures.webhook_payloads()),
+        # Spilling pops the inline bodies, so each pass needs fresh attachment dicts
+        (
+            "whitelist_attachments",
+            lambda ls: [main._whitelist_attachments(a) for a in ls],
+            fixtures.attachment_lists(),
+            copy.deepcopy,
+        ),
+        ("validate_roast", lambda rs: [validate_roast(r) for r in rs], fixtures.roasts()),
+        ("analyze_response_model", lambda ks: [AnalyzeResponse(**k) for k in ks], analyze_kwargs),
+    ]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="Write results as a baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="Compare against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    # Validation warnings on the fallback roasts would flood the output
+    logging.getLogger("validators").setLevel(logging.ERROR)
+
+    results = {}
+    for name, fn, arg, *setup in build_benchmarks():
+        if args.filter in name:
+            results[name] = time_call(fn, arg, args.repeat, *setup)
+
+    rows = None
+    if args.compare:
+        rows = compare(results, load_baseline(args.compare), args.threshold)
+
+    if args.json:
+        print(json.dumps({"results": results, "comparison": rows}, indent=2))
+    elif rows is not None:
+        print(f"{'benchmark':28} {'baseline us':>12} {'current us':>12} {'ratio':>7}  status")
+        for row in rows:
+            before = f"{row['baseline'] * 1e6:12.1f}" if row["baseline"] is not None else f"{'-':>12}"
+            ratio = f"{row['ratio']:7.2f}" if row["ratio"] is not None else f"{'-':>7}"
+            print(f"{row['name']:28} {before} {row['current'] * 1e6:12.1f} {ratio}  {row['status']}")
+    else:
+        print(f"{'benchmark':28} {'us/pass':>12}")
+        for name, seconds in results.items():
+            print(f"{name:28} {seconds * 1e6:12.1f}")
+
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"Baseline written to {args.save}", file=sys.stderr)
+
+    if rows is not None and any(row["status"] == "regressed" for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
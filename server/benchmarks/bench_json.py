@@ -0,0 +1,52 @@
+"""
+Benchmark webhook JSON parsing and response serialization.
+
+Compares the previous stdlib path (decode to str, then json.loads) with
+fast_json on the repository's test-webhook-*.json fixtures and on
+synthetic payloads carrying large base64 attachments.
+
+Usage (from server/):
+    python benchmarks/bench_json.py [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fast_json  # noqa: E402
+from fixtures import attachment_payload, load_fixtures  # noqa: E402
+from harness import time_call  # noqa: E402
+
+
+def stdlib_parse(raw: bytes):
+    return json.loads(raw.decode("utf-8", errors="ignore"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = load_fixtures()
+    for size in (256 * 1024, 2 * 1024 * 1024, 20 * 1024 * 1024):
+        cases.append((f"attachment-{size // 1024}KiB", attachment_payload(size)))
+
+    print(f"orjson available: {fast_json.HAS_ORJSON}")
+    print(f"{'case':40} {'bytes':>10} {'stdlib us':>12} {'fast us':>12} {'speedup':>8}")
+    for name, raw in cases:
+        slow = time_call(stdlib_parse, raw, args.repeat)
+        fast = time_call(fast_json.loads_lenient, raw, args.repeat)
+        print(f"{name:40} {len(raw):>10} {slow * 1e6:>12.1f} {fast * 1e6:>12.1f} {slow / fast:>7.1f}x")
+
+    response = {"status": "success", "feedId": "test-nova-routing-002", "daemonId": "abc123", "source": "email"}
+    slow = time_call(lambda r: json.dumps(r).encode("utf-8"), response, args.repeat)
+    fast = time_call(fast_json.dumps, response, args.repeat)
+    print(f"{'response serialization':40} {'':>10} {slow * 1e6:>12.1f} {fast * 1e6:>12.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Shared inputs for the benchmarks.
+
+Webhook fixtures come from the repository's test-webhook-*.json files;
+everything else is generated from a fixed seed so runs are comparable.
+"""
+
+import base64
+import glob
+import json
+import os
+import random
+from typing import Any, Dict, List, Tuple
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+TRAIT_KEYS = [
+    "Intelligence", "Creativity", "Empathy", "Resilience", "Curiosity",
+    "Humor", "Kindness", "Confidence", "Discipline", "Honesty",
+    "Patience", "Optimism", "Courage", "OpenMindedness", "Prudence",
+    "Adaptability", "Gratitude", "Ambition", "Humility", "Playfulness",
+]
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def load_fixtures() -> List[Tuple[str, bytes]]:
+    """Return (name, raw bytes) pairs for the webhook fixtures."""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(REPO_ROOT, "test-webhook-*.json"))):
+        with open(path, "rb") as f:
+            fixtures.append((os.path.basename(path), f.read()))
+    return fixtures
+
+
+def webhook_payloads() -> List[Dict[str, Any]]:
+    """Fixtures in the three shapes _extract_message_fields accepts."""
+    payloads: List[Dict[str, Any]] = []
+    for _name, raw in load_fixtures():
+        flat = json.loads(raw)
+        payloads.append(flat)
+        payloads.append({"message": flat})
+        payloads.append({"event_type": "message.received", "message": flat})
+    return payloads
+
+
+def attachment_payload(size_bytes: int) -> bytes:
+    """Build an AgentMail-style payload with one base64 image attachment."""
+    blob = base64.b64encode(os.urandom(size_bytes)).decode("ascii")
+    payload = {
+        "event_type": "message.received",
+        "message": {
+            "to": ["nova-pet@agentmail.to"],
+            "subject": "Photo dump",
+            "text": "See attached",
+            "message_id": f"bench-{size_bytes}",
+            "attachments": [
+                {"filename": "photo.jpg", "content_type": "image/jpeg", "size": size_bytes, "content": blob}
+            ],
+        },
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def attachment_lists() -> List[List[Dict[str, Any]]]:
+    """Attachment arrays mixing allowed images, other types and both key styles."""
+    content = base64.b64encode(TINY_PNG).decode("ascii")
+    return [
+        [],
+        [{"filename": "a.png", "content_type": "image/png", "size": len(TINY_PNG), "content": content}],
+        [
+            {"filename": "a.png", "contentType": "image/png", "size": len(TINY_PNG), "content": content},
+            {"filename": "notes.pdf", "content_type": "application/pdf", "size": 10},
+            {"filename": "clip.mp4", "mime": "video/mp4", "size": 10},
+        ],
+    ]
+
+
+def trait_vectors(count: int = 32, seed: int = 7) -> List[Dict[str, int]]:
+    """Trait values from a fresh daemon up to a well-fed one."""
+    rng = random.Random(seed)
+    vectors = [{k: 0 for k in TRAIT_KEYS}]
+    for i in range(1, count):
+        scale = 5 + i * 6
+        vectors.append({k: rng.randint(0, scale) for k in TRAIT_KEYS})
+    return vectors
+
+
+def llm_outputs(seed: int = 7) -> List[str]:
+    """Analysis responses as providers return them: bare, fenced json, plain fence."""
+    rng = random.Random(seed)
+    body = json.dumps({
+        "traitDeltas": {k: rng.randint(0, 3) for k in TRAIT_KEYS},
+        "roast": "Your sunset is lovely, but the tripod did all the work.",
+    }, indent=2)
+    return [body, f"Here you go:\n```json\n{body}\n```", f"```\n{body}\n```"]
+
+
+def roasts() -> List[str]:
+    return [
+        "Nice.",
+        "Your vibe screams Curiosity — try harder.",
+        " ".join(["word"] * 40),
+        "x" * 300,
+        "",
+    ]
@@ -0,0 +1,107 @@
+"""
+Timing, baseline storage and comparison for the benchmarks.
+
+A baseline is a JSON file of seconds per call keyed by benchmark name,
+plus the environment it was recorded on. Comparing reports the ratio of
+each current timing to its baseline and flags ratios above 1 + threshold.
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+
+
+def time_call(
+    fn: Callable[[Any], Any],
+    arg: Any,
+    repeat: int,
+    setup: Optional[Callable[[Any], Any]] = None,
+) -> float:
+    """
+    Best-of-repeat seconds per call.
+
+    With `setup`, every call gets its own `setup(arg)`, built before the
+    timed loop, for functions that consume or mutate their input.
+    """
+    if setup is None:
+        timer = timeit.Timer(lambda: fn(arg))
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+
+    number, _ = timeit.Timer(lambda: fn(setup(arg))).autorange()
+    best = float("inf")
+    for _ in range(repeat):
+        fresh = [setup(arg) for _ in range(number)]
+        started = time.perf_counter()
+        for item in fresh:
+            fn(item)
+        best = min(best, time.perf_counter() - started)
+    return best / number
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "recordedAt": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_baseline(path: str, results: Dict[str, float]) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, Any],
+    threshold: float,
+) -> List[Dict[str, Any]]:
+    """
+    Compare timings against a baseline.
+
+    Warns on stderr when the baseline was recorded on a different Python
+    or platform, since its timings are then not comparable.
+
+    Returns:
+        One row per benchmark with baseline, current, ratio and status
+        ("regressed", "improved", "ok" or "new")
+    """
+    recorded = baseline.get("environment", {})
+    current_env = environment()
+    for key in ("python", "implementation", "platform"):
+        if recorded.get(key) != current_env[key]:
+            print(
+                f"warning: baseline {key} {recorded.get(key)!r} differs from this run's "
+                f"{current_env[key]!r}; re-record it with --save on this machine",
+                file=sys.stderr,
+            )
+    rows = []
+    previous = baseline.get("results", {})
+    for name, current in results.items():
+        before = previous.get(name)
+        if before is None:
+            rows.append({"name": name, "baseline": None, "current": current, "ratio": None, "status": "new"})
+            continue
+        ratio = current / before if before else float("inf")
+        if ratio > 1 + threshold:
+            status = "regressed"
+        elif ratio < 1 - threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": before, "current": current, "ratio": ratio, "status": status})
+    return rows
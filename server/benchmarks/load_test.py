@@ -0,0 +1,311 @@
+"""
+Open-loop load test for /feed-by-email and /analyze.
+
+Replays the repository's test-webhook-*.json fixtures, plus synthetic
+variants of them (fresh message ids, altered text, other recipients,
+small image attachments and some redeliveries), against the app running
+in-process. Convex and the LLM are replaced by the stand-ins in stubs.py
+and memories go to a temporary SQLite store, so no network is needed;
+their latency and error rates are configurable.
+
+Requests are sent on a Poisson schedule at the target rate whether or not
+earlier ones have finished, and latency is measured from the scheduled
+send time, so a server that falls behind shows it in the percentiles
+instead of slowing the load down.
+
+Reported: throughput, latency percentiles and status counts per endpoint,
+per-stage percentiles from the Server-Timing header of feed responses,
+and errors by the pipeline stage that failed.
+
+Usage (from server/):
+    python benchmarks/load_test.py --rate 50 --duration 30
+    python benchmarks/load_test.py --rate 20 --llm-latency-ms 800 --llm-error-rate 0.05
+    python benchmarks/load_test.py --env FEED_COMMIT_MODE=two-phase --env INGEST_MODE=queue --json
+"""
+
+import argparse
+import asyncio
+import base64
+import copy
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fixtures  # noqa: E402
+
+RECIPIENTS = ["nova-pet@agentmail.to", "pixel-pet@agentmail.to", "echo-pet@agentmail.to"]
+
+
+def _configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    """Point main.py at local state and the stand-ins; must run before importing it."""
+    os.environ.update({
+        "MOCK_MODE": "false",
+        "LOG_LEVEL": args.log_level,
+        "MEMORY_BACKEND": "sqlite",
+        "MEMORY_SQLITE_PATH": os.path.join(workdir, "memories.sqlite3"),
+        "MEMORY_SPOOL_PATH": os.path.join(workdir, "memory-spool.jsonl"),
+        "INGEST_QUEUE_PATH": os.path.join(workdir, "ingest-queue.sqlite3"),
+        "ATTACHMENT_SPOOL_DIR": os.path.join(workdir, "attachments"),
+        "CONVEX_URL": "http://stub-convex.invalid",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+
+
+def _install_stubs(args: argparse.Namespace):
+    import convex
+    import llm_providers
+    from stubs import StubConvex, StubLLM
+
+    stub_convex = StubConvex(
+        latency=args.convex_latency_ms / 1000,
+        jitter=args.jitter,
+        error_rate=args.convex_error_rate,
+        seed=args.seed,
+    )
+    stub_llm = StubLLM(
+        latency=args.llm_latency_ms / 1000,
+        jitter=args.jitter,
+        error_rate=args.llm_error_rate,
+        seed=args.seed + 1,
+    )
+    convex.ConvexClient = lambda *_a, **_k: stub_convex
+    llm_providers.get_llm_provider = lambda *_a, **_k: stub_llm
+    return stub_convex, stub_llm
+
+
+def _feed_variant(i: int, base: Dict[str, Any], rng: random.Random, args: argparse.Namespace) -> Dict[str, Any]:
+    message = copy.deepcopy(base)
+    message["message_id"] = f"load-{args.seed}-{i}"
+    message["subject"] = f"{message.get('subject', '')} #{i}"
+    message["text"] = f"{message.get('text', '')} (variant {i}, mood {rng.choice(['calm', 'wired', 'sleepy', 'giddy'])})"
+    if rng.random() < 0.5:
+        message["to"] = [rng.choice(RECIPIENTS)]
+    if rng.random() < args.attachment_fraction:
+        message["attachments"] = [{
+            "filename": f"img-{i}.png",
+            "content_type": "image/png",
+            "size": len(fixtures.TINY_PNG),
+            "content": base64.b64encode(fixtures.TINY_PNG).decode("ascii"),
+        }]
+    return message
+
+
+def build_schedule(args: argparse.Namespace) -> List[Tuple[float, str, bytes]]:
+    """Return (send offset seconds, path, body) for every request of the run."""
+    rng = random.Random(args.seed)
+    originals = [json.loads(raw) for _name, raw in fixtures.load_fixtures()]
+    vectors = fixtures.trait_vectors()
+    sent: List[bytes] = []
+    schedule: List[Tuple[float, str, bytes]] = []
+    offset = 0.0
+    i = 0
+    while True:
+        offset += rng.expovariate(args.rate)
+        if offset >= args.duration:
+            break
+        if rng.random() < args.analyze_fraction:
+            body = {
+                "text": rng.choice(originals).get("text", ""),
+                "currentTraits": {"values": rng.choice(vectors)},
+            }
+            schedule.append((offset, "/analyze", json.dumps(body).encode("utf-8")))
+        elif sent and rng.random() < args.duplicate_rate:
+            # Redelivery of an earlier message, as webhook retries do
+            schedule.append((offset, "/feed-by-email", rng.choice(sent)))
+        else:
+            if i < len(originals):
+                message = dict(originals[i], message_id=f"{originals[i]['message_id']}-{args.seed}")
+            else:
+                message = _feed_variant(i, originals[i % len(originals)], rng, args)
+            raw = json.dumps({"event_type": "message.received", "message": message}).encode("utf-8")
+            sent.append(raw)
+            schedule.append((offset, "/feed-by-email", raw))
+            i += 1
+    return schedule
+
+
+def parse_server_timing(header: Optional[str]) -> Tuple[Dict[str, float], Optional[str]]:
+    """Return stage durations (ms) and the failed stage from a Server-Timing header."""
+    durations: Dict[str, float] = {}
+    failed = None
+    for entry in (header or "").split(","):
+        name, *params = [p.strip() for p in entry.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                durations[name] = float(value)
+            elif key == "desc" and name == "error":
+                failed = value.strip('"')
+    return durations, failed
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+
+    return {"p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99), "max": round(ordered[-1], 2)}
+
+
+async def run(app, schedule: List[Tuple[float, str, bytes]], timeout: float) -> Tuple[List[Dict[str, Any]], float]:
+    import httpx
+
+    results: List[Dict[str, Any]] = []
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=timeout) as client:
+
+            async def send(scheduled: float, path: str, body: bytes) -> None:
+                record: Dict[str, Any] = {"path": path, "lagMs": (time.perf_counter() - scheduled) * 1000}
+                try:
+                    response = await client.post(path, content=body, headers={"Content-Type": "application/json"})
+                    record["status"] = response.status_code
+                    record["timing"] = response.headers.get("Server-Timing")
+                    if path == "/feed-by-email" and response.status_code == 200:
+                        record["result"] = response.json().get("status")
+                except Exception as e:
+                    record["status"] = "exception"
+                    record["error"] = type(e).__name__
+                record["latencyMs"] = (time.perf_counter() - scheduled) * 1000
+                results.append(record)
+
+            start = time.perf_counter()
+            tasks = []
+            for offset, path, body in schedule:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(start + offset, path, body)))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float, args: argparse.Namespace) -> Dict[str, Any]:
+    endpoints: Dict[str, Any] = {}
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, Dict[str, int]] = {}
+    for path in sorted({r["path"] for r in results}):
+        rows = [r for r in results if r["path"] == path]
+        statuses: Dict[str, int] = {}
+        for r in rows:
+            key = str(r["status"]) + (f" {r['result']}" if r.get("result") else "")
+            statuses[key] = statuses.get(key, 0) + 1
+        failed = [r for r in rows if r["status"] == "exception" or r["status"] >= 400]
+        endpoints[path] = {
+            "requests": len(rows),
+            "throughput": round(len(rows) / elapsed, 2),
+            "errorRate": round(len(failed) / len(rows), 4),
+            "latencyMs": percentiles([r["latencyMs"] for r in rows]),
+            "statuses": statuses,
+        }
+        for r in rows:
+            durations, failed_stage = parse_server_timing(r.get("timing"))
+            ok = r["status"] != "exception" and r["status"] < 400
+            if ok:
+                for name, ms in durations.items():
+                    stages.setdefault(name, []).append(ms)
+            else:
+                # Failures outside a pipeline (admission, parsing, routing) carry their status instead
+                stage = failed_stage or str(r["status"])
+                errors.setdefault(path, {})
+                errors[path][stage] = errors[path].get(stage, 0) + 1
+
+    return {
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "analyzeFraction": args.analyze_fraction,
+            "duplicateRate": args.duplicate_rate,
+            "convexLatencyMs": args.convex_latency_ms,
+            "llmLatencyMs": args.llm_latency_ms,
+            "convexErrorRate": args.convex_error_rate,
+            "llmErrorRate": args.llm_error_rate,
+        },
+        "requests": len(results),
+        "elapsedSeconds": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 2) if elapsed else None,
+        "sendLagMs": percentiles([r["lagMs"] for r in results]),
+        "endpoints": endpoints,
+        "stagesMs": {name: {"count": len(v), **percentiles(v)} for name, v in sorted(stages.items())},
+        "errorsByStage": errors,
+    }
+
+
+def _print_report(report: Dict[str, Any], stub_convex) -> None:
+    def fmt(value: Optional[float]) -> str:
+        return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"{report['requests']} requests in {report['elapsedSeconds']}s "
+          f"({report['throughput']} req/s, target {report['config']['rate']})")
+    print(f"send lag p99 {report['sendLagMs']['p99']} ms")
+    print()
+    print(f"{'endpoint':18} {'req':>6} {'req/s':>7} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  statuses")
+    for path, row in report["endpoints"].items():
+        lat = row["latencyMs"]
+        print(f"{path:18} {row['requests']:6d} {row['throughput']:7.1f} {row['errorRate'] * 100:6.1f} "
+              f"{fmt(lat['p50'])} {fmt(lat['p95'])} {fmt(lat['p99'])} {fmt(lat['max'])}  {row['statuses']}")
+    print()
+    print(f"{'stage (Server-Timing)':22} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name, row in report["stagesMs"].items():
+        print(f"{name:22} {row['count']:6d} {fmt(row['p50'])} {fmt(row['p95'])} {fmt(row['p99'])} {fmt(row['max'])}")
+    if report["errorsByStage"]:
+        print()
+        print("errors by stage:")
+        for path, counts in report["errorsByStage"].items():
+            print(f"  {path}: {counts}")
+    print()
+    print(f"stand-in calls: convex={stub_convex.calls}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=20.0, help="Mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of arrivals")
+    parser.add_argument("--analyze-fraction", type=float, default=0.2, help="Share of requests sent to /analyze")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="Share of feeds that redeliver an earlier message")
+    parser.add_argument("--attachment-fraction", type=float, default=0.2, help="Share of synthetic feeds with an image")
+    parser.add_argument("--convex-latency-ms", type=float, default=20.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter", type=float, default=0.25, help="Latency standard deviation as a share of the mean")
+    parser.add_argument("--convex-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Client timeout per request")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Server setting for the run")
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="data-daemons-load-") as workdir:
+        _configure_environment(args, workdir)
+        stub_convex, _stub_llm = _install_stubs(args)
+        import main  # noqa: E402
+        logging.getLogger().setLevel(args.log_level)
+
+        schedule = build_schedule(args)
+        results, elapsed = asyncio.run(run(main.app, schedule, args.timeout))
+        report = summarize(results, elapsed, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report, stub_convex)
+
+
+if __name__ == "__main__":
+    main_cli()
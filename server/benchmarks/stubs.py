@@ -0,0 +1,223 @@
+"""
+Local stand-ins for Convex and the LLM, used by the load harness.
+
+StubConvex keeps daemons and feeds in memory and mirrors the feed state
+machine of convex/feeds.ts (startProcessing -> complete/errored, one-shot
+ingest, deferred daemon updates and daemons:applyFeedDeltas), so the
+server's idempotency and commit paths behave as they do against Convex.
+Both stand-ins sleep for a configurable latency with jitter and can fail a
+fraction of calls. MemoryAttachmentStore keeps decoded attachments in
+memory so the hot-path benchmarks do not time the filesystem.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import copy
+import io
+import json
+import random
+import threading
+import time
+
+from attachments import AttachmentStore, decode_base64_to
+from fixtures import TRAIT_KEYS
+from llm_providers import LLMProvider, LLMResponse
+
+# Same per-stage thresholds as convex/feeds.ts
+FEED_THRESHOLDS = {0: 5, 1: 8, 2: 12, 3: 12}
+
+
+class StubError(RuntimeError):
+    """Injected failure."""
+
+
+class _Latency:
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def wait(self, what: str) -> None:
+        with self._rng_lock:
+            delay = max(0.0, self._rng.gauss(self.latency, self.latency * self.jitter))
+            fail = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise StubError(f"injected {what} failure")
+
+
+class StubConvex(_Latency):
+    """In-memory replacement for the synchronous ConvexClient."""
+
+    def __init__(
+        self,
+        daemon_names: Optional[List[str]] = None,
+        latency: float = 0.02,
+        jitter: float = 0.25,
+        error_rate: float = 0.0,
+        seed: int = 1,
+    ):
+        super().__init__(latency, jitter, error_rate, seed)
+        self._lock = threading.Lock()
+        self.daemons: Dict[str, Dict[str, Any]] = {}
+        for i, name in enumerate(daemon_names or ["Nova", "Pixel", "Echo"]):
+            daemon_id = f"daemon{i}"
+            self.daemons[daemon_id] = {
+                "_id": daemon_id,
+                "name": name,
+                "stage": 0,
+                "feedsSinceEvolution": 0,
+                "traits": {k: 0 for k in TRAIT_KEYS},
+            }
+        self.feeds: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, int] = {}
+
+    def subscribe(self, name: str, args: Optional[Dict[str, Any]] = None):
+        # No live queries; the daemon index falls back to polling
+        raise RuntimeError("subscriptions are not supported by StubConvex")
+
+    def query(self, name: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        self.wait(name)
+        args = args or {}
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if name == "daemons:all":
+                return copy.deepcopy(list(self.daemons.values()))
+            if name == "daemons:get":
+                return copy.deepcopy(self.daemons.get(args["id"]))
+            if name == "feeds:getByFeedId":
+                return copy.deepcopy(self.feeds.get(args["feedId"]))
+            if name == "feeds:recentCompletedIds":
+                completed = [f["feedId"] for f in self.feeds.values() if f["status"] == "completed"]
+                return completed[-args["limit"]:]
+        raise KeyError(f"StubConvex has no query {name}")
+
+    def mutation(self, name: str, args: Optional[Dict[str, Any]] = None) -> Any:
+        self.wait(name)
+        args = args or {}
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            handler = getattr(self, "_" + name.replace(":", "_"), None)
+            if handler is None:
+                raise KeyError(f"StubConvex has no mutation {name}")
+            return handler(args)
+
+    def _apply(self, daemon_id: str, args: Dict[str, Any], feed_count: int = 1) -> Dict[str, Any]:
+        daemon = self.daemons.get(daemon_id)
+        if daemon is None:
+            raise StubError("Daemon not found for feed")
+        for key, delta in args["traitsDelta"].items():
+            daemon["traits"][key] = daemon["traits"].get(key, 0) + delta
+        evolved = False
+        for _ in range(feed_count):
+            daemon["feedsSinceEvolution"] += 1
+            if daemon["feedsSinceEvolution"] >= FEED_THRESHOLDS.get(daemon["stage"], 12) and daemon["stage"] < 3:
+                daemon["stage"] += 1
+                daemon["feedsSinceEvolution"] = 0
+                evolved = True
+        if args.get("newArchetypeId"):
+            daemon["archetypeId"] = args["newArchetypeId"]
+        if args.get("topTraits"):
+            daemon["topTraits"] = args["topTraits"]
+        return {"evolved": evolved, "stage": daemon["stage"], "feedsSinceEvolution": daemon["feedsSinceEvolution"]}
+
+    def _feeds_startProcessing(self, args: Dict[str, Any]) -> str:
+        if args["feedId"] not in self.feeds:
+            self.feeds[args["feedId"]] = {
+                "feedId": args["feedId"],
+                "daemonId": args["daemonId"],
+                "status": "processing",
+                "attachmentsMeta": args.get("attachmentsMeta", []),
+            }
+        return args["feedId"]
+
+    def _feeds_complete(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        feed = self.feeds.get(args["feedId"])
+        if feed is None:
+            raise StubError("Feed not found")
+        if feed["status"] == "completed":
+            return {"duplicate": True}
+        if feed["status"] != "processing":
+            raise StubError("Invalid status transition")
+        feed.update(status="completed", traitsDelta=args["traitsDelta"], roast=args.get("roast"))
+        if args.get("deferDaemonUpdate"):
+            return {"duplicate": False, "deferred": True}
+        return self._apply(feed["daemonId"], args)
+
+    def _feeds_ingest(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        existing = self.feeds.get(args["feedId"])
+        if existing is not None and existing["status"] == "completed":
+            return {"duplicate": True}
+        self.feeds[args["feedId"]] = {
+            "feedId": args["feedId"],
+            "daemonId": args["daemonId"],
+            "status": "completed",
+            "attachmentsMeta": args.get("attachmentsMeta", []),
+            "traitsDelta": args["traitsDelta"],
+            "roast": args.get("roast"),
+        }
+        if args.get("deferDaemonUpdate"):
+            return {"duplicate": False, "deferred": True}
+        return {"duplicate": False, **self._apply(args["daemonId"], args)}
+
+    def _feeds_errored(self, args: Dict[str, Any]) -> None:
+        feed = self.feeds.get(args["feedId"])
+        if feed is not None:
+            feed["status"] = "errored"
+            feed["errorMessage"] = args.get("errorMessage")
+
+    def _daemons_applyFeedDeltas(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        return self._apply(args["daemonId"], args, feed_count=args.get("feedCount", 1))
+
+    def _managerLogs_logBrainstorm(self, args: Dict[str, Any]) -> str:
+        return "log"
+
+
+class StubLLM(_Latency, LLMProvider):
+    """LLM provider answering analysis and brainstorm prompts with canned JSON."""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.3, error_rate: float = 0.0, seed: int = 2):
+        _Latency.__init__(self, latency, jitter, error_rate, seed)
+        LLMProvider.__init__(self, api_key="stub")
+
+    def generate_content(self, prompt: str, **kwargs) -> LLMResponse:
+        started = time.perf_counter()
+        try:
+            self.wait("llm")
+        except StubError as e:
+            self._record_call(started, "error", model="stub", error=e)
+            raise
+        if "brainstorm" in prompt:
+            body = {"brainstormIdea": "A joint project", "contributions": []}
+        else:
+            with self._rng_lock:
+                deltas = {k: self._rng.randint(0, 3) for k in TRAIT_KEYS}
+            body = {"traitDeltas": deltas, "roast": "Bold choice. The daemons are taking notes."}
+        content = json.dumps(body)
+        self._record_call(started, "ok", len(prompt) // 4, len(content) // 4, model="stub")
+        return LLMResponse(content)
+
+    def is_available(self) -> bool:
+        return True
+
+
+class MemoryAttachmentStore(AttachmentStore):
+    """AttachmentStore that keeps decoded bodies in a dict instead of on disk."""
+
+    def __init__(self, max_bytes: int = 20 * 1024 * 1024):
+        self.directory = None
+        self.max_bytes = max_bytes
+        self.spilled_bytes = 0
+        self.blobs: Dict[str, bytes] = {}
+
+    def spill_base64(self, data: str) -> Tuple[str, int]:
+        out = io.BytesIO()
+        digest, size = decode_base64_to(data, out, self.max_bytes)
+        ref = f"sha256:{digest}"
+        self.blobs[ref] = out.getvalue()
+        self.spilled_bytes += size
+        return ref, size
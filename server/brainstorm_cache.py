@@ -0,0 +1,64 @@
+"""
+Cache of Pet Manager brainstorm results.
+
+Entries are keyed by the normalized topic and the manager context
+fingerprint, so a repeated brainstorm over an unchanged daemon population
+is answered without calling the LLM or logging it again. Entries also
+expire after a TTL so repeated requests eventually get a fresh idea.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+
+from metrics import REGISTRY
+
+BRAINSTORM_CACHE_LOOKUPS = REGISTRY.counter(
+    "brainstorm_cache_lookups_total", "Brainstorm cache lookups", ("result",),
+)
+
+
+def normalize_topic(topic: Optional[str]) -> str:
+    return " ".join(str(topic or "").lower().split())
+
+
+class BrainstormCache:
+    """TTL/LRU map of (topic, context fingerprint) -> brainstorm response."""
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, topic: Optional[str], fingerprint: str) -> Optional[Dict[str, Any]]:
+        key = (normalize_topic(topic), fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                BRAINSTORM_CACHE_LOOKUPS.inc(result="hit")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        BRAINSTORM_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    def put(self, topic: Optional[str], fingerprint: str, result: Dict[str, Any]) -> None:
+        key = (normalize_topic(topic), fingerprint)
+        with self._lock:
+            # Results for an older context can never be hit again
+            for stale in [k for k in self._entries if k[0] == key[0] and k[1] != fingerprint]:
+                del self._entries[stale]
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": BRAINSTORM_CACHE_LOOKUPS.value(result="hit"),
+            "misses": BRAINSTORM_CACHE_LOOKUPS.value(result="miss"),
+        }
@@ -0,0 +1,289 @@
+"""
+Prompt planning for Pet Manager brainstorms over many daemons.
+
+Small populations are described in full, as before. When the daemon
+descriptions no longer fit the token budget, daemons are ranked by
+relevance to the topic (trait similarity plus memory keyword overlap) and
+the top ones are packed into the budget. Past `hierarchical_min` daemons,
+groups of daemons are first summarized by concurrent LLM calls and the
+final prompt synthesizes from those summaries.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import logging
+import re
+
+from archetypes import ALL_TRAITS, cosine_similarity, normalize_traits
+
+logger = logging.getLogger(__name__)
+
+# Words in a topic that point at a trait; trait names themselves also match by prefix
+TRAIT_KEYWORDS: Dict[str, tuple] = {
+    "Intelligence": ("smart", "science", "research", "math", "analysis", "data", "logic"),
+    "Creativity": ("creative", "art", "design", "invent", "story", "music", "imagine"),
+    "Empathy": ("feel", "feeling", "emotion", "support", "care", "understand"),
+    "Resilience": ("recover", "tough", "setback", "persist", "endure"),
+    "Curiosity": ("explore", "discover", "question", "learn", "wonder"),
+    "Humor": ("funny", "joke", "comedy", "laugh", "meme", "fun"),
+    "Kindness": ("kind", "help", "charity", "gift", "generous"),
+    "Confidence": ("confident", "pitch", "lead", "bold", "present"),
+    "Discipline": ("plan", "habit", "routine", "schedule", "focus", "productivity"),
+    "Honesty": ("honest", "truth", "transparent", "fact"),
+    "Patience": ("patient", "slow", "wait", "long", "calm"),
+    "Optimism": ("hope", "positive", "future", "bright"),
+    "Courage": ("brave", "risk", "dare", "challenge"),
+    "OpenMindedness": ("open", "diverse", "new", "different", "perspective"),
+    "Prudence": ("careful", "budget", "safe", "save", "finance", "money"),
+    "Adaptability": ("change", "adapt", "flexible", "pivot"),
+    "Gratitude": ("thank", "grateful", "appreciate"),
+    "Ambition": ("goal", "startup", "business", "grow", "win", "career"),
+    "Humility": ("humble", "modest", "team"),
+    "Playfulness": ("play", "game", "party", "toy", "silly"),
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "is", "it",
+    "of", "on", "or", "our", "that", "the", "this", "to", "we", "what", "with", "you", "your",
+    "daemon", "source", "content", "roast", "email",
+}
+
+PROMPT_HEADER = [
+    "You are the Pet Manager, a creative AI that synthesizes insights from multiple Data Daemons.",
+    "Each daemon has unique personality traits and memories from the content they've consumed.",
+    "",
+]
+
+PROMPT_INSTRUCTIONS = [
+    "Based on the above daemons' traits and memories, brainstorm a creative idea or insight.",
+    "Structure your response as JSON with:",
+    '- "brainstormIdea": A creative idea that synthesizes insights from all daemons',
+    '- "contributions": An array of objects with "daemonName", "role", and "highlight" for each daemon',
+    "",
+    "Make it engaging and reference specific traits and memories from each daemon.",
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _keywords(text: str) -> Set[str]:
+    return {w for w in _WORD_RE.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def topic_trait_vector(topic: str) -> Dict[str, float]:
+    """Weights of the traits a topic points at."""
+    words = _keywords(topic)
+    vector: Dict[str, float] = {}
+    for trait in ALL_TRAITS:
+        stem = trait.lower()[:5]
+        hits = sum(1 for w in words if w.startswith(stem) or w in TRAIT_KEYWORDS.get(trait, ()))
+        if hits:
+            vector[trait] = float(hits)
+    return vector
+
+
+def rank_daemons(
+    contexts: List[Dict[str, Any]],
+    topic: Optional[str],
+    trait_weight: float = 0.5,
+    memory_weight: float = 0.5,
+) -> List[Dict[str, Any]]:
+    """
+    Order daemon contexts by relevance to `topic`.
+
+    Relevance is the cosine similarity between the daemon's normalized
+    traits and the traits the topic points at, plus the share of topic
+    keywords found in the daemon's memories. Without a topic, or on ties,
+    daemons with more developed traits come first.
+    """
+    keywords = _keywords(topic or "")
+    topic_vector = topic_trait_vector(topic or "")
+
+    def score(ctx: Dict[str, Any]) -> tuple:
+        values = ctx.get("traitValues") or {}
+        relevance = 0.0
+        if topic_vector:
+            relevance += trait_weight * cosine_similarity(normalize_traits(values), topic_vector)
+        if keywords:
+            relevance += memory_weight * len(keywords & _keywords(ctx.get("memories", ""))) / len(keywords)
+        return (relevance, sum(values.values()))
+
+    return sorted(contexts, key=score, reverse=True)
+
+
+def format_daemon(ctx: Dict[str, Any]) -> str:
+    return (
+        f"**{ctx['name']}**\n"
+        f"  Top Traits: {ctx['traits']}\n"
+        f"  Recent Memories: {ctx['memories']}\n"
+    )
+
+
+def pack(contexts: List[Dict[str, Any]], budget: int, top_k: int) -> List[Dict[str, Any]]:
+    """Take daemons in order until `top_k` or the token budget is reached (at least one)."""
+    packed: List[Dict[str, Any]] = []
+    used = 0
+    for ctx in contexts[:top_k]:
+        cost = estimate_tokens(format_daemon(ctx))
+        if packed and used + cost > budget:
+            break
+        packed.append(ctx)
+        used += cost
+    return packed
+
+
+def build_prompt(sections: List[str], topic: Optional[str], heading: str = "Here are your daemons:") -> str:
+    parts = PROMPT_HEADER + [heading, ""]
+    for section in sections:
+        parts.extend(section.splitlines())
+        parts.append("")
+    if topic:
+        parts.append(f"Topic: {topic}")
+        parts.append("")
+    parts.extend(PROMPT_INSTRUCTIONS)
+    return "\n".join(parts)
+
+
+def build_group_prompt(group: List[Dict[str, Any]], topic: Optional[str]) -> str:
+    parts = [
+        "You are helping the Pet Manager prepare a brainstorm across many Data Daemons.",
+        "Summarize what this group of daemons could contribute"
+        + (f" to the topic: {topic}" if topic else "") + ".",
+        "",
+    ]
+    parts.extend(format_daemon(ctx) for ctx in group)
+    parts.extend([
+        "Respond as JSON with:",
+        '- "summary": Two or three sentences on the group\'s combined strengths and memories',
+        '- "highlights": An array of objects with "daemonName" and "highlight" for the two most promising daemons',
+    ])
+    return "\n".join(parts)
+
+
+@dataclass
+class BrainstormPlan:
+    mode: str
+    prompt: str
+    daemons: List[Dict[str, Any]]
+    groups: int = 0
+    tokens: int = 0
+    group_tokens: List[int] = field(default_factory=list)
+
+
+class BrainstormPlanner:
+    """Chooses between full, packed and hierarchical brainstorm prompts."""
+
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        top_k: int = 40,
+        hierarchical_min: int = 200,
+        group_size: int = 25,
+        concurrency: int = 8,
+    ):
+        """
+        Args:
+            token_budget: Approximate tokens for the daemon section of a prompt
+            top_k: Most daemons described individually in a packed prompt
+            hierarchical_min: Population from which groups are summarized first
+            group_size: Daemons per summarized group
+            concurrency: Group summaries in flight at once
+        """
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.hierarchical_min = hierarchical_min
+        self.group_size = group_size
+        self.concurrency = concurrency
+
+    async def plan(
+        self,
+        contexts: List[Dict[str, Any]],
+        topic: Optional[str],
+        generate: Optional[Callable[[str], Awaitable[Any]]] = None,
+    ) -> BrainstormPlan:
+        """
+        Build the brainstorm prompt for `contexts`.
+
+        Args:
+            contexts: Daemon contexts from ManagerContext.contexts()
+            topic: Optional brainstorm topic
+            generate: Async LLM call returning an LLMResponse; without it
+                the hierarchical pass is skipped
+        """
+        sections = [format_daemon(ctx) for ctx in contexts]
+        total = sum(estimate_tokens(s) for s in sections)
+        if total <= self.token_budget and len(contexts) <= self.top_k:
+            prompt = build_prompt(sections, topic)
+            return BrainstormPlan("full", prompt, contexts, tokens=estimate_tokens(prompt))
+
+        ranked = rank_daemons(contexts, topic)
+        if len(contexts) < self.hierarchical_min or generate is None:
+            packed = pack(ranked, self.token_budget, self.top_k)
+            prompt = build_prompt([format_daemon(ctx) for ctx in packed], topic)
+            return BrainstormPlan("packed", prompt, packed, tokens=estimate_tokens(prompt))
+
+        return await self._hierarchical(ranked, topic, generate)
+
+    async def _hierarchical(
+        self,
+        ranked: List[Dict[str, Any]],
+        topic: Optional[str],
+        generate: Callable[[str], Awaitable[Any]],
+    ) -> BrainstormPlan:
+        groups = [ranked[i:i + self.group_size] for i in range(0, len(ranked), self.group_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def summarize(group: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    response = await generate(build_group_prompt(group, topic))
+                    return response.parse_json()
+                except Exception as e:
+                    # A failed group is left out rather than failing the brainstorm
+                    logger.warning(f"Brainstorm group summary failed: {e}")
+                    return None
+
+        summaries = await asyncio.gather(*(summarize(group) for group in groups))
+
+        # Groups are in rank order; keep as many summaries as the budget allows
+        sections: List[str] = []
+        used = 0
+        daemons: List[Dict[str, Any]] = []
+        group_tokens: List[int] = []
+        for i, (group, summary) in enumerate(zip(groups, summaries)):
+            if not summary:
+                continue
+            highlights = "; ".join(
+                f"{h.get('daemonName', '?')}: {h.get('highlight', '')}"
+                for h in (summary.get("highlights") or [])[:2]
+                if isinstance(h, dict)
+            )
+            section = (
+                f"**Group {i + 1}** ({', '.join(ctx['name'] for ctx in group)})\n"
+                f"  Summary: {summary.get('summary', '')}\n"
+                f"  Highlights: {highlights or 'None'}\n"
+            )
+            cost = estimate_tokens(section)
+            if sections and used + cost > self.token_budget:
+                break
+            sections.append(section)
+            daemons.extend(group)
+            group_tokens.append(cost)
+            used += cost
+
+        if not sections:
+            # Every summary failed; fall back to the packed prompt
+            packed = pack(ranked, self.token_budget, self.top_k)
+            prompt = build_prompt([format_daemon(ctx) for ctx in packed], topic)
+            return BrainstormPlan("packed", prompt, packed, tokens=estimate_tokens(prompt))
+
+        prompt = build_prompt(sections, topic, heading="Here are summaries of your daemon groups:")
+        return BrainstormPlan(
+            "hierarchical", prompt, daemons,
+            groups=len(sections), tokens=estimate_tokens(prompt), group_tokens=group_tokens,
+        )
@@ -0,0 +1,89 @@
+"""
+Async access layer for the synchronous Convex Python client.
+
+Calls run on a bounded thread pool so a Convex round trip never blocks the
+event loop. Each call is subject to a concurrency limit and a timeout, and
+its latency is recorded per function name and traced as a span.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+import asyncio
+import functools
+import time
+
+from metrics import REGISTRY
+from tracing import TRACER
+
+CONVEX_LATENCY = REGISTRY.histogram(
+    "convex_call_seconds", "Convex query/mutation latency", ("kind", "function"),
+)
+CONVEX_ERRORS = REGISTRY.counter(
+    "convex_call_errors_total", "Failed or timed-out Convex calls", ("kind", "function", "reason"),
+)
+
+
+class ConvexTimeout(Exception):
+    """Raised when a Convex call does not finish within its timeout."""
+
+
+class AsyncConvex:
+    """
+    Awaitable wrapper around a ConvexClient.
+
+    A call that times out is reported to the caller immediately, but the
+    underlying thread keeps running until the client returns; the pool size
+    therefore also bounds how many abandoned calls can pile up.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        max_workers: int = 16,
+        max_concurrency: Optional[int] = None,
+        timeout: float = 10.0,
+    ):
+        self.client = client
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="convex")
+        self._semaphore = asyncio.Semaphore(max_concurrency or max_workers)
+        self.inflight = 0
+
+    async def query(self, name: str, args: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        return await self._call("query", name, args or {}, timeout)
+
+    async def mutation(self, name: str, args: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        return await self._call("mutation", name, args or {}, timeout)
+
+    async def _call(self, kind: str, name: str, args: Dict[str, Any], timeout: Optional[float]) -> Any:
+        fn = functools.partial(getattr(self.client, kind), name, args)
+        # The span includes time waiting for a concurrency slot
+        with TRACER.span(f"convex.{kind}", function=name):
+            async with self._semaphore:
+                self.inflight += 1
+                start = time.perf_counter()
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await asyncio.wait_for(
+                        loop.run_in_executor(self._executor, fn),
+                        timeout=timeout if timeout is not None else self.timeout,
+                    )
+                except asyncio.TimeoutError:
+                    CONVEX_ERRORS.inc(kind=kind, function=name, reason="timeout")
+                    raise ConvexTimeout(f"Convex {kind} {name} timed out")
+                except Exception:
+                    CONVEX_ERRORS.inc(kind=kind, function=name, reason="error")
+                    raise
+                finally:
+                    self.inflight -= 1
+                    CONVEX_LATENCY.observe(time.perf_counter() - start, kind=kind, function=name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "latency": CONVEX_LATENCY.snapshot(),
+            "errors": CONVEX_ERRORS.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,231 @@
+"""
+In-process index of daemon documents for email routing and trait lookup.
+
+The index is populated once from `daemons:all` and kept fresh by a Convex
+subscription to the same query. If the subscription cannot be established
+the index falls back to re-querying every `ttl_seconds`. Lookups on the
+request path never touch the network.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Dedicated mailbox local parts mapped to daemon names (exact matches take priority)
+MAILBOX_ALIASES: Dict[str, str] = {
+    "nova-pet": "nova",
+    "pixel-pet": "pixel",
+    "echo-pet": "echo",
+}
+
+
+class DaemonIndex:
+    """Daemon documents keyed by id, lowercased name and mailbox alias."""
+
+    def __init__(
+        self,
+        client: Any,
+        ttl_seconds: float = 30.0,
+        on_load: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        """
+        Args:
+            client: Synchronous Convex client
+            ttl_seconds: Poll interval when the subscription is unavailable
+            on_load: Called with the daemon list after every full reload
+        """
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self._on_load = on_load
+        self._lock = threading.Lock()
+        self._ordered: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._by_alias: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: float = 0.0
+        # Trait deltas committed to feeds but not yet to the daemon documents
+        self._unflushed: Dict[str, Dict[str, int]] = {}
+        self.mode = "cold"
+
+    def load(self, daemons: List[Dict[str, Any]]) -> None:
+        """Replace the index contents with a fresh `daemons:all` result."""
+        if self._unflushed:
+            daemons = [self._with_unflushed(d) for d in daemons]
+        by_id: Dict[str, Dict[str, Any]] = {}
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for d in daemons:
+            by_id[d["_id"]] = d
+            # First daemon wins on duplicate names, matching the old linear scan
+            by_name.setdefault(str(d.get("name", "")).lower(), d)
+        by_alias = {
+            alias: by_name[name]
+            for alias, name in MAILBOX_ALIASES.items()
+            if name in by_name
+        }
+        with self._lock:
+            self._ordered = list(daemons)
+            self._by_id = by_id
+            self._by_name = by_name
+            self._by_alias = by_alias
+            self._loaded_at = time.time()
+        if self._on_load is not None:
+            self._on_load(daemons)
+
+    def refresh(self) -> None:
+        """Reload the index from Convex (blocking)."""
+        daemons = self._client.query("daemons:all", {}) or []
+        self.load(daemons)
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the index has been populated at least once."""
+        return bool(self._loaded_at)
+
+    async def run(self) -> None:
+        """
+        Keep the index fresh for the lifetime of the app.
+
+        Prefers a live subscription; on failure, polls every ttl_seconds and
+        retries the subscription on each cycle.
+        """
+        while True:
+            try:
+                sub = await asyncio.to_thread(self._client.subscribe, "daemons:all", {})
+                self.mode = "subscription"
+                async for daemons in sub:
+                    self.load(daemons or [])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Daemon subscription unavailable, polling every {self.ttl_seconds}s: {e}")
+            self.mode = "poll"
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                logger.error(f"Failed to refresh daemon index: {e}")
+            await asyncio.sleep(self.ttl_seconds)
+
+    def apply_feed(self, daemon_id: str, traits_delta: Dict[str, int]) -> None:
+        """
+        Mirror a committed feed into the cached daemon document.
+
+        Keeps the next feed for the same daemon from reading traits that
+        predate this one while the subscription catches up; the next
+        subscription result replaces the document with the authoritative one.
+        """
+        with self._lock:
+            current = self._by_id.get(daemon_id)
+            if current is None:
+                return
+            traits = dict(current.get("traits") or {})
+            for key, delta in traits_delta.items():
+                traits[key] = traits.get(key, 0) + delta
+            updated = {**current, "traits": traits}
+            # Swap in new containers so readers holding the old ones are unaffected
+            self._by_id = {**self._by_id, daemon_id: updated}
+            self._ordered = [updated if d is current else d for d in self._ordered]
+            self._by_name = {k: updated if d is current else d for k, d in self._by_name.items()}
+            self._by_alias = {k: updated if d is current else d for k, d in self._by_alias.items()}
+
+    def hold(self, daemon_id: str, traits_delta: Dict[str, int]) -> None:
+        """Remember deltas whose daemon write is deferred, so reloads keep them."""
+        held = self._unflushed.setdefault(daemon_id, {})
+        for key, delta in traits_delta.items():
+            held[key] = held.get(key, 0) + delta
+
+    def release(self, daemon_id: str, traits_delta: Dict[str, int]) -> None:
+        """Forget deferred deltas that are about to be written to the daemon."""
+        held = self._unflushed.get(daemon_id)
+        if held is None:
+            return
+        for key, delta in traits_delta.items():
+            held[key] = held.get(key, 0) - delta
+        if not any(held.values()):
+            del self._unflushed[daemon_id]
+
+    def _with_unflushed(self, daemon: Dict[str, Any]) -> Dict[str, Any]:
+        held = self._unflushed.get(daemon.get("_id"))
+        if not held:
+            return daemon
+        traits = dict(daemon.get("traits") or {})
+        for key, delta in held.items():
+            traits[key] = traits.get(key, 0) + delta
+        return {**daemon, "traits": traits}
+
+    def get(self, daemon_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(daemon_id)
+
+    def all(self) -> List[Dict[str, Any]]:
+        return self._ordered
+
+    def resolve(self, to_field: Any) -> Optional[str]:
+        """
+        Route recipient addresses to a daemon id.
+
+        Priority: dedicated mailbox alias, then plus-tag hint matching an id
+        or name, then the first daemon.
+
+        Args:
+            to_field: A recipient address or list of addresses
+
+        Returns:
+            The daemon id, or None if the index is empty
+        """
+        with self._lock:
+            snapshot = (self._ordered, self._by_id, self._by_name, self._by_alias)
+        return self._resolve(to_field, *snapshot)
+
+    def resolve_many(self, to_fields: List[Any]) -> List[Optional[str]]:
+        """Route several messages against the same snapshot of the index."""
+        with self._lock:
+            snapshot = (self._ordered, self._by_id, self._by_name, self._by_alias)
+        return [self._resolve(to_field, *snapshot) for to_field in to_fields]
+
+    @staticmethod
+    def _resolve(
+        to_field: Any,
+        ordered: List[Dict[str, Any]],
+        by_id: Dict[str, Dict[str, Any]],
+        by_name: Dict[str, Dict[str, Any]],
+        by_alias: Dict[str, Dict[str, Any]],
+    ) -> Optional[str]:
+        if not ordered:
+            return None
+
+        recipients: List[str] = []
+        if isinstance(to_field, str):
+            recipients = [to_field]
+        elif isinstance(to_field, list):
+            recipients = [str(x) for x in to_field]
+
+        for r in recipients:
+            addr = r.strip().lower()
+            if "@" not in addr:
+                continue
+            local = addr.split("@", 1)[0]
+
+            # PRIORITY 1: Check for dedicated mailbox (exact match)
+            if local in by_alias:
+                return by_alias[local]["_id"]
+
+            # PRIORITY 2: Check for plus-tag routing (backward compatibility)
+            if "+" in local:
+                hint = local.split("+", 1)[1]
+                if hint in by_id:
+                    return hint
+                if hint in by_name:
+                    return by_name[hint]["_id"]
+
+        # PRIORITY 3: Default to first daemon
+        return ordered[0]["_id"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "daemons": len(self._ordered),
+            "ageSeconds": round(time.time() - self._loaded_at, 3) if self._loaded_at else None,
+        }
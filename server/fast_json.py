@@ -0,0 +1,51 @@
+"""
+JSON helpers with an optional orjson fast path.
+
+orjson parses `bytes` directly and serializes several times faster than
+the standard library. When it is not installed every helper falls back to
+`json` with the same call signatures.
+"""
+
+from typing import Any, Union
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:
+    orjson = None
+    ORJSONResponse = None
+
+HAS_ORJSON = orjson is not None
+
+# Default response class for every route
+DefaultJSONResponse = ORJSONResponse if HAS_ORJSON else JSONResponse
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parse JSON from bytes or str. Raises ValueError on malformed input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def loads_lenient(raw: bytes) -> Any:
+    """
+    Parse a request body, tolerating invalid UTF-8.
+
+    The fast path parses the raw bytes without decoding them first; only if
+    that fails are undecodable bytes dropped and the body parsed again.
+    """
+    try:
+        return loads(raw)
+    except ValueError:
+        return json.loads(raw.decode("utf-8", errors="ignore"))
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -1,13 +1,45 @@
 """
 Hyperspell client helper for managing daemon memories.
+
+Reads and writes go through a MemoryStore chosen by MEMORY_BACKEND:
+"hyperspell" (default) or "sqlite" for a local FTS5 index.
 """
+import logging
 import os
-from typing import Dict, List, Optional, Any
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Any, Sequence
 from hyperspell import Hyperspell
 
+from memory_cache import MemoryCache
+from metrics import REGISTRY
+from tracing import TRACER
+from memory_store import (
+    HyperspellMemoryStore,
+    MemoryServiceUnavailable,
+    MemoryStore,
+    SQLiteMemoryStore,
+    default_sqlite_path,
+)
+
+logger = logging.getLogger(__name__)
+
+MEMORY_STORE_SECONDS = REGISTRY.histogram(
+    "memory_store_seconds", "Memory store call latency", ("backend", "op", "outcome"),
+)
+
 # Initialize Hyperspell client
 _hyperspell_client: Optional[Hyperspell] = None
 
+_memory_store: Optional[MemoryStore] = None
+
+# Read cache for recent and searched memories
+memory_cache = MemoryCache(
+    ttl_seconds=float(os.getenv("MEMORY_CACHE_TTL_SECONDS", "60")),
+    max_daemons=int(os.getenv("MEMORY_CACHE_MAX_DAEMONS", "1000")),
+    max_searches=int(os.getenv("MEMORY_CACHE_MAX_SEARCHES", "512")),
+)
+
 
 def get_hyperspell_client() -> Optional[Hyperspell]:
     """Get or create the Hyperspell client instance."""
@@ -23,7 +55,40 @@ def get_hyperspell_client() -> Optional[Hyperspell]:
     return _hyperspell_client
 
 
-def add_daemon_memory(
+def get_memory_store() -> MemoryStore:
+    """Get or create the memory store selected by MEMORY_BACKEND."""
+    global _memory_store
+
+    if _memory_store is None:
+        backend = os.getenv("MEMORY_BACKEND", "hyperspell").lower()
+        if backend == "sqlite":
+            _memory_store = SQLiteMemoryStore(default_sqlite_path())
+        else:
+            if backend != "hyperspell":
+                logger.warning(f"Unknown MEMORY_BACKEND {backend!r}; using hyperspell")
+            _memory_store = HyperspellMemoryStore(get_hyperspell_client)
+        logger.info(f"Memory backend: {_memory_store.name}")
+
+    return _memory_store
+
+
+@contextmanager
+def _store_call(store: MemoryStore, op: str, **attributes: Any) -> Iterator[MemoryStore]:
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with TRACER.span(f"memory.{op}", backend=store.name, cache="miss", **attributes):
+            yield store
+        outcome = "ok"
+    finally:
+        MEMORY_STORE_SECONDS.observe(time.perf_counter() - started, backend=store.name, op=op, outcome=outcome)
+
+
+def _cache_hit(op: str, **attributes: Any) -> None:
+    TRACER.record(f"memory.{op}", time.perf_counter(), cache="hit", **attributes)
+
+
+def build_daemon_memory(
     daemon_id: str,
     daemon_name: str,
     caption: str,
@@ -31,9 +96,11 @@ def add_daemon_memory(
     source: str,
     content_type: str,
     timestamp: Optional[int] = None,
-) -> bool:
+) -> Dict[str, Any]:
     """
-    Add a memory to Hyperspell for a specific daemon.
+    Build the memory record for a consumed piece of content.
+
+    The record is plain JSON so it can be queued or spooled before writing.
 
     Args:
         daemon_id: The unique ID of the daemon
@@ -45,36 +112,86 @@ def add_daemon_memory(
         timestamp: Optional timestamp (defaults to current time)
 
     Returns:
-        True if successful, False otherwise
+        Dict with daemon_id, text, collection, title, resource_id and timestamp
     """
-    client = get_hyperspell_client()
-    if not client:
-        print("[WARNING] Hyperspell client not available - skipping memory write")
-        return False
-
-    try:
+    return {
+        "daemon_id": daemon_id,
         # Create memory text that includes all relevant context
-        memory_text = f"Daemon: {daemon_name}\nSource: {source}\nContent: {caption}\nRoast: {roast}"
-
+        "text": f"Daemon: {daemon_name}\nSource: {source}\nContent: {caption}\nRoast: {roast}",
         # Use daemon ID as collection to group memories by daemon
-        collection = f"daemon-{daemon_id}"
+        "collection": f"daemon-{daemon_id}",
+        "title": f"{daemon_name}: {caption[:50]}",
+        "resource_id": f"{daemon_id}-{timestamp}" if timestamp else None,
+        "timestamp": timestamp,
+    }
+
+
+def write_memory(memory: Dict[str, Any]) -> None:
+    """
+    Write a record from build_daemon_memory to the memory store.
+
+    Raises:
+        MemoryServiceUnavailable: If the store has no Hyperspell client
+        Exception: Whatever the store raises on failure
+    """
+    with _store_call(get_memory_store(), "add", daemonId=memory.get("daemon_id")) as store:
+        store.add(memory)
+    _record_cache_write(memory)
+
 
-        # Add memory to Hyperspell
-        result = client.memories.add(
-            text=memory_text,
-            collection=collection,
-            title=f"{daemon_name}: {caption[:50]}",
-            resource_id=f"{daemon_id}-{timestamp}" if timestamp else None,
-        )
+def write_memories(memories: Sequence[Dict[str, Any]]) -> List[Optional[Exception]]:
+    """
+    Write several records from build_daemon_memory with the store's bulk call.
+
+    Returns:
+        Per record, None if it was written or the exception it failed with
+
+    Raises:
+        MemoryServiceUnavailable: If the store has no Hyperspell client
+    """
+    with _store_call(get_memory_store(), "add_many", records=len(memories)) as store:
+        errors = store.add_many(memories)
+    for memory, error in zip(memories, errors):
+        if error is None:
+            _record_cache_write(memory)
+    return errors
 
-        print(f"[INFO] Added memory to Hyperspell for daemon {daemon_name}: {result.status}")
-        return True
 
+def _record_cache_write(memory: Dict[str, Any]) -> None:
+    daemon_id = memory.get("daemon_id") or memory["collection"].split("-", 1)[-1]
+    memory_cache.record_write(daemon_id, {"content": memory["text"], "title": memory["title"]})
+
+
+def add_daemon_memory(
+    daemon_id: str,
+    daemon_name: str,
+    caption: str,
+    roast: str,
+    source: str,
+    content_type: str,
+    timestamp: Optional[int] = None,
+) -> bool:
+    """
+    Add a memory for a specific daemon, synchronously.
+
+    Request handlers should submit build_daemon_memory() records to the
+    background MemoryWriter instead.
+
+    Returns:
+        True if successful, False otherwise
+    """
+    try:
+        write_memory(build_daemon_memory(
+            daemon_id, daemon_name, caption, roast, source, content_type, timestamp,
+        ))
+    except MemoryServiceUnavailable:
+        logger.warning("Hyperspell client not available - skipping memory write")
+        return False
     except Exception as e:
-        print(f"[ERROR] Failed to add memory to Hyperspell: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Failed to add memory: {e}")
         return False
+    logger.info(f"Added memory for daemon {daemon_name}")
+    return True
 
 
 def search_daemon_memories(
@@ -85,6 +202,9 @@ def search_daemon_memories(
     """
     Search for memories related to a specific daemon.
 
+    Results are cached per (daemon, query, limit) until the TTL expires or
+    a new memory is written for the daemon.
+
     Args:
         daemon_id: The unique ID of the daemon
         query: The search query
@@ -93,41 +213,24 @@ def search_daemon_memories(
     Returns:
         List of memory objects with content and metadata
     """
-    client = get_hyperspell_client()
-    if not client:
-        print("[WARNING] Hyperspell client not available - returning empty results")
-        return []
+    cached = memory_cache.get_search(daemon_id, query, limit)
+    if cached is not None:
+        _cache_hit("search", daemonId=daemon_id)
+        return cached
 
     try:
-        # Search - filter by collection in query
-        search_query = f"{query} daemon:{daemon_id}" if query else f"daemon:{daemon_id}"
-        response = client.memories.search(
-            query=search_query,
-            max_results=limit,
-        )
-
-        # Extract results from response
-        if hasattr(response, 'results'):
-            # Filter results to only include those from this daemon's collection
-            collection = f"daemon-{daemon_id}"
-            filtered_results = []
-            for r in response.results:
-                # Check if the result is from the correct collection
-                if hasattr(r, 'collection') and r.collection == collection:
-                    filtered_results.append({"content": r.content, "title": r.title if hasattr(r, 'title') else ""})
-                elif not hasattr(r, 'collection'):
-                    # If no collection attribute, include it (backward compatibility)
-                    filtered_results.append({"content": r.content, "title": r.title if hasattr(r, 'title') else ""})
-            return filtered_results[:limit]
-        else:
-            return []
-
+        with _store_call(get_memory_store(), "search", daemonId=daemon_id) as store:
+            results = store.search(daemon_id, query, limit)
+    except MemoryServiceUnavailable:
+        logger.warning("Hyperspell client not available - returning empty results")
+        return []
     except Exception as e:
-        print(f"[ERROR] Failed to search Hyperspell memories: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"Failed to search memories: {e}")
         return []
 
+    memory_cache.put_search(daemon_id, query, limit, results)
+    return results
+
 
 def get_recent_daemon_memories(
     daemon_id: str,
@@ -136,6 +239,9 @@ def get_recent_daemon_memories(
     """
     Get the most recent memories for a specific daemon.
 
+    Served from the memory cache when a fresh entry covers `limit`; memories
+    written through this process are added to the cached entry directly.
+
     Args:
         daemon_id: The unique ID of the daemon
         limit: Maximum number of results to return
@@ -143,36 +249,71 @@ def get_recent_daemon_memories(
     Returns:
         List of memory objects with content and metadata
     """
-    client = get_hyperspell_client()
-    if not client:
-        print("[WARNING] Hyperspell client not available - returning empty results")
-        return []
+    cached = memory_cache.get_recent(daemon_id, limit)
+    if cached is not None:
+        _cache_hit("recent", daemonId=daemon_id)
+        return cached
 
     try:
-        # Query for recent memories - use daemon ID in query
-        response = client.memories.search(
-            query=f"daemon:{daemon_id}",
-            max_results=limit,
-        )
-
-        # Extract results from response
-        if hasattr(response, 'results'):
-            # Filter results to only include those from this daemon's collection
-            collection = f"daemon-{daemon_id}"
-            filtered_results = []
-            for r in response.results:
-                # Check if the result is from the correct collection
-                if hasattr(r, 'collection') and r.collection == collection:
-                    filtered_results.append({"content": r.content, "title": r.title if hasattr(r, 'title') else ""})
-                elif not hasattr(r, 'collection'):
-                    # If no collection attribute, include it (backward compatibility)
-                    filtered_results.append({"content": r.content, "title": r.title if hasattr(r, 'title') else ""})
-            return filtered_results[:limit]
+        with _store_call(get_memory_store(), "recent", daemonId=daemon_id) as store:
+            results = store.recent(daemon_id, limit)
+    except MemoryServiceUnavailable:
+        logger.warning("Hyperspell client not available - returning empty results")
+        return []
+    except Exception as e:
+        logger.error(f"Failed to fetch recent memories: {e}")
+        return []
+
+    memory_cache.put_recent(daemon_id, limit, results)
+    return results
+
+
+def get_recent_memories_for_daemons(
+    daemon_ids: Sequence[str],
+    limit: int = 10,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Get the most recent memories for several daemons at once.
+
+    Cached daemons are answered from the memory cache; the rest are fetched
+    in one call to the store, which queries them concurrently or in a
+    single query depending on the backend. A daemon whose fetch fails gets
+    an empty list (not cached) without affecting the others.
+
+    Args:
+        daemon_ids: The daemons to fetch
+        limit: Maximum number of results per daemon
+
+    Returns:
+        Dict mapping every requested daemon ID to its memories
+    """
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    missing: List[str] = []
+    for daemon_id in dict.fromkeys(daemon_ids):
+        cached = memory_cache.get_recent(daemon_id, limit)
+        if cached is not None:
+            results[daemon_id] = cached
         else:
-            return []
+            missing.append(daemon_id)
+    if not missing:
+        _cache_hit("recent_many", daemons=len(results))
+        return results
 
+    try:
+        with _store_call(get_memory_store(), "recent_many", daemons=len(missing), cached=len(results)) as store:
+            fetched = store.recent_many(missing, limit)
+    except MemoryServiceUnavailable:
+        logger.warning("Hyperspell client not available - returning empty results")
+        fetched = {}
     except Exception as e:
-        print(f"[ERROR] Failed to fetch recent memories: {e}")
-        import traceback
-        traceback.print_exc()
-        return []
+        logger.error(f"Failed to fetch recent memories for {len(missing)} daemons: {e}")
+        fetched = {}
+
+    for daemon_id in missing:
+        memories = fetched.get(daemon_id)
+        if memories is None:
+            results[daemon_id] = []
+            continue
+        memory_cache.put_recent(daemon_id, limit, memories)
+        results[daemon_id] = memories
+    return results
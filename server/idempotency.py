@@ -0,0 +1,143 @@
+"""
+In-process idempotency layer for webhook redeliveries.
+
+Recently completed feed ids are answered from a bounded LRU. Older ids are
+remembered in a Bloom filter, which can only say "definitely new" or
+"possibly seen", so a positive still has to be confirmed with Convex while
+a negative skips the round trip. A negative only speaks for ids this
+process committed or was warmed with, so the Convex writes behind it must
+stay idempotent. Concurrent deliveries of the same message id are
+coalesced so only one of them runs the pipeline.
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+import asyncio
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over a blake2b digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class IdempotencyFilter:
+    """
+    LRU of recent results, generational Bloom filter and per-key single-flight.
+
+    The Bloom filter is split into two generations; when the current one
+    reaches capacity the older one is dropped, which bounds memory and keeps
+    the false-positive rate near its target.
+    """
+
+    def __init__(self, lru_size: int = 10000, bloom_capacity: int = 1000000, error_rate: float = 0.001):
+        self.lru_size = lru_size
+        self.bloom_capacity = bloom_capacity
+        self.error_rate = error_rate
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bloom = BloomFilter(bloom_capacity, error_rate)
+        self._previous_bloom: Optional[BloomFilter] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.bloom_negatives = 0
+        self.bloom_positives = 0
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the remembered result for a recently completed key."""
+        result = self._recent.get(key)
+        if result is not None:
+            self._recent.move_to_end(key)
+            self.hits += 1
+        return result
+
+    def maybe_seen(self, key: str) -> bool:
+        """False means this process has definitely not completed `key`."""
+        seen = key in self._bloom or (self._previous_bloom is not None and key in self._previous_bloom)
+        if seen:
+            self.bloom_positives += 1
+        else:
+            self.bloom_negatives += 1
+        return seen
+
+    def remember(self, key: str, result: Dict[str, Any]) -> None:
+        """Record a successfully completed key."""
+        self._recent[key] = result
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+        self._add_to_bloom(key)
+
+    def warm(self, keys: Iterable[str]) -> None:
+        """Mark keys completed elsewhere (e.g. before a restart) as possibly seen."""
+        for key in keys:
+            self._add_to_bloom(key)
+
+    def _add_to_bloom(self, key: str) -> None:
+        if self._bloom.count >= self.bloom_capacity:
+            self._previous_bloom = self._bloom
+            self._bloom = BloomFilter(self.bloom_capacity, self.error_rate)
+        self._bloom.add(key)
+
+    async def single_flight(self, key: str, fn: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Run `fn` once per key at a time.
+
+        Callers arriving while a run is in progress wait for it and receive
+        its result (or its exception). Successful results are remembered.
+        """
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an uncontested failure is not reported as unhandled
+            future.exception()
+            raise
+        else:
+            self.remember(key, result)
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recent": len(self._recent),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "bloomPositives": self.bloom_positives,
+            "bloomNegatives": self.bloom_negatives,
+        }
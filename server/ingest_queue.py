@@ -0,0 +1,240 @@
+"""
+Durable local ingestion queue for webhook deliveries.
+
+Normalized email messages are persisted to a SQLite database before the
+webhook is acknowledged, then drained by a pool of workers. Delivery is
+at-least-once: a claimed message holds a lease, and if the worker dies
+before acknowledging it the lease expires and the message is handed out
+again.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueuedMessage:
+    """A message claimed from the queue by a worker."""
+    feed_id: str
+    message: Dict[str, Any]
+    attempts: int
+    enqueued_at: float
+
+
+class IngestQueue:
+    """SQLite-backed work queue with leases, retries and a dead-letter state."""
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 300.0,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        retention_seconds: float = 86400.0,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingest_queue (
+                feed_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                lease_expires_at REAL,
+                completed_at REAL,
+                last_error TEXT
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ingest_status ON ingest_queue (status, available_at)"
+        )
+
+    def enqueue(self, feed_id: str, message: Dict[str, Any]) -> bool:
+        """
+        Persist a message for processing.
+
+        Args:
+            feed_id: Idempotency key (the email message id)
+            message: Normalized message fields
+
+        Returns:
+            True if the message was newly enqueued, False if it was already known
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO ingest_queue (feed_id, payload, status, enqueued_at, available_at) "
+                "VALUES (?, ?, 'pending', ?, ?)",
+                (feed_id, fast_json.dumps(message).decode("utf-8"), now, now),
+            )
+            return cur.rowcount == 1
+
+    def enqueue_many(self, messages: List[Tuple[str, Dict[str, Any]]]) -> List[bool]:
+        """
+        Persist several messages in one transaction (a single fsync).
+
+        Args:
+            messages: (feed_id, normalized message) pairs
+
+        Returns:
+            Per message, True if newly enqueued, False if it was already known
+        """
+        now = time.time()
+        created: List[bool] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for feed_id, message in messages:
+                    cur = self._conn.execute(
+                        "INSERT OR IGNORE INTO ingest_queue (feed_id, payload, status, enqueued_at, available_at) "
+                        "VALUES (?, ?, 'pending', ?, ?)",
+                        (feed_id, fast_json.dumps(message).decode("utf-8"), now, now),
+                    )
+                    created.append(cur.rowcount == 1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return created
+
+    def claim(self) -> Optional[QueuedMessage]:
+        """
+        Lease the oldest available message.
+
+        Pending messages and in-flight messages whose lease has expired are
+        both eligible, which is what gives at-least-once delivery.
+
+        Returns:
+            The claimed message, or None if nothing is ready
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT feed_id, payload, attempts, enqueued_at FROM ingest_queue "
+                    "WHERE (status = 'pending' AND available_at <= ?) "
+                    "OR (status = 'inflight' AND lease_expires_at <= ?) "
+                    "ORDER BY enqueued_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                feed_id, payload, attempts, enqueued_at = row
+                self._conn.execute(
+                    "UPDATE ingest_queue SET status = 'inflight', attempts = attempts + 1, "
+                    "lease_expires_at = ? WHERE feed_id = ?",
+                    (now + self.lease_seconds, feed_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return QueuedMessage(
+            feed_id=feed_id,
+            message=fast_json.loads(payload),
+            attempts=attempts + 1,
+            enqueued_at=enqueued_at,
+        )
+
+    def ack(self, feed_id: str) -> None:
+        """Mark a claimed message as done and prune old finished rows."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE ingest_queue SET status = 'done', completed_at = ?, lease_expires_at = NULL, "
+                "last_error = NULL WHERE feed_id = ?",
+                (now, feed_id),
+            )
+            self._conn.execute(
+                "DELETE FROM ingest_queue WHERE status = 'done' AND completed_at < ?",
+                (now - self.retention_seconds,),
+            )
+
+    def nack(self, feed_id: str, error: str, retryable: bool = True) -> None:
+        """
+        Return a claimed message to the queue after a failure.
+
+        Retries back off exponentially; once max_attempts is reached, or the
+        failure is not retryable, the message is moved to the dead state.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM ingest_queue WHERE feed_id = ?", (feed_id,)
+            ).fetchone()
+            if row is None:
+                return
+            attempts = row[0]
+            if not retryable or attempts >= self.max_attempts:
+                self._conn.execute(
+                    "UPDATE ingest_queue SET status = 'dead', completed_at = ?, lease_expires_at = NULL, "
+                    "last_error = ? WHERE feed_id = ?",
+                    (now, error, feed_id),
+                )
+                logger.error(f"Ingest message {feed_id} dead-lettered after {attempts} attempts: {error}")
+                return
+            delay = self.retry_base_seconds * (2 ** (attempts - 1))
+            self._conn.execute(
+                "UPDATE ingest_queue SET status = 'pending', available_at = ?, lease_expires_at = NULL, "
+                "last_error = ? WHERE feed_id = ?",
+                (now + delay, error, feed_id),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report queue depth per state and queue lag.
+
+        Lag is the age of the oldest message that is still waiting to be
+        processed (pending or in flight).
+        """
+        now = time.time()
+        with self._lock:
+            counts = dict(
+                self._conn.execute(
+                    "SELECT status, COUNT(*) FROM ingest_queue GROUP BY status"
+                ).fetchall()
+            )
+            oldest = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM ingest_queue WHERE status IN ('pending', 'inflight')"
+            ).fetchone()[0]
+        return {
+            "pending": counts.get("pending", 0),
+            "inflight": counts.get("inflight", 0),
+            "done": counts.get("done", 0),
+            "dead": counts.get("dead", 0),
+            "lagSeconds": round(now - oldest, 3) if oldest is not None else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def default_queue_path() -> str:
+    """Resolve the queue database location from INGEST_QUEUE_PATH."""
+    return os.getenv(
+        "INGEST_QUEUE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_queue.sqlite3"),
+    )
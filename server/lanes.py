@@ -0,0 +1,131 @@
+"""
+Keyed FIFO lanes for per-daemon ordering.
+
+Work submitted under the same key runs strictly one at a time in
+submission order, so each feed for a daemon sees the traits written by the
+previous one. Different keys run in parallel up to `max_active` lanes.
+
+Fairness: lanes waiting for a slot are served round-robin, and a lane
+gives up its slot after `quantum` items if others are waiting, so a daemon
+with a deep backlog cannot hold a slot while other daemons queue behind it.
+"""
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Set, Tuple
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LaneFull(Exception):
+    """Raised when a lane already holds max_depth pending items."""
+
+
+class LaneScheduler:
+    """Serializes work per key while running different keys concurrently."""
+
+    def __init__(self, max_active: int = 64, max_depth: int = 256, quantum: int = 1):
+        self.max_active = max_active
+        self.max_depth = max_depth
+        self.quantum = max(1, quantum)
+        self._lanes: Dict[str, Deque[Tuple[Callable[[], Awaitable[Any]], contextvars.Context, asyncio.Future]]] = {}
+        self._ready: Deque[str] = deque()
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` in the lane for `key` and return its result.
+
+        `fn` runs in a copy of the caller's context, so context variables
+        set by the caller are visible to it. If the caller is cancelled while
+        `fn` is running, `fn` still runs to completion so the lane's ordering
+        is preserved.
+
+        Raises:
+            LaneFull: If the lane already holds max_depth items
+        """
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+        elif len(lane) >= self.max_depth:
+            self.rejected += 1
+            raise LaneFull(f"lane {key} has {len(lane)} pending items")
+
+        future = asyncio.get_running_loop().create_future()
+        lane.append((fn, contextvars.copy_context(), future))
+        if key not in self._running and len(lane) == 1:
+            self._ready.append(key)
+        self._dispatch()
+        return await future
+
+    def _dispatch(self) -> None:
+        while self._ready and len(self._running) < self.max_active:
+            key = self._ready.popleft()
+            self._running.add(key)
+            task = asyncio.create_task(self._drain(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: str) -> None:
+        lane = self._lanes[key]
+        try:
+            served = 0
+            # Keep the slot while nobody else is waiting for one
+            while lane and (served < self.quantum or not self._ready):
+                fn, context, future = lane.popleft()
+                if future.cancelled():
+                    continue
+                served += 1
+                try:
+                    # Task(context=) is 3.11+; creating the task inside the context works on 3.9
+                    result = await context.run(asyncio.create_task, fn())
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except BaseException as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                self.completed += 1
+        finally:
+            self._running.discard(key)
+            if lane:
+                # Back of the line behind the other waiting lanes
+                self._ready.append(key)
+            else:
+                self._lanes.pop(key, None)
+            self._dispatch()
+
+    async def close(self) -> None:
+        """Cancel running lanes and fail anything still queued."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for lane in self._lanes.values():
+            for _fn, _context, future in lane:
+                future.cancel()
+        self._lanes.clear()
+        self._ready.clear()
+
+    def depth(self, key: str) -> int:
+        lane = self._lanes.get(key)
+        return (len(lane) if lane else 0) + (1 if key in self._running else 0)
+
+    def stats(self) -> Dict[str, Any]:
+        depths = {key: self.depth(key) for key in self._lanes}
+        return {
+            "lanes": len(depths),
+            "running": len(self._running),
+            "waiting": len(self._ready),
+            "maxDepth": max(depths.values(), default=0),
+            "depths": dict(sorted(depths.items(), key=lambda kv: kv[1], reverse=True)[:10]),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
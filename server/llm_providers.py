@@ -9,9 +9,23 @@ from typing import Dict, Any, Optional
 import os
 import json
 import logging
+import time
+
+from metrics import REGISTRY
+from tracing import TRACER
 
 logger = logging.getLogger(__name__)
 
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "llm_call_seconds", "LLM generation latency", ("provider", "outcome"),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by LLM providers", ("provider", "kind"),
+)
+LLM_PARSE_SECONDS = REGISTRY.histogram(
+    "llm_parse_seconds", "Time to extract and parse JSON from LLM output", ("outcome",),
+)
+
 
 class LLMResponse:
     """Unified response format from all LLM providers."""
@@ -22,6 +36,7 @@ class LLMResponse:
 
     def parse_json(self) -> Dict[str, Any]:
         """Parse JSON from response content."""
+        started = time.perf_counter()
         try:
             # Try to extract JSON from markdown code blocks if present
             content = self.content.strip()
@@ -34,8 +49,11 @@ class LLMResponse:
                 end = content.find("```", start)
                 content = content[start:end].strip()
 
-            return json.loads(content)
+            parsed = json.loads(content)
+            LLM_PARSE_SECONDS.observe(time.perf_counter() - started, outcome="ok")
+            return parsed
         except json.JSONDecodeError as e:
+            LLM_PARSE_SECONDS.observe(time.perf_counter() - started, outcome="error")
             logger.error(f"Failed to parse JSON from LLM response: {e}")
             logger.error(f"Content: {self.content}")
             raise ValueError(f"Invalid JSON in LLM response: {e}")
@@ -44,9 +62,35 @@ class LLMResponse:
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
+    name = "unknown"
+
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
 
+    def _record_call(
+        self,
+        started: float,
+        outcome: str,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        model: Optional[str] = None,
+        error: Optional[Exception] = None,
+    ) -> None:
+        """Record latency and token usage of one generate_content call, and trace it."""
+        LLM_CALL_SECONDS.observe(time.perf_counter() - started, provider=self.name, outcome=outcome)
+        if isinstance(prompt_tokens, int):
+            LLM_TOKENS.inc(prompt_tokens, provider=self.name, kind="prompt")
+        if isinstance(completion_tokens, int):
+            LLM_TOKENS.inc(completion_tokens, provider=self.name, kind="completion")
+        TRACER.record(
+            "llm.generate", started,
+            error=f"{type(error).__name__}: {error}" if error is not None else None,
+            provider=self.name,
+            model=model,
+            promptTokens=prompt_tokens if isinstance(prompt_tokens, int) else None,
+            completionTokens=completion_tokens if isinstance(completion_tokens, int) else None,
+        )
+
     @abstractmethod
     def generate_content(self, prompt: str, **kwargs) -> LLMResponse:
         """
@@ -70,14 +114,17 @@ class LLMProvider(ABC):
 class GeminiProvider(LLMProvider):
     """Google Gemini provider implementation."""
 
+    name = "gemini"
+
     def __init__(self, api_key: Optional[str] = None):
         super().__init__(api_key or os.getenv("GEMINI_API_KEY"))
+        self.model_name = "gemini-2.0-flash-exp"
         self.model = None
         if self.api_key:
             try:
                 import google.generativeai as genai
                 genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel("gemini-2.0-flash-exp")
+                self.model = genai.GenerativeModel(self.model_name)
                 logger.info("Gemini provider initialized successfully")
             except ImportError:
                 logger.warning("google-generativeai package not installed")
@@ -89,6 +136,7 @@ class GeminiProvider(LLMProvider):
         if not self.model:
             raise RuntimeError("Gemini model not initialized")
 
+        started = time.perf_counter()
         try:
             response = self.model.generate_content(
                 prompt,
@@ -97,8 +145,18 @@ class GeminiProvider(LLMProvider):
                     "max_output_tokens": kwargs.get("max_tokens", 1024),
                 }
             )
-            return LLMResponse(response.text, response)
+            # .text raises on blocked or empty candidates; read it before counting a success
+            text = response.text
+            usage = getattr(response, "usage_metadata", None)
+            self._record_call(
+                started, "ok",
+                getattr(usage, "prompt_token_count", None),
+                getattr(usage, "candidates_token_count", None),
+                model=self.model_name,
+            )
+            return LLMResponse(text, response)
         except Exception as e:
+            self._record_call(started, "error", model=self.model_name, error=e)
             logger.error(f"Gemini generation failed: {e}")
             raise RuntimeError(f"Gemini API error: {e}")
 
@@ -110,6 +168,8 @@ class GeminiProvider(LLMProvider):
 class ClaudeProvider(LLMProvider):
     """Anthropic Claude provider implementation."""
 
+    name = "claude"
+
     def __init__(self, api_key: Optional[str] = None):
         super().__init__(api_key or os.getenv("ANTHROPIC_API_KEY"))
         self.client = None
@@ -128,9 +188,11 @@ class ClaudeProvider(LLMProvider):
         if not self.client:
             raise RuntimeError("Claude client not initialized")
 
+        model = kwargs.get("model", "claude-3-5-sonnet-20241022")
+        started = time.perf_counter()
         try:
             response = self.client.messages.create(
-                model=kwargs.get("model", "claude-3-5-sonnet-20241022"),
+                model=model,
                 max_tokens=kwargs.get("max_tokens", 1024),
                 temperature=kwargs.get("temperature", 0.7),
                 messages=[
@@ -138,8 +200,16 @@ class ClaudeProvider(LLMProvider):
                 ]
             )
             content = response.content[0].text
+            usage = getattr(response, "usage", None)
+            self._record_call(
+                started, "ok",
+                getattr(usage, "input_tokens", None),
+                getattr(usage, "output_tokens", None),
+                model=model,
+            )
             return LLMResponse(content, response)
         except Exception as e:
+            self._record_call(started, "error", model=model, error=e)
             logger.error(f"Claude generation failed: {e}")
             raise RuntimeError(f"Claude API error: {e}")
 
@@ -151,6 +221,8 @@ class ClaudeProvider(LLMProvider):
 class OpenAIProvider(LLMProvider):
     """OpenAI GPT provider implementation."""
 
+    name = "openai"
+
     def __init__(self, api_key: Optional[str] = None):
         super().__init__(api_key or os.getenv("OPENAI_API_KEY"))
         self.client = None
@@ -169,9 +241,11 @@ class OpenAIProvider(LLMProvider):
         if not self.client:
             raise RuntimeError("OpenAI client not initialized")
 
+        model = kwargs.get("model", "gpt-4o")
+        started = time.perf_counter()
         try:
             response = self.client.chat.completions.create(
-                model=kwargs.get("model", "gpt-4o"),
+                model=model,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that responds with valid JSON."},
                     {"role": "user", "content": prompt}
@@ -181,8 +255,16 @@ class OpenAIProvider(LLMProvider):
                 response_format={"type": "json_object"}
             )
             content = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+            self._record_call(
+                started, "ok",
+                getattr(usage, "prompt_tokens", None),
+                getattr(usage, "completion_tokens", None),
+                model=model,
+            )
             return LLMResponse(content, response)
         except Exception as e:
+            self._record_call(started, "error", model=model, error=e)
             logger.error(f"OpenAI generation failed: {e}")
             raise RuntimeError(f"OpenAI API error: {e}")
 
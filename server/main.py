@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import os
-from fastapi import FastAPI, APIRouter, Request, HTTPException
+from fastapi import FastAPI, APIRouter, Request, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 from convex import ConvexClient
+import asyncio
+import contextvars
 import hmac
 import hashlib
-import json
+import tempfile
+import time
 import uuid
 from typing import Any, Dict, List, Optional
 
@@ -26,11 +30,50 @@ from schemas import (
 from prompt_builder import build_analysis_prompt, build_evolution_prompt, build_name_prompt
 from llm_providers import get_llm_provider, LLMProvider
 from personality import build_personality_context
-from hyperspell_client import add_daemon_memory, search_daemon_memories, get_recent_daemon_memories
+from hyperspell_client import (
+    MemoryServiceUnavailable,
+    build_daemon_memory,
+    get_recent_memories_for_daemons,
+    memory_cache,
+    search_daemon_memories,
+    write_memories,
+)
+from memory_writer import MemoryWriter, default_spool_path
+from ingest_queue import IngestQueue, default_queue_path
+from daemon_index import DaemonIndex
+from manager_context import ManagerContext
+from brainstorm_cache import BrainstormCache
+from brainstorm_planner import BrainstormPlanner
+from convex_async import AsyncConvex
+from admission import AdmissionController
+from lanes import LaneFull, LaneScheduler
+from trait_coalescer import TraitCoalescer
+from pipeline import STAGE_SECONDS, PipelineExit, StageGraph, collect_timings, drain_background, server_timing
+from metrics import REGISTRY, render_prometheus
+from profiling import Profiler
+from tracing import TRACER, JsonlExporter, MemoryExporter, annotate, parse_traceparent, traced
+from idempotency import IdempotencyFilter
+from attachments import ALLOWED_IMAGE_TYPES, AttachmentStore, spill_attachment
+from structured_logging import configure_logging, Sampler, PayloadRingBuffer
+import fast_json
+from fast_json import DefaultJSONResponse
 import logging
 
 logger = logging.getLogger(__name__)
 
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"),
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds", "HTTP request latency", ("method", "route"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests being served")
+BRAINSTORM_PROMPT_TOKENS = REGISTRY.histogram(
+    "brainstorm_prompt_tokens", "Estimated brainstorm prompt size", ("mode",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+CACHE_HIT_RATIO = REGISTRY.gauge("cache_hit_ratio", "Hits / lookups since startup", ("cache",))
+
 
 load_dotenv()
 # Also load optional .env.local from server dir and project root
@@ -41,9 +84,51 @@ try:
 except Exception:
     pass
 
+configure_logging()
+
 MOCK_MODE = os.getenv("MOCK_MODE", "true").lower() == "true"
 
-app = FastAPI(debug=True)
+app = FastAPI(debug=True, default_response_class=DefaultJSONResponse)
+
+
+@app.middleware("http")
+async def _record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Label by route template so path parameters don't explode cardinality
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, route=path)
+        HTTP_REQUESTS.inc(method=request.method, route=path, status=status)
+
+
+# Scrapes and debug reads would otherwise push real requests out of the trace store
+_UNTRACED_PREFIXES = ("/metrics", "/health", "/debug/")
+
+
+@app.middleware("http")
+async def _trace_request(request: Request, call_next):
+    if request.url.path.startswith(_UNTRACED_PREFIXES):
+        return await call_next(request)
+    # Continue the caller's trace when it sends a W3C traceparent header
+    parent = parse_traceparent(request.headers.get("traceparent"))
+    with TRACER.span("http.request", parent=parent, method=request.method, path=request.url.path) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        span.set(route=getattr(route, "path", "unmatched"), status=response.status_code)
+        if response.status_code >= 500:
+            span.status = "error"
+    response.headers["X-Trace-Id"] = span.trace_id
+    return response
+
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -64,6 +149,38 @@ if CONVEX_URL:
     except Exception:
         convex_client = None
 
+# All request-path Convex calls go through this wrapper so they never block the event loop
+convex: Optional[AsyncConvex] = None
+if convex_client is not None:
+    _convex_workers = int(os.getenv("CONVEX_MAX_WORKERS", "16"))
+    convex = AsyncConvex(
+        convex_client,
+        max_workers=_convex_workers,
+        max_concurrency=int(os.getenv("CONVEX_MAX_CONCURRENCY", str(_convex_workers))),
+        timeout=float(os.getenv("CONVEX_TIMEOUT_SECONDS", "10")),
+    )
+
+# Brainstorm context, kept current by daemon index reloads, feeds and memories
+manager_context = ManagerContext(memory_window=int(os.getenv("MANAGER_CONTEXT_MEMORIES", "3")))
+brainstorm_cache = BrainstormCache(ttl_seconds=float(os.getenv("BRAINSTORM_CACHE_TTL_SECONDS", "300")))
+brainstorm_planner = BrainstormPlanner(
+    token_budget=int(os.getenv("BRAINSTORM_TOKEN_BUDGET", "6000")),
+    top_k=int(os.getenv("BRAINSTORM_TOP_K", "40")),
+    hierarchical_min=int(os.getenv("BRAINSTORM_HIERARCHICAL_MIN", "200")),
+    group_size=int(os.getenv("BRAINSTORM_GROUP_SIZE", "25")),
+    concurrency=int(os.getenv("BRAINSTORM_CONCURRENCY", "8")),
+)
+
+# Routing index kept fresh by a Convex subscription (TTL polling as fallback)
+daemon_index: Optional[DaemonIndex] = None
+if convex_client is not None:
+    daemon_index = DaemonIndex(
+        convex_client,
+        ttl_seconds=float(os.getenv("DAEMON_INDEX_TTL_SECONDS", "30")),
+        on_load=manager_context.sync,
+    )
+_daemon_index_task: Optional[asyncio.Task] = None
+
 # LLM provider initialization
 LLM_FALLBACK_ENABLED = os.getenv("LLM_FALLBACK_ENABLED", "true").lower() == "true"
 llm_provider: Optional[LLMProvider] = None
@@ -77,6 +194,131 @@ except Exception as e:
     logger.error(f"Failed to initialize LLM provider: {e}")
     llm_provider = None
 
+# LLM calls block a thread for seconds; their own pool keeps them from starving
+# the default executor that serves the short asyncio.to_thread hops
+_llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_MAX_WORKERS", "16")), thread_name_prefix="llm")
+
+
+async def _generate(prompt: str):
+    """Call the LLM provider on the LLM pool, in the caller's context (for tracing)."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_llm_executor, context.run, llm_provider.generate_content, prompt)
+
+# Webhook ingestion mode: "sync" processes inline, "queue" persists and returns 202
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "1.0"))
+ingest_queue: Optional[IngestQueue] = None
+if INGEST_MODE == "queue":
+    ingest_queue = IngestQueue(
+        default_queue_path(),
+        lease_seconds=float(os.getenv("INGEST_LEASE_SECONDS", "300")),
+        max_attempts=int(os.getenv("INGEST_MAX_ATTEMPTS", "5")),
+    )
+# Feed commit mode: "single" writes the completed feed with one Convex mutation;
+# "two-phase" records it as processing before analysis (useful with slow LLMs)
+FEED_COMMIT_MODE = os.getenv("FEED_COMMIT_MODE", "single").lower()
+# Admission control: concurrency cap and wait-queue depth per endpoint. When
+# ADMISSION_DEGRADE_AFTER_SECONDS is set, sustained overload switches analysis
+# to the mock path instead of queueing more LLM calls.
+_degrade_after = os.getenv("ADMISSION_DEGRADE_AFTER_SECONDS")
+_admission_defaults = dict(
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "10")),
+    retry_after=int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5")),
+    degrade_after=float(_degrade_after) if _degrade_after else None,
+)
+analyze_admission = AdmissionController(
+    "analyze",
+    max_concurrency=int(os.getenv("ADMISSION_ANALYZE_CONCURRENCY", "16")),
+    max_queue=int(os.getenv("ADMISSION_ANALYZE_QUEUE", "64")),
+    **_admission_defaults,
+)
+feed_admission = AdmissionController(
+    "feed-by-email",
+    max_concurrency=int(os.getenv("ADMISSION_FEED_CONCURRENCY", "32")),
+    max_queue=int(os.getenv("ADMISSION_FEED_QUEUE", "256")),
+    **_admission_defaults,
+)
+
+# Per-daemon ordering of feed processing
+feed_lanes = LaneScheduler(
+    max_active=int(os.getenv("LANE_MAX_ACTIVE", "64")),
+    max_depth=int(os.getenv("LANE_MAX_DEPTH", "256")),
+    quantum=int(os.getenv("LANE_QUANTUM", "1")),
+)
+
+# Optional write-behind of daemon trait updates: feeds are committed at once,
+# their deltas are merged per daemon and written in one mutation
+trait_coalescer: Optional[TraitCoalescer] = None
+if convex is not None and os.getenv("TRAIT_WRITE_BEHIND", "false").lower() == "true":
+    trait_coalescer = TraitCoalescer(
+        convex,
+        index=daemon_index,
+        window=float(os.getenv("TRAIT_FLUSH_WINDOW_SECONDS", "2")),
+        max_staleness=float(os.getenv("TRAIT_MAX_STALENESS_SECONDS", "10")),
+    )
+
+# Hyperspell writes happen in the background, spooled to disk while it is down
+memory_writer = MemoryWriter(
+    write_memories,
+    default_spool_path(),
+    max_queue=int(os.getenv("MEMORY_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("MEMORY_BATCH_SIZE", "20")),
+    max_attempts=int(os.getenv("MEMORY_MAX_ATTEMPTS", "4")),
+    skip_errors=(MemoryServiceUnavailable,),
+)
+
+# Opt-in request profiling (X-Profile header / ?profile= with debug access, or 1-in-N sampling)
+PROFILE_PATHS = set(p.strip() for p in os.getenv("PROFILE_PATHS", "/feed-by-email,/analyze").split(",") if p.strip())
+profiler = Profiler(
+    sample_every=int(os.getenv("PROFILE_SAMPLE_EVERY", "0")),
+    interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+    store_size=int(os.getenv("PROFILE_STORE_SIZE", "20")),
+)
+
+# Request tracing: recent traces in memory for /debug/traces, optionally all spans to a JSONL file
+trace_store = MemoryExporter(max_traces=int(os.getenv("TRACE_STORE_SIZE", "100")))
+TRACER.add_exporter(trace_store)
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+if TRACE_EXPORT_PATH:
+    TRACER.add_exporter(JsonlExporter(TRACE_EXPORT_PATH))
+
+# Bulk delivery via /feed-by-email/batch
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))
+BATCH_MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", "1000"))
+_ingest_wakeup: Optional[asyncio.Event] = None
+_ingest_tasks: List[asyncio.Task] = []
+
+# Local idempotency in front of Convex for webhook redeliveries. The filter
+# knows the feeds this process committed (plus those loaded from Convex at
+# startup); ids it has not seen skip the pre-analysis lookup and rely on the
+# commit mutations, which report duplicates themselves.
+feed_dedup = IdempotencyFilter(
+    lru_size=int(os.getenv("DEDUP_LRU_SIZE", "10000")),
+    bloom_capacity=int(os.getenv("DEDUP_BLOOM_CAPACITY", "1000000")),
+)
+DEDUP_WARM_FEEDS = int(os.getenv("DEDUP_WARM_FEEDS", "5000"))
+
+# Decoded email attachments, referenced downstream by content hash
+attachment_store = AttachmentStore(
+    os.getenv("ATTACHMENT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "data-daemons-attachments")),
+    max_bytes=int(os.getenv("ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024))),
+)
+ATTACHMENT_RETENTION_SECONDS = float(os.getenv("ATTACHMENT_RETENTION_SECONDS", "86400"))
+ATTACHMENT_MAX_TOTAL_BYTES = int(os.getenv("ATTACHMENT_MAX_TOTAL_BYTES", str(1024 * 1024 * 1024)))
+ATTACHMENT_PURGE_INTERVAL_SECONDS = float(os.getenv("ATTACHMENT_PURGE_INTERVAL_SECONDS", "3600"))
+_attachment_purge_task: Optional[asyncio.Task] = None
+_attachment_purge_wakeup: Optional[asyncio.Event] = None
+_attachment_purge_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Webhook log sampling and raw payload capture for /debug/payloads
+webhook_log_sampler = Sampler(float(os.getenv("WEBHOOK_LOG_SAMPLE_RATE", "1.0")))
+payload_capture = PayloadRingBuffer(
+    capacity=int(os.getenv("PAYLOAD_CAPTURE_SIZE", "50")),
+    max_bytes=int(os.getenv("PAYLOAD_CAPTURE_MAX_BYTES", str(16 * 1024 * 1024))),
+)
+
 
 def _verify_agentmail_signature(raw_body: bytes, header_val: Optional[str]) -> bool:
     # Demo mode: allow bypass via MOCK_MODE or explicit toggle
@@ -95,9 +337,10 @@ def _verify_agentmail_signature(raw_body: bytes, header_val: Optional[str]) -> b
 
 
 def _whitelist_attachments(attachments: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Inline bodies are decoded to the attachment store; only metadata and a
+    # content-hash reference are passed downstream
     if not attachments:
         return []
-    allowed = {"image/png", "image/jpeg", "image/webp", "image/gif"}
     clean: List[Dict[str, Any]] = []
     for att in attachments:
         # Support both snake_case (AgentMail format) and camelCase (legacy)
@@ -108,18 +351,19 @@ def _whitelist_attachments(attachments: Optional[List[Dict[str, Any]]]) -> List[
             att.get("type") or
             ""
         ).lower()
-        if ctype in allowed:
-            clean.append({
-                "filename": att.get("filename"),
-                "contentType": ctype,
-                "size": att.get("size"),
-                # retain either base64 or url for downstream if present
-                "base64": att.get("base64") or att.get("content"),
-                "url": att.get("url"),
-            })
+        if ctype in ALLOWED_IMAGE_TYPES:
+            clean.append(spill_attachment(attachment_store, att, ctype))
+    if ATTACHMENT_MAX_TOTAL_BYTES and attachment_store.spilled_bytes > ATTACHMENT_MAX_TOTAL_BYTES // 10:
+        _request_attachment_purge()
     return clean
 
 
+def _request_attachment_purge() -> None:
+    # Called from worker threads (normalization runs in asyncio.to_thread)
+    if _attachment_purge_loop is not None and _attachment_purge_wakeup is not None:
+        _attachment_purge_loop.call_soon_threadsafe(_attachment_purge_wakeup.set)
+
+
 def _extract_message_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
     Extract message fields from various webhook payload formats.
@@ -187,62 +431,37 @@ def _extract_message_fields(payload: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def _resolve_daemon_id(to_field: Any) -> Optional[str]:
+async def _ensure_daemon_index() -> bool:
+    if daemon_index is None or convex is None:
+        return False
+    if not daemon_index.loaded:
+        # Cold start before the subscription delivered its first result
+        try:
+            daemon_index.load(await convex.query("daemons:all") or [])
+        except Exception as e:
+            logger.error(f"Failed to load daemon index: {e}")
+            return False
+    return True
+
+
+async def _resolve_daemon_id(to_field: Any) -> Optional[str]:
     # Accept string or list of strings; route to daemon based on email address
-    if convex_client is None:
-        return None
-    try:
-        daemons = convex_client.query("daemons:all", {}) or []
-    except Exception:
-        daemons = []
-    if not daemons:
+    if not await _ensure_daemon_index():
         return None
+    return daemon_index.resolve(to_field)
 
-    def pick_first():
-        return daemons[0]["_id"]
 
-    recipients: List[str] = []
-    if isinstance(to_field, str):
-        recipients = [to_field]
-    elif isinstance(to_field, list):
-        recipients = [str(x) for x in to_field]
+@app.on_event("startup")
+async def _start_daemon_index() -> None:
+    global _daemon_index_task
+    if daemon_index is not None:
+        _daemon_index_task = asyncio.create_task(daemon_index.run())
 
-    # Dedicated mailbox mappings (exact matches take priority)
-    mailbox_to_daemon = {
-        "nova-pet": "nova",
-        "pixel-pet": "pixel",
-        "echo-pet": "echo",
-    }
 
-    for r in recipients:
-        addr = r.strip().lower()
-        if "@" not in addr:
-            continue
-        local = addr.split("@", 1)[0]
-
-        # PRIORITY 1: Check for dedicated mailbox (exact match)
-        for mailbox_prefix, daemon_name in mailbox_to_daemon.items():
-            if local == mailbox_prefix:
-                # Match daemon by name
-                for d in daemons:
-                    if str(d.get("name", "")).lower() == daemon_name:
-                        return d["_id"]
-
-        # PRIORITY 2: Check for plus-tag routing (backward compatibility)
-        hint = None
-        if "+" in local:
-            hint = local.split("+", 1)[1]
-        # Try matching by _id or name
-        if hint:
-            for d in daemons:
-                if d.get("_id") == hint:
-                    return d["_id"]
-            for d in daemons:
-                if str(d.get("name", "")).lower() == hint.lower():
-                    return d["_id"]
-
-    # PRIORITY 3: Default to first daemon
-    return pick_first()
+@app.on_event("shutdown")
+async def _stop_daemon_index() -> None:
+    if _daemon_index_task is not None:
+        _daemon_index_task.cancel()
 
 
 @router.get("/health")
@@ -250,26 +469,49 @@ async def health():
     return {"status": "ok", "mock": MOCK_MODE}
 
 
+def _should_degrade(controller: AdmissionController) -> bool:
+    if controller.degraded:
+        controller.note_degraded()
+        return True
+    return False
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
+    async with analyze_admission.admit():
+        return await _run_analysis(payload, degrade=_should_degrade(analyze_admission))
+
+
+@traced("analyze")
+async def _run_analysis(payload: AnalyzeRequest, degrade: bool = False) -> AnalyzeResponse:
+    """
+    Shared analysis logic behind /analyze and the email feed pipeline.
+
+    Args:
+        payload: Content and current personality to analyze
+        degrade: Skip the LLM and answer with the mock analysis (used under overload)
+    """
     text = payload.text
     file_desc = payload.fileDescription
     image_url = payload.imageUrl
     image_b64 = payload.imageBase64
+    image_ref = payload.imageRef
     current_traits = payload.currentTraits.values or {}
     current_archetype_id = payload.currentArchetypeId
 
     # Build personality-aware prompt
-    prompt = build_analysis_prompt(text, file_desc, payload.currentTraits, current_archetype_id)
+    with STAGE_SECONDS.time(pipeline="analyze", stage="prompt_build"):
+        prompt = build_analysis_prompt(text, file_desc, payload.currentTraits, current_archetype_id)
 
     # Determine if we should use LLM or mocks
-    use_llm = not MOCK_MODE and llm_provider is not None
+    use_llm = not MOCK_MODE and llm_provider is not None and not degrade
+    annotate(mode="llm" if use_llm else "degraded" if degrade else "mock")
 
     if use_llm:
         try:
             # Call LLM provider
             logger.info("Calling LLM provider for analysis")
-            response = llm_provider.generate_content(prompt)
+            response = await _generate(prompt)
 
             # Parse JSON response
             result = response.parse_json()
@@ -295,7 +537,7 @@ async def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
             if text:
                 tags.append("text")
                 tags.append("long" if len(text) > 80 else "short")
-            if image_url or image_b64:
+            if image_url or image_b64 or image_ref:
                 tags.append("image")
 
             # Calculate new archetype after applying trait deltas
@@ -328,7 +570,7 @@ async def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
         length = len(text)
         tags.append("text")
         tags.append("long" if length > 80 else "short")
-    if image_url or image_b64:
+    if image_url or image_b64 or image_ref:
         tags.append("image")
 
     # Generate personality context for mock roast
@@ -411,70 +653,113 @@ async def remove_background(payload: RemoveBackgroundRequest) -> RemoveBackgroun
 # Defer router inclusion until after all routes are defined
 
 
-@router.post("/feed-by-email")
-async def feed_by_email(request: Request):
-    raw = await request.body()
-    sig = request.headers.get("X-AgentMail-Signature")
-    if not _verify_agentmail_signature(raw, sig):
-        raise HTTPException(status_code=401, detail="Invalid signature")
-
+async def _parse_webhook_payload(request: Request, raw: bytes) -> Dict[str, Any]:
+    content_type = request.headers.get("content-type", "").lower()
+    is_form = content_type.startswith(("application/x-www-form-urlencoded", "multipart/form-data"))
     try:
-        # Prefer explicit JSON parsing from raw for reliability
-        body_text = raw.decode("utf-8", errors="ignore")
-        payload = json.loads(body_text)
+        # Parse the raw bytes directly; no intermediate str on the fast path
+        payload = fast_json.loads_lenient(raw)
     except Exception as e:
-        # Attempt to parse as form-encoded fallback
+        if not is_form:
+            logger.warning("Malformed webhook payload: %s", e, extra={"bodySize": len(raw)})
+            raise HTTPException(status_code=400, detail="Malformed payload")
+        # Form-encoded deliveries carry the JSON in a field
         try:
             form = await request.form()
             body_text = form.get("payload") or form.get("data") or ""
-            payload = json.loads(body_text) if body_text else {}
+            payload = fast_json.loads(body_text) if body_text else {}
         except Exception as e2:
-            # Log the error details for debugging
-            print(f"[ERROR] Malformed payload - JSON parse error: {e}")
-            print(f"[ERROR] Form parse error: {e2}")
-            print(f"[ERROR] Raw body preview: {raw[:500]}")
+            # The raw body itself is available from the payload capture buffer
+            logger.warning(
+                "Malformed webhook payload: json error=%s, form error=%s",
+                e, e2, extra={"bodySize": len(raw)},
+            )
             raise HTTPException(status_code=400, detail="Malformed payload")
+    return payload
 
-    # Debug logging to capture actual webhook structure
-    print("=" * 80)
-    print("[WEBHOOK DEBUG] Received webhook payload")
-    print(f"[WEBHOOK DEBUG] Payload keys: {list(payload.keys())}")
-    print(f"[WEBHOOK DEBUG] Full payload: {json.dumps(payload, indent=2)[:2000]}")
-    print("=" * 80)
 
-    # Extract fields using smart extraction (handles multiple payload formats)
+def _normalize_message(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract message fields and fill defaults so the result is self-contained.
+
+    Image attachments are spilled to the attachment store here, so the
+    normalized message only carries their metadata. This does blocking file
+    I/O for large attachments; async callers should run it in a thread.
+    """
     fields = _extract_message_fields(payload)
+    return {
+        "to": fields["to"],
+        "subject": fields["subject"] or "",
+        "text": fields["text"] or "",
+        "html": fields["html"] or "",
+        "attachments": _whitelist_attachments(fields["attachments"]),
+        "message_id": fields["message_id"] or str(uuid.uuid4()),
+    }
+
+
+async def _process_feed(
+    fields: Dict[str, Any],
+    report_errors: bool = True,
+    daemon_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run the full feed pipeline for a normalized message.
 
-    to_field = fields["to"]
-    subject = fields["subject"] or ""
-    text = fields["text"] or ""
-    html = fields["html"] or ""
-    attachments = fields["attachments"] or []
-    message_id = fields["message_id"] or str(uuid.uuid4())
-
-    # Debug logging for extracted fields
-    print("[WEBHOOK DEBUG] Extracted fields:")
-    print(f"  to_field: {to_field}")
-    print(f"  subject: {subject}")
-    print(f"  text: {text[:100] if text else 'NONE'}...")
-    print(f"  message_id: {message_id}")
-    print(f"  attachments count: {len(attachments)}")
-    print("=" * 80)
+    Recently completed messages are answered locally, and concurrent
+    deliveries of the same message id share a single pipeline run.
 
+    Args:
+        fields: Output of _normalize_message
+        report_errors: Mark the feed as errored in Convex when analysis fails.
+            Queue workers disable this on attempts that will be retried.
+        daemon_id: Pre-resolved routing target; resolved from the recipient if omitted
+
+    Returns:
+        Response body describing the processed feed
+    """
+    message_id = fields["message_id"]
+    cached = feed_dedup.lookup(message_id)
+    if cached is not None:
+        annotate(cache="duplicate")
+        return {**cached, "status": "duplicate"}
+    return await feed_dedup.single_flight(message_id, lambda: _run_feed_pipeline(fields, report_errors, daemon_id))
+
+
+async def _run_feed_pipeline(
+    fields: Dict[str, Any],
+    report_errors: bool,
+    daemon_id: Optional[str] = None,
+) -> Dict[str, Any]:
     # Choose daemonId based on recipient; fallback to first available
-    daemon_id = _resolve_daemon_id(to_field)
+    if daemon_id is None:
+        with STAGE_SECONDS.time(pipeline="feed", stage="route"):
+            daemon_id = await _resolve_daemon_id(fields["to"])
     if not daemon_id:
         raise HTTPException(status_code=503, detail="Daemon routing unavailable")
 
-    # Pull daemon traits for analysis context
-    daemon_doc = None
+    # Feeds for one daemon run in order so each sees the traits the previous one wrote
     try:
-        daemon_doc = convex_client.query("daemons:get", {"id": daemon_id}) if convex_client else None
-    except Exception:
-        daemon_doc = None
+        return await feed_lanes.run(daemon_id, lambda: _run_daemon_feed(fields, report_errors, daemon_id))
+    except LaneFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+
+async def _run_daemon_feed(fields: Dict[str, Any], report_errors: bool, daemon_id: str) -> Dict[str, Any]:
+    """
+    Process one feed for a routed daemon as a stage graph.
+
+        daemon ─┐
+        lookup ─┴─> analyze ─┐
+              └──> start ────┴─> commit ──> memory (background)
 
-    current_traits = daemon_doc.get("traits", {}) if daemon_doc else {}
-    clean_atts = _whitelist_attachments(attachments)
+    `start` only does work in two-phase mode. The feed-record lookup and the
+    analysis are independent of startProcessing, so they overlap it, and the
+    Hyperspell write does not hold up the response.
+    """
+    subject = fields["subject"]
+    text = fields["text"]
+    message_id = fields["message_id"]
+    clean_atts = fields["attachments"]
 
     # Build content summary for feed record
     summary_bits: List[str] = []
@@ -485,14 +770,47 @@ async def feed_by_email(request: Request):
     content_summary = " | ".join([s for s in summary_bits if s]) or "(no subject/text)"
 
     now = int(__import__("time").time() * 1000)
+    two_phase = FEED_COMMIT_MODE == "two-phase"
 
-    # Idempotency check and start processing
-    if convex_client is None:
+    if convex is None:
         raise HTTPException(status_code=503, detail="Convex client unavailable")
-    try:
-        existing = convex_client.query("feeds:getByFeedId", {"feedId": message_id})
-        if not existing:
-            convex_client.mutation("feeds:startProcessing", {
+
+    async def load_daemon(_results: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Pull daemon traits for analysis context
+        daemon_doc = daemon_index.get(daemon_id)
+        if daemon_doc is None:
+            try:
+                daemon_doc = await convex.query("daemons:get", {"id": daemon_id})
+            except Exception:
+                daemon_doc = None
+        return daemon_doc
+
+    async def lookup(_results: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # The lookup only runs for ids the filter has seen, where it can save an
+        # analysis. For any other id, feeds:ingest (or startProcessing, a no-op
+        # for a known feed, and feeds:complete) reports a duplicate itself, so a
+        # redelivery that reached another replica is never committed twice
+        if not feed_dedup.maybe_seen(message_id):
+            return None
+        try:
+            existing = await convex.query("feeds:getByFeedId", {"feedId": message_id})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Convex start error: {e}")
+        if existing and existing.get("status") == "completed":
+            # Redelivery of a feed that already went through; nothing left to do
+            raise PipelineExit({
+                "status": "duplicate",
+                "feedId": message_id,
+                "daemonId": existing.get("daemonId", daemon_id),
+                "source": "email",
+            })
+        return existing
+
+    async def start(results: Dict[str, Any]) -> None:
+        if not two_phase or results["lookup"]:
+            return
+        try:
+            await convex.mutation("feeds:startProcessing", {
                 "feedId": message_id,
                 "daemonId": daemon_id,
                 "source": "email",
@@ -500,17 +818,18 @@ async def feed_by_email(request: Request):
                 "attachmentsMeta": clean_atts,
                 "now": now,
             })
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Convex start error: {e}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Convex start error: {e}")
 
-    # Invoke shared analysis pipeline (mocked for now)
-    try:
+    async def analyze_feed(results: Dict[str, Any]) -> AnalyzeResponse:
+        daemon_doc = results["daemon"]
+        current_traits = daemon_doc.get("traits", {}) if daemon_doc else {}
         # Prefer text; optionally pass one image if present
-        img_b64 = None
+        img_ref = None
         img_url = None
         if clean_atts:
             first = clean_atts[0]
-            img_b64 = first.get("base64")
+            img_ref = first.get("ref")
             img_url = first.get("url")
 
         req = AnalyzeRequest(
@@ -519,161 +838,659 @@ async def feed_by_email(request: Request):
             fileDescription=subject or None,
             text=text or None,
             imageUrl=img_url,
-            imageBase64=img_b64,
+            imageRef=img_ref,
             currentTraits={"values": current_traits, "active": []},
             dominantTrait=None,
         )
-        # Reuse the existing analyze logic
-        result: AnalyzeResponse = await analyze(req)
-    except HTTPException as he:
-        # Convert to Convex error status
+        # Reuse the existing analyze logic; admission was applied to the webhook itself
+        return await _run_analysis(req, degrade=_should_degrade(feed_admission))
+
+    async def commit(results: Dict[str, Any]) -> Dict[str, int]:
+        result: AnalyzeResponse = results["analyze"]
+        # Map trait deltas list to record with all keys present
+        base: Dict[str, int] = {
+            "Intelligence": 0, "Creativity": 0, "Empathy": 0, "Resilience": 0, "Curiosity": 0,
+            "Humor": 0, "Kindness": 0, "Confidence": 0, "Discipline": 0, "Honesty": 0,
+            "Patience": 0, "Optimism": 0, "Courage": 0, "OpenMindedness": 0, "Prudence": 0,
+            "Adaptability": 0, "Gratitude": 0, "Ambition": 0, "Humility": 0, "Playfulness": 0,
+        }
+        for d in (result.traitDeltas or []):
+            base[d.trait] = d.delta
+
+        # Convex optional args must be omitted rather than null
+        optional_args: Dict[str, Any] = {}
+        if trait_coalescer is not None:
+            optional_args["deferDaemonUpdate"] = True
+
         try:
-            convex_client.mutation("feeds:errored", {
+            if two_phase:
+                completion = await convex.mutation("feeds:complete", {
+                    "feedId": message_id,
+                    "traitsDelta": base,
+                    "roast": result.roast or "",
+                    "now": now,
+                    **optional_args,
+                })
+            else:
+                # Idempotent insert, delta application and evolution in one mutation
+                completion = await convex.mutation("feeds:ingest", {
+                    "feedId": message_id,
+                    "daemonId": daemon_id,
+                    "source": "email",
+                    "contentSummary": content_summary,
+                    "attachmentsMeta": clean_atts,
+                    "traitsDelta": base,
+                    "roast": result.roast or "",
+                    "now": now,
+                    **optional_args,
+                })
+        except Exception as e:
+            # Best-effort completion; if Convex fails, surface as 500
+            raise HTTPException(status_code=500, detail=f"Convex complete error: {e}")
+
+        if completion and completion.get("duplicate"):
+            # Another process already completed this feed; don't record the memory twice
+            raise PipelineExit({
+                "status": "duplicate",
                 "feedId": message_id,
-                "errorMessage": he.detail,
-                "now": now,
+                "daemonId": daemon_id,
+                "source": "email",
             })
-        except Exception:
-            pass
-        raise he
+        daemon_index.apply_feed(daemon_id, base)
+        manager_context.update_daemon(daemon_index.get(daemon_id))
+        if trait_coalescer is not None:
+            trait_coalescer.add(daemon_id, base, now)
+        return base
+
+    async def remember(results: Dict[str, Any]) -> None:
+        # Add memory to Hyperspell
+        result: AnalyzeResponse = results["analyze"]
+        daemon_doc = results["daemon"]
+        daemon_name = daemon_doc.get("name", "Unknown") if daemon_doc else "Unknown"
+        memory = build_daemon_memory(
+            daemon_id=daemon_id,
+            daemon_name=daemon_name,
+            caption=result.caption or content_summary,
+            roast=result.roast or "",
+            source="email",
+            content_type="txt" if text else "image",
+            timestamp=now,
+        )
+        memory_writer.submit(memory)
+        manager_context.add_memory(daemon_id, memory["text"])
+
+    graph = StageGraph("feed")
+    graph.add("daemon", load_daemon)
+    graph.add("lookup", lookup)
+    graph.add("start", start, deps=("lookup",))
+    graph.add("analyze", analyze_feed, deps=("daemon", "lookup"))
+    graph.add("commit", commit, deps=("start", "analyze"))
+    graph.add("memory", remember, deps=("commit",), background=True)
+
+    try:
+        await graph.run()
+    except PipelineExit as done:
+        return done.value
     except Exception as e:
-        try:
-            convex_client.mutation("feeds:errored", {
-                "feedId": message_id,
-                "errorMessage": str(e),
-                "now": now,
-            })
-        except Exception:
-            pass
+        if graph.failed_stage != "analyze":
+            raise
+        error_message = e.detail if isinstance(e, HTTPException) else str(e)
+        # Convert to Convex error status; in single-call mode this also
+        # creates the feed record, which does not exist yet
+        if report_errors:
+            try:
+                await convex.mutation("feeds:errored", {
+                    "feedId": message_id,
+                    "errorMessage": error_message,
+                    "now": now,
+                    "daemonId": daemon_id,
+                    "source": "email",
+                    "contentSummary": content_summary,
+                    "attachmentsMeta": clean_atts,
+                })
+            except Exception:
+                pass
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=500, detail=f"Analysis error: {e}")
 
-    # Map trait deltas list to record with all keys present
-    base: Dict[str, int] = {
-        "Intelligence": 0, "Creativity": 0, "Empathy": 0, "Resilience": 0, "Curiosity": 0,
-        "Humor": 0, "Kindness": 0, "Confidence": 0, "Discipline": 0, "Honesty": 0,
-        "Patience": 0, "Optimism": 0, "Courage": 0, "OpenMindedness": 0, "Prudence": 0,
-        "Adaptability": 0, "Gratitude": 0, "Ambition": 0, "Humility": 0, "Playfulness": 0,
+    return {
+        "status": "success",
+        "feedId": message_id,
+        "daemonId": daemon_id,
+        "source": "email",
     }
-    for d in (result.traitDeltas or []):
-        base[d.trait] = d.delta
 
+
+async def _enqueue_feed(fields: Dict[str, Any]) -> DefaultJSONResponse:
+    """Persist a normalized message for the worker pool and acknowledge with 202."""
+    message_id = fields["message_id"]
     try:
-        convex_client.mutation("feeds:complete", {
+        # The insert is fsync'd; keep it off the event loop
+        created = await asyncio.to_thread(ingest_queue.enqueue, message_id, fields)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Ingest queue unavailable: {e}")
+    if created and _ingest_wakeup is not None:
+        _ingest_wakeup.set()
+    return DefaultJSONResponse(
+        status_code=202,
+        content={
+            "status": "queued" if created else "duplicate",
             "feedId": message_id,
-            "traitsDelta": base,
-            "roast": result.roast or "",
-            "now": now,
-        })
+            "source": "email",
+        },
+    )
+
+
+async def _ingest_worker(worker_id: int) -> None:
+    """Drain the ingest queue; unacknowledged messages are redelivered after their lease expires."""
+    while True:
+        try:
+            msg = await asyncio.to_thread(ingest_queue.claim)
+        except Exception as e:
+            logger.error(f"Ingest worker {worker_id} failed to claim: {e}")
+            msg = None
+        if msg is None:
+            _ingest_wakeup.clear()
+            try:
+                await asyncio.wait_for(_ingest_wakeup.wait(), timeout=INGEST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        final_attempt = msg.attempts >= ingest_queue.max_attempts
+        try:
+            await _process_feed(msg.message, report_errors=final_attempt)
+        except HTTPException as he:
+            # Client errors will fail the same way on every attempt
+            retryable = he.status_code >= 500 or he.status_code in (408, 429)
+            await asyncio.to_thread(ingest_queue.nack, msg.feed_id, str(he.detail), retryable)
+            continue
+        except Exception as e:
+            await asyncio.to_thread(ingest_queue.nack, msg.feed_id, str(e))
+            continue
+        await asyncio.to_thread(ingest_queue.ack, msg.feed_id)
+
+
+async def _purge_attachments_periodically() -> None:
+    # Every interval, and early once a tenth of the size cap was spilled since the last purge
+    while True:
+        try:
+            removed = await asyncio.to_thread(
+                attachment_store.purge, ATTACHMENT_RETENTION_SECONDS, ATTACHMENT_MAX_TOTAL_BYTES,
+            )
+            if removed:
+                logger.info(f"Purged {removed} stored attachments")
+        except Exception as e:
+            logger.error(f"Attachment purge failed: {e}")
+        try:
+            await asyncio.wait_for(_attachment_purge_wakeup.wait(), timeout=ATTACHMENT_PURGE_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _attachment_purge_wakeup.clear()
+
+
+@app.on_event("startup")
+async def _start_attachment_purger() -> None:
+    global _attachment_purge_task, _attachment_purge_wakeup, _attachment_purge_loop
+    _attachment_purge_wakeup = asyncio.Event()
+    _attachment_purge_loop = asyncio.get_running_loop()
+    _attachment_purge_task = asyncio.create_task(_purge_attachments_periodically())
+
+
+@app.on_event("shutdown")
+async def _stop_attachment_purger() -> None:
+    global _attachment_purge_task, _attachment_purge_loop
+    _attachment_purge_loop = None
+    if _attachment_purge_task is not None:
+        _attachment_purge_task.cancel()
+        await asyncio.gather(_attachment_purge_task, return_exceptions=True)
+        _attachment_purge_task = None
+
+
+@app.on_event("startup")
+async def _start_ingest_workers() -> None:
+    global _ingest_wakeup
+    if ingest_queue is None:
+        return
+    _ingest_wakeup = asyncio.Event()
+    for i in range(INGEST_WORKERS):
+        _ingest_tasks.append(asyncio.create_task(_ingest_worker(i)))
+    logger.info(f"Started {INGEST_WORKERS} ingest workers on {ingest_queue.path}")
+
+
+@app.on_event("shutdown")
+async def _stop_ingest_workers() -> None:
+    # In-flight messages keep their lease and are redelivered after restart
+    for task in _ingest_tasks:
+        task.cancel()
+    await asyncio.gather(*_ingest_tasks, return_exceptions=True)
+    _ingest_tasks.clear()
+    await feed_lanes.close()
+
+
+@app.on_event("startup")
+async def _warm_feed_dedup() -> None:
+    # Feeds completed before a restart are not in the filter; load the most
+    # recent ones so their redeliveries are still recognized
+    if convex is None or DEDUP_WARM_FEEDS <= 0:
+        return
+    try:
+        feed_ids = await convex.query("feeds:recentCompletedIds", {"limit": DEDUP_WARM_FEEDS})
     except Exception as e:
-        # Best-effort completion; if Convex fails, surface as 500
-        raise HTTPException(status_code=500, detail=f"Convex complete error: {e}")
-
-    # Add memory to Hyperspell
-    daemon_name = daemon_doc.get("name", "Unknown") if daemon_doc else "Unknown"
-    add_daemon_memory(
-        daemon_id=daemon_id,
-        daemon_name=daemon_name,
-        caption=result.caption or content_summary,
-        roast=result.roast or "",
-        source="email",
-        content_type="txt" if text else "image",
-        timestamp=now,
+        logger.warning(f"Failed to warm the feed idempotency filter: {e}")
+        return
+    feed_dedup.warm(feed_ids or [])
+    logger.info(f"Warmed the feed idempotency filter with {len(feed_ids or [])} feed ids")
+
+
+@app.on_event("startup")
+async def _start_trait_coalescer() -> None:
+    if trait_coalescer is not None:
+        trait_coalescer.start()
+
+
+@app.on_event("shutdown")
+async def _drain_pipeline_background() -> None:
+    # Background stages (memory writes) still in flight from recent feeds
+    await drain_background()
+
+
+@app.on_event("startup")
+async def _start_memory_writer() -> None:
+    memory_writer.start()
+
+
+@app.on_event("shutdown")
+async def _stop_memory_writer() -> None:
+    # Anything not yet written is spooled and replayed on the next start
+    await memory_writer.close()
+
+
+@app.on_event("shutdown")
+async def _flush_trait_coalescer() -> None:
+    # Runs after the ingest workers stop, so no new deltas arrive while flushing
+    if trait_coalescer is not None:
+        await trait_coalescer.close()
+
+
+@router.post("/feed-by-email")
+async def feed_by_email(request: Request, response: Response):
+    async with feed_admission.admit():
+        with collect_timings() as timings:
+            try:
+                result = await _handle_feed_by_email(request)
+            except HTTPException as he:
+                if timings:
+                    # Lets clients attribute the failure to the stage that raised it
+                    he.headers = {**(he.headers or {}), "Server-Timing": server_timing(timings)}
+                raise
+    if timings:
+        # Queued deliveries return their own response and never run the pipeline here
+        response.headers["Server-Timing"] = server_timing(timings)
+        if webhook_log_sampler.hit():
+            report = timings[-1]
+            logger.info(
+                "Feed pipeline totalMs=%s criticalPath=%s",
+                report["totalMs"], ">".join(step["stage"] for step in report["criticalPath"]),
+                extra={"timings": report},
+            )
+    return result
+
+
+async def _handle_feed_by_email(request: Request):
+    raw = await request.body()
+    sig = request.headers.get("X-AgentMail-Signature")
+    if not _verify_agentmail_signature(raw, sig):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    # Keep the raw body for /debug/payloads instead of dumping it to the log
+    captured = payload_capture.capture(raw, feedId=None)
+    with STAGE_SECONDS.time(pipeline="feed", stage="parse"):
+        payload = await _parse_webhook_payload(request, raw)
+
+    # Redeliveries of recently completed messages are answered before any other work
+    early_id = _extract_message_fields(payload)["message_id"]
+    cached = feed_dedup.lookup(early_id) if early_id else None
+    if cached is not None:
+        annotate(cache="duplicate")
+        return {**cached, "status": "duplicate"}
+
+    # Extract fields using smart extraction (handles multiple payload formats)
+    with STAGE_SECONDS.time(pipeline="feed", stage="normalize"):
+        fields = await asyncio.to_thread(_normalize_message, payload)
+    if captured is not None:
+        captured["feedId"] = fields["message_id"]
+
+    if webhook_log_sampler.hit():
+        logger.info(
+            "Webhook received feedId=%s attachments=%d",
+            fields["message_id"], len(fields["attachments"]),
+            extra={"feedId": fields["message_id"], "bodySize": len(raw)},
+        )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Webhook fields to=%s subject=%r text=%r payloadKeys=%s",
+            fields["to"], fields["subject"], fields["text"][:100], list(payload.keys()),
+        )
+
+    if ingest_queue is not None:
+        return await _enqueue_feed(fields)
+    return await _process_feed(fields)
+
+
+def _batch_error(feed_id: Optional[str], status_code: int, detail: Any) -> Dict[str, Any]:
+    return {"status": "error", "feedId": feed_id, "statusCode": status_code, "error": detail}
+
+
+@router.post("/feed-by-email/batch")
+async def feed_by_email_batch(request: Request, parallelism: Optional[int] = None):
+    """
+    Ingest many webhook messages in one request.
+
+    Accepts a JSON array of messages, or {"messages": [...]}, each in any
+    shape understood by _extract_message_fields. All messages are routed
+    against one snapshot of the daemon index and processed concurrently, up
+    to `parallelism` at a time (BATCH_PARALLELISM by default). Results are
+    returned in input order; one failing message does not fail the batch.
+    Every processed message takes its own feed admission slot, so a batch
+    competes with single deliveries message by message; messages shed by
+    admission control come back as per-item 429 (or 503) errors.
+    """
+    raw = await request.body()
+    sig = request.headers.get("X-AgentMail-Signature")
+    if not _verify_agentmail_signature(raw, sig):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+
+    payload_capture.capture(raw, feedId=None, batch=True)
+    payload = await _parse_webhook_payload(request, raw)
+    messages = payload.get("messages") if isinstance(payload, dict) else payload
+    if not isinstance(messages, list):
+        raise HTTPException(status_code=400, detail="Expected an array of messages")
+    if len(messages) > BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_MESSAGES} messages")
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    todo: List[int] = []
+    for i, message in enumerate(messages):
+        if not isinstance(message, dict):
+            results[i] = _batch_error(None, 400, "Message must be an object")
+            continue
+        # Answer recent redeliveries before spilling any attachments
+        early_id = _extract_message_fields(message)["message_id"]
+        cached = feed_dedup.lookup(early_id) if early_id else None
+        if cached is not None:
+            results[i] = {**cached, "status": "duplicate"}
+            continue
+        todo.append(i)
+
+    normalized = await asyncio.to_thread(lambda: [_normalize_message(messages[i]) for i in todo])
+
+    if ingest_queue is not None:
+        # Enqueueing is one local write for the whole batch, so it takes one slot
+        async with feed_admission.admit():
+            try:
+                created = await asyncio.to_thread(
+                    ingest_queue.enqueue_many, [(f["message_id"], f) for f in normalized]
+                )
+            except Exception as e:
+                raise HTTPException(status_code=503, detail=f"Ingest queue unavailable: {e}")
+        if any(created) and _ingest_wakeup is not None:
+            _ingest_wakeup.set()
+        for i, fields, was_created in zip(todo, normalized, created):
+            results[i] = {
+                "status": "queued" if was_created else "duplicate",
+                "feedId": fields["message_id"],
+                "source": "email",
+            }
+    elif todo:
+        if not await _ensure_daemon_index():
+            raise HTTPException(status_code=503, detail="Daemon routing unavailable")
+        daemon_ids = daemon_index.resolve_many([f["to"] for f in normalized])
+        semaphore = asyncio.Semaphore(max(1, min(parallelism or BATCH_PARALLELISM, 64)))
+
+        async def run_one(i: int, fields: Dict[str, Any], daemon_id: Optional[str]) -> None:
+            async with semaphore:
+                try:
+                    async with feed_admission.admit():
+                        results[i] = await _process_feed(fields, daemon_id=daemon_id)
+                except HTTPException as he:
+                    results[i] = _batch_error(fields["message_id"], he.status_code, he.detail)
+                except Exception as e:
+                    results[i] = _batch_error(fields["message_id"], 500, str(e))
+
+        await asyncio.gather(*(
+            run_one(i, fields, daemon_id)
+            for i, fields, daemon_id in zip(todo, normalized, daemon_ids)
+        ))
+
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+    logger.info(
+        "Webhook batch messages=%d statuses=%s", len(messages), statuses,
+        extra={"bodySize": len(raw)},
     )
+    return {"count": len(messages), "statuses": statuses, "results": results}
+
+
+def _require_debug_access(request: Request) -> None:
+    # With DEBUG_TOKEN set, debug endpoints need a matching X-Debug-Token header;
+    # without one they are only served in mock mode
+    token = os.getenv("DEBUG_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("X-Debug-Token", ""), token):
+            raise HTTPException(status_code=403, detail="Debug access denied")
+    elif not MOCK_MODE:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+def _debug_access_allowed(request: Request) -> bool:
+    try:
+        _require_debug_access(request)
+    except HTTPException:
+        return False
+    return True
+
+
+def _profile_trigger(request: Request) -> Optional[str]:
+    # An explicit request needs debug access; otherwise 1-in-N sampling decides
+    requested = request.headers.get("X-Profile") or request.query_params.get("profile")
+    if requested and requested != "0" and _debug_access_allowed(request):
+        return "requested"
+    if profiler.sampled():
+        return "sampled"
+    return None
+
+
+@app.middleware("http")
+async def _profile_request(request: Request, call_next):
+    if request.url.path not in PROFILE_PATHS:
+        return await call_next(request)
+    trigger = _profile_trigger(request)
+    if trigger is None:
+        return await call_next(request)
+    requested_mode = request.headers.get("X-Profile") or request.query_params.get("profile")
+    mode = "cprofile" if trigger == "requested" and requested_mode == "cprofile" else "sample"
+    async with profiler.profile(request.method, request.url.path, trigger, mode) as record:
+        response = await call_next(request)
+    if record is not None:
+        response.headers["X-Profile-Id"] = record["id"]
+    return response
+
+
+@router.get("/debug/profiles")
+async def debug_profiles(request: Request):
+    _require_debug_access(request)
+    return {**profiler.stats(), "profiles": profiler.list()}
+
+
+@router.get("/debug/profiles/{profile_id}")
+async def debug_profile(request: Request, profile_id: str, format: str = "json"):
+    """One stored profile; ?format=folded returns folded stacks for flamegraph tools."""
+    _require_debug_access(request)
+    record = profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(Profiler.folded_text(record), media_type="text/plain; charset=utf-8")
+    return record
+
+
+@router.get("/debug/traces")
+async def debug_traces(request: Request):
+    _require_debug_access(request)
+    return {"traces": trace_store.list(), "exportPath": TRACE_EXPORT_PATH}
+
+
+@router.get("/debug/traces/{trace_id}")
+async def debug_trace(request: Request, trace_id: str):
+    """Spans of one trace in start order; the id is returned in X-Trace-Id."""
+    _require_debug_access(request)
+    spans = trace_store.get(trace_id)
+    if spans is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"traceId": trace_id, "spans": spans}
+
+
+@router.get("/debug/payloads")
+async def debug_payloads(request: Request, limit: int = 20):
+    _require_debug_access(request)
+    return {"payloads": payload_capture.snapshot(limit)}
+
+
+@router.get("/debug/convex")
+async def debug_convex(request: Request):
+    _require_debug_access(request)
+    if convex is None:
+        raise HTTPException(status_code=503, detail="Convex client unavailable")
+    return convex.stats()
+
+
+def _hit_ratio(hits: float, misses: float) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+CACHE_HIT_RATIO.set_function(
+    lambda: _hit_ratio(memory_cache.stats()["recentHits"], memory_cache.stats()["recentMisses"]),
+    cache="memory_recent",
+)
+CACHE_HIT_RATIO.set_function(
+    lambda: _hit_ratio(memory_cache.stats()["searchHits"], memory_cache.stats()["searchMisses"]),
+    cache="memory_search",
+)
+CACHE_HIT_RATIO.set_function(
+    lambda: _hit_ratio(brainstorm_cache.stats()["hits"], brainstorm_cache.stats()["misses"]),
+    cache="brainstorm",
+)
+REGISTRY.gauge("memory_writer_queue_depth", "Memory records waiting to be written").set_function(
+    lambda: memory_writer.stats()["depth"],
+)
+REGISTRY.gauge("feed_lanes_running", "Daemon lanes currently processing a feed").set_function(
+    lambda: feed_lanes.stats()["running"],
+)
+
 
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    return Response(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get("/ingest/status")
+async def ingest_status():
+    admission = {c.name: c.stats() for c in (feed_admission, analyze_admission)}
+    if ingest_queue is None:
+        return {
+            "mode": INGEST_MODE,
+            "workers": 0,
+            "dedup": feed_dedup.stats(),
+            "lanes": feed_lanes.stats(),
+            "writeBehind": trait_coalescer.stats() if trait_coalescer else None,
+            "memoryWriter": memory_writer.stats(),
+            "memoryCache": memory_cache.stats(),
+            "managerContext": manager_context.stats(),
+            "brainstormCache": brainstorm_cache.stats(),
+            "admission": admission,
+        }
+    stats = await asyncio.to_thread(ingest_queue.stats)
     return {
-        "status": "success",
-        "feedId": message_id,
-        "daemonId": daemon_id,
-        "source": "email",
+        "mode": INGEST_MODE,
+        "workers": len(_ingest_tasks),
+        **stats,
+        "dedup": feed_dedup.stats(),
+        "lanes": feed_lanes.stats(),
+        "writeBehind": trait_coalescer.stats() if trait_coalescer else None,
+        "memoryWriter": memory_writer.stats(),
+        "memoryCache": memory_cache.stats(),
+        "managerContext": manager_context.stats(),
+        "brainstormCache": brainstorm_cache.stats(),
+        "admission": admission,
     }
 
 @router.post("/pet-manager/brainstorm")
-async def pet_manager_brainstorm(request: Request):
+async def pet_manager_brainstorm(request: Request, response: Response):
     """
     Pet Manager brainstorm endpoint that synthesizes all daemon traits and memories
     into creative output using Gemini.
+
+    Results are cached per topic and daemon context; pass "fresh": true (or
+    ?fresh=true) to force a new idea.
     """
     try:
-        payload = await request.json()
+        payload = fast_json.loads(await request.body())
     except Exception:
         payload = {}
 
     topic = payload.get("topic")
 
-    # Fetch all daemons from Convex
-    if convex_client is None:
-        raise HTTPException(status_code=503, detail="Convex client unavailable")
+    # Daemons come from the index; the manager context mirrors it
+    if not await _ensure_daemon_index():
+        raise HTTPException(status_code=503, detail="Failed to fetch daemons")
 
-    try:
-        daemons = convex_client.query("daemons:all", {}) or []
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch daemons: {e}")
+    # Recent memories are loaded once per daemon, then kept current as memories are added
+    unseeded = manager_context.unseeded()
+    if unseeded:
+        manager_context.seed_memories(await asyncio.to_thread(
+            get_recent_memories_for_daemons, unseeded, 5,
+        ))
 
-    if not daemons:
+    daemon_contexts = manager_context.contexts()
+    if not daemon_contexts:
         raise HTTPException(status_code=404, detail="No daemons found")
 
-    # Build context for each daemon with their memories
-    daemon_contexts = []
-    for daemon in daemons:
-        daemon_id = daemon["_id"]
-        daemon_name = daemon.get("name", "Unknown")
-        traits = daemon.get("traits", {})
-
-        # Get top 3 traits
-        top_traits = sorted(traits.items(), key=lambda x: x[1], reverse=True)[:3]
-        trait_summary = ", ".join([f"{t[0]} ({t[1]})" for t in top_traits])
-
-        # Get recent memories from Hyperspell
-        memories = get_recent_daemon_memories(daemon_id, limit=5)
-        memory_summary = ""
-        if memories:
-            memory_texts = [m.get("content", "") for m in memories[:3]]
-            memory_summary = " | ".join(memory_texts[:3])
-
-        daemon_contexts.append({
-            "name": daemon_name,
-            "traits": trait_summary,
-            "memories": memory_summary or "No recent memories",
-        })
-
-    # Build the brainstorm prompt
-    prompt_parts = [
-        "You are the Pet Manager, a creative AI that synthesizes insights from multiple Data Daemons.",
-        "Each daemon has unique personality traits and memories from the content they've consumed.",
-        "",
-        "Here are your daemons:",
-        ""
-    ]
-
-    for ctx in daemon_contexts:
-        prompt_parts.append(f"**{ctx['name']}**")
-        prompt_parts.append(f"  Top Traits: {ctx['traits']}")
-        prompt_parts.append(f"  Recent Memories: {ctx['memories']}")
-        prompt_parts.append("")
-
-    if topic:
-        prompt_parts.append(f"Topic: {topic}")
-        prompt_parts.append("")
-
-    prompt_parts.extend([
-        "Based on the above daemons' traits and memories, brainstorm a creative idea or insight.",
-        "Structure your response as JSON with:",
-        '- "brainstormIdea": A creative idea that synthesizes insights from all daemons',
-        '- "contributions": An array of objects with "daemonName", "role", and "highlight" for each daemon',
-        "",
-        "Make it engaging and reference specific traits and memories from each daemon.",
-    ])
-
-    prompt = "\n".join(prompt_parts)
+    fresh = bool(payload.get("fresh")) or request.query_params.get("fresh", "").lower() in ("1", "true")
+    fingerprint = manager_context.fingerprint()
+    if not fresh:
+        cached = brainstorm_cache.get(topic, fingerprint)
+        if cached is not None:
+            response.headers["X-Brainstorm-Cache"] = "hit"
+            annotate(cache="hit")
+            return cached
+    response.headers["X-Brainstorm-Cache"] = "bypass" if fresh else "miss"
+    annotate(cache="bypass" if fresh else "miss")
 
     # Use LLM or fall back to mock
     use_llm = not MOCK_MODE and llm_provider is not None
 
+    # Full prompt for small populations; ranked, budgeted or summarized for large ones
+    plan = await brainstorm_planner.plan(
+        daemon_contexts, topic, _generate if use_llm else None,
+    )
+    response.headers["X-Brainstorm-Plan"] = plan.mode
+    BRAINSTORM_PROMPT_TOKENS.observe(plan.tokens, mode=plan.mode)
+    annotate(plan=plan.mode, daemons=len(plan.daemons), promptTokens=plan.tokens)
+    if plan.mode != "full":
+        logger.info(
+            f"Brainstorm plan {plan.mode}: {len(plan.daemons)}/{len(daemon_contexts)} daemons, "
+            f"{plan.groups} groups, ~{plan.tokens} prompt tokens"
+        )
+
     if use_llm:
         try:
             logger.info("Calling LLM provider for Pet Manager brainstorm")
-            response = llm_provider.generate_content(prompt)
-            result = response.parse_json()
+            llm_response = await _generate(plan.prompt)
+            result = llm_response.parse_json()
 
             brainstorm_idea = result.get("brainstormIdea", "")
             contributions = result.get("contributions", [])
@@ -681,7 +1498,7 @@ async def pet_manager_brainstorm(request: Request):
             # Store in Convex
             now = int(__import__("time").time() * 1000)
             try:
-                convex_client.mutation("managerLogs:logBrainstorm", {
+                await convex.mutation("managerLogs:logBrainstorm", {
                     "brainstormIdea": brainstorm_idea,
                     "contributions": contributions,
                     "now": now,
@@ -689,10 +1506,12 @@ async def pet_manager_brainstorm(request: Request):
             except Exception as e:
                 logger.error(f"Failed to store brainstorm in Convex: {e}")
 
-            return {
+            brainstorm = {
                 "brainstormIdea": brainstorm_idea,
                 "contributions": contributions,
             }
+            brainstorm_cache.put(topic, fingerprint, brainstorm)
+            return brainstorm
 
         except Exception as e:
             logger.error(f"Pet Manager brainstorm failed: {e}")
@@ -700,7 +1519,7 @@ async def pet_manager_brainstorm(request: Request):
 
     # Mock mode
     contributions = []
-    for ctx in daemon_contexts:
+    for ctx in plan.daemons:
         contributions.append({
             "daemonName": ctx["name"],
             "role": "Contributor",
@@ -708,15 +1527,28 @@ async def pet_manager_brainstorm(request: Request):
         })
 
     return {
-        "brainstormIdea": f"A collaborative project combining the unique strengths of {len(daemons)} daemons!",
+        "brainstormIdea": f"A collaborative project combining the unique strengths of {len(daemon_contexts)} daemons!",
         "contributions": contributions,
     }
 
 
+@app.on_event("shutdown")
+async def _close_tracer() -> None:
+    # After the other shutdown hooks, so the spans of their final writes are exported
+    await asyncio.to_thread(TRACER.close)
+
+
+@app.on_event("shutdown")
+async def _close_convex() -> None:
+    # Registered last so the shutdown hooks above can still write to Convex
+    if convex is not None:
+        convex.shutdown()
+
+
 # Direct route registration for demo reliability
 @app.post("/feed-by-email")
-async def feed_by_email_direct(request: Request):
-    return await feed_by_email(request)
+async def feed_by_email_direct(request: Request, response: Response):
+    return await feed_by_email(request, response)
 
 # Include the router after all endpoints are defined
 app.include_router(router)
\ No newline at end of file
@@ -0,0 +1,168 @@
+"""
+Materialized Pet Manager context.
+
+Brainstorm needs every daemon's top traits and a few recent memories.
+Rather than rebuilding that from `daemons:all` and a memory search per
+daemon on each call, this keeps it up to date incrementally: the daemon
+index pushes reloads, the feed pipeline pushes each committed feed and each
+new memory, and brainstorm reads the prebuilt per-daemon summaries.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import hashlib
+import threading
+
+
+class _DaemonContext:
+    __slots__ = ("name", "traits", "values", "top", "memories", "seeded")
+
+    def __init__(self, name: str, traits: str, values: Dict[str, int], top: Tuple[str, ...], memory_window: int):
+        self.name = name
+        self.traits = traits
+        self.values = values
+        # Top trait names in rank order, without values
+        self.top = top
+        # Newest first
+        self.memories: Deque[str] = deque(maxlen=memory_window)
+        # Whether recent memories have been loaded from the store
+        self.seeded = False
+
+
+class ManagerContext:
+    """Per-daemon trait and memory summaries, updated as feeds and memories arrive."""
+
+    def __init__(self, top_traits: int = 3, memory_window: int = 3):
+        self.top_traits = top_traits
+        self.memory_window = memory_window
+        self._lock = threading.Lock()
+        self._daemons: Dict[str, _DaemonContext] = {}
+        self._snapshot: Optional[List[Dict[str, Any]]] = None
+        self._fingerprint: Optional[str] = None
+        # Bumped on every change; lets callers fingerprint the context cheaply
+        self.version = 0
+        self.synced = False
+
+    def _trait_summary(self, traits: Dict[str, Any]) -> Tuple[str, Tuple[str, ...]]:
+        top = sorted((traits or {}).items(), key=lambda x: x[1], reverse=True)[:self.top_traits]
+        return ", ".join([f"{t[0]} ({t[1]})" for t in top]), tuple(t[0] for t in top)
+
+    def _changed(self) -> None:
+        self._snapshot = None
+        self._fingerprint = None
+        self.version += 1
+
+    def sync(self, daemons: List[Dict[str, Any]]) -> None:
+        """Match the daemon set and traits to a full `daemons:all` result."""
+        with self._lock:
+            current = self._daemons
+            synced: Dict[str, _DaemonContext] = {}
+            for doc in daemons:
+                name = doc.get("name", "Unknown")
+                values = dict(doc.get("traits") or {})
+                traits, top = self._trait_summary(values)
+                entry = current.get(doc["_id"])
+                if entry is None:
+                    entry = _DaemonContext(name, traits, values, top, self.memory_window)
+                else:
+                    entry.name, entry.traits, entry.values, entry.top = name, traits, values, top
+                synced[doc["_id"]] = entry
+            self._daemons = synced
+            self.synced = True
+            self._changed()
+
+    def update_daemon(self, doc: Optional[Dict[str, Any]]) -> None:
+        """Refresh one daemon's summary after a feed changed its traits."""
+        if doc is None:
+            return
+        with self._lock:
+            entry = self._daemons.get(doc["_id"])
+            name = doc.get("name", "Unknown")
+            values = dict(doc.get("traits") or {})
+            traits, top = self._trait_summary(values)
+            if entry is None:
+                self._daemons[doc["_id"]] = _DaemonContext(name, traits, values, top, self.memory_window)
+            elif (entry.name, entry.values) == (name, values):
+                return
+            else:
+                entry.name, entry.traits, entry.values, entry.top = name, traits, values, top
+            self._changed()
+
+    def add_memory(self, daemon_id: str, content: str) -> None:
+        """Push a new memory into the daemon's rolling window."""
+        with self._lock:
+            entry = self._daemons.get(daemon_id)
+            if entry is None:
+                return
+            entry.memories.appendleft(content)
+            self._changed()
+
+    def unseeded(self) -> List[str]:
+        """Daemons whose memory window has not been loaded from the store yet."""
+        with self._lock:
+            return [daemon_id for daemon_id, entry in self._daemons.items() if not entry.seeded]
+
+    def seed_memories(self, memories_by_daemon: Dict[str, List[Dict[str, Any]]]) -> None:
+        """
+        Fill memory windows from the store (newest first).
+
+        Memories added since the fetch started stay at the front.
+        """
+        with self._lock:
+            for daemon_id, memories in memories_by_daemon.items():
+                entry = self._daemons.get(daemon_id)
+                if entry is None or entry.seeded:
+                    continue
+                live = list(entry.memories)
+                entry.memories.clear()
+                entry.memories.extend(m.get("content", "") for m in memories[:self.memory_window])
+                for content in reversed(live):
+                    if content not in entry.memories:
+                        entry.memories.appendleft(content)
+                entry.seeded = True
+            self._changed()
+
+    def contexts(self) -> List[Dict[str, Any]]:
+        """
+        Name, trait summary and memory summary per daemon; rebuilt only after changes.
+
+        Entries also carry the daemon id and raw trait values for ranking.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = [
+                    {
+                        "id": daemon_id,
+                        "name": entry.name,
+                        "traits": entry.traits,
+                        "memories": " | ".join(entry.memories) or "No recent memories",
+                        "traitValues": entry.values,
+                    }
+                    for daemon_id, entry in self._daemons.items()
+                ]
+            return self._snapshot
+
+    def fingerprint(self) -> str:
+        """
+        Hash of what a brainstorm would meaningfully differ on.
+
+        Covers daemon names, the ranking of their top traits and their
+        memory windows, but not raw trait values: a feed that bumps scores
+        without reordering anyone's top traits keeps the fingerprint.
+        """
+        with self._lock:
+            if self._fingerprint is None:
+                digest = hashlib.sha1()
+                for daemon_id, entry in self._daemons.items():
+                    digest.update("\x1f".join((daemon_id, entry.name, *entry.top, *entry.memories)).encode())
+                    digest.update(b"\x1e")
+                self._fingerprint = digest.hexdigest()
+            return self._fingerprint
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "synced": self.synced,
+            "daemons": len(self._daemons),
+            "unseeded": sum(1 for entry in self._daemons.values() if not entry.seeded),
+            "version": self.version,
+        }
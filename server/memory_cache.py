@@ -0,0 +1,105 @@
+"""
+TTL/LRU cache for daemon memory reads.
+
+Recent-memory lists are cached per daemon and searches per
+(daemon, query, limit). A memory written through this process is
+prepended to the daemon's cached recent list and invalidates its cached
+searches, so readers see their own writes without another round trip.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+
+from metrics import REGISTRY
+
+MEMORY_CACHE_LOOKUPS = REGISTRY.counter(
+    "memory_cache_lookups_total", "Memory cache lookups", ("kind", "result"),
+)
+
+Memories = List[Dict[str, Any]]
+
+
+class MemoryCache:
+    """Thread-safe; read from request handlers and written from the memory writer thread."""
+
+    def __init__(self, ttl_seconds: float = 60.0, max_daemons: int = 1000, max_searches: int = 512):
+        self.ttl_seconds = ttl_seconds
+        self.max_daemons = max_daemons
+        self.max_searches = max_searches
+        self._lock = threading.Lock()
+        # daemon_id -> (fetched_at, fetched_limit, memories)
+        self._recent: "OrderedDict[str, Tuple[float, int, Memories]]" = OrderedDict()
+        # (daemon_id, query, limit) -> (fetched_at, memories)
+        self._searches: "OrderedDict[Tuple[str, str, int], Tuple[float, Memories]]" = OrderedDict()
+
+    def _fresh(self, fetched_at: float) -> bool:
+        return time.monotonic() - fetched_at < self.ttl_seconds
+
+    def get_recent(self, daemon_id: str, limit: int) -> Optional[Memories]:
+        with self._lock:
+            entry = self._recent.get(daemon_id)
+            # A shorter result than was asked for means the daemon has no more memories
+            if entry is not None and self._fresh(entry[0]) and (entry[1] >= limit or len(entry[2]) < entry[1]):
+                self._recent.move_to_end(daemon_id)
+                MEMORY_CACHE_LOOKUPS.inc(kind="recent", result="hit")
+                return list(entry[2][:limit])
+        MEMORY_CACHE_LOOKUPS.inc(kind="recent", result="miss")
+        return None
+
+    def put_recent(self, daemon_id: str, limit: int, memories: Memories) -> None:
+        with self._lock:
+            self._recent[daemon_id] = (time.monotonic(), limit, list(memories))
+            self._recent.move_to_end(daemon_id)
+            while len(self._recent) > self.max_daemons:
+                self._recent.popitem(last=False)
+
+    def get_search(self, daemon_id: str, query: str, limit: int) -> Optional[Memories]:
+        key = (daemon_id, " ".join(query.lower().split()), limit)
+        with self._lock:
+            entry = self._searches.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._searches.move_to_end(key)
+                MEMORY_CACHE_LOOKUPS.inc(kind="search", result="hit")
+                return list(entry[1])
+        MEMORY_CACHE_LOOKUPS.inc(kind="search", result="miss")
+        return None
+
+    def put_search(self, daemon_id: str, query: str, limit: int, memories: Memories) -> None:
+        key = (daemon_id, " ".join(query.lower().split()), limit)
+        with self._lock:
+            self._searches[key] = (time.monotonic(), list(memories))
+            self._searches.move_to_end(key)
+            while len(self._searches) > self.max_searches:
+                self._searches.popitem(last=False)
+
+    def record_write(self, daemon_id: str, memory: Dict[str, Any]) -> None:
+        """Prepend a freshly written memory and drop the daemon's cached searches."""
+        with self._lock:
+            entry = self._recent.get(daemon_id)
+            if entry is not None:
+                fetched_at, limit, memories = entry
+                self._recent[daemon_id] = (fetched_at, limit, ([memory] + memories)[:limit])
+            for key in [k for k in self._searches if k[0] == daemon_id]:
+                del self._searches[key]
+
+    def invalidate(self, daemon_id: Optional[str] = None) -> None:
+        with self._lock:
+            if daemon_id is None:
+                self._recent.clear()
+                self._searches.clear()
+                return
+            self._recent.pop(daemon_id, None)
+            for key in [k for k in self._searches if k[0] == daemon_id]:
+                del self._searches[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "daemons": len(self._recent),
+            "searches": len(self._searches),
+            "recentHits": MEMORY_CACHE_LOOKUPS.value(kind="recent", result="hit"),
+            "recentMisses": MEMORY_CACHE_LOOKUPS.value(kind="recent", result="miss"),
+            "searchHits": MEMORY_CACHE_LOOKUPS.value(kind="search", result="hit"),
+            "searchMisses": MEMORY_CACHE_LOOKUPS.value(kind="search", result="miss"),
+        }
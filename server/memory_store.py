@@ -0,0 +1,364 @@
+"""
+Storage backends for daemon memories.
+
+`HyperspellMemoryStore` talks to the hosted Hyperspell service.
+`SQLiteMemoryStore` keeps memories in a local SQLite database with an FTS5
+index ranked by BM25, scoped by daemon and ordered by timestamp, for
+millisecond queries and offline use. Backends raise on failure; the
+functions in `hyperspell_client` add caching and error handling on top.
+"""
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+Memories = List[Dict[str, Any]]
+
+
+class MemoryServiceUnavailable(Exception):
+    """Raised when the memory backend is not configured."""
+
+
+class MemoryStore(ABC):
+    """Per-daemon memory storage."""
+
+    name = "abstract"
+    # Threads used by the default recent_many
+    bulk_concurrency = 8
+
+    _bulk_executor: Optional[ThreadPoolExecutor] = None
+
+    @abstractmethod
+    def add(self, memory: Dict[str, Any]) -> None:
+        """Store a record built by hyperspell_client.build_daemon_memory."""
+
+    def add_many(self, memories: Sequence[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """
+        Store several records.
+
+        The default fans out to add() on a thread pool; backends with a
+        bulk write override it.
+
+        Returns:
+            Per record, None if it was stored or the exception it failed with
+
+        Raises:
+            MemoryServiceUnavailable: If the backend is not configured
+        """
+        futures = [self._executor().submit(self.add, memory) for memory in memories]
+        errors: List[Optional[Exception]] = []
+        for future in futures:
+            try:
+                future.result()
+            except MemoryServiceUnavailable:
+                raise
+            except Exception as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+        return errors
+
+    @abstractmethod
+    def recent(self, daemon_id: str, limit: int) -> Memories:
+        """Most recent memories of a daemon as {"content", "title"} dicts."""
+
+    @abstractmethod
+    def search(self, daemon_id: str, query: str, limit: int) -> Memories:
+        """Memories of a daemon ranked by relevance to `query`."""
+
+    def recent_many(self, daemon_ids: Sequence[str], limit: int) -> Dict[str, Memories]:
+        """
+        Recent memories for several daemons.
+
+        The default fans out to recent() on a thread pool. A daemon whose
+        fetch fails is logged and left out of the result, so one bad
+        daemon does not fail the others.
+        """
+        if not daemon_ids:
+            return {}
+        futures = {daemon_id: self._executor().submit(self.recent, daemon_id, limit) for daemon_id in daemon_ids}
+        results: Dict[str, Memories] = {}
+        for daemon_id, future in futures.items():
+            try:
+                results[daemon_id] = future.result()
+            except MemoryServiceUnavailable:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to fetch recent memories for daemon {daemon_id}: {e}")
+        return results
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._bulk_executor is None:
+            self._bulk_executor = ThreadPoolExecutor(
+                max_workers=self.bulk_concurrency, thread_name_prefix=f"memory-{self.name}",
+            )
+        return self._bulk_executor
+
+    def close(self) -> None:
+        if self._bulk_executor is not None:
+            self._bulk_executor.shutdown(wait=False)
+
+
+class HyperspellMemoryStore(MemoryStore):
+    """
+    Hosted Hyperspell backend.
+
+    Records carry the daemon both as their collection and as `daemon_id`
+    metadata. recent() lists the daemon's collection; search() passes a
+    metadata filter, since memories.search cannot take a collection. Both
+    are scoped server-side, so a full page is `limit` of the daemon's own
+    memories.
+    """
+
+    name = "hyperspell"
+    # Largest batch memories.add_bulk accepts
+    bulk_max_items = 100
+
+    def __init__(self, client_factory):
+        self._client_factory = client_factory
+
+    def _client(self):
+        client = self._client_factory()
+        if not client:
+            raise MemoryServiceUnavailable("Hyperspell client not available")
+        return client
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        self._client().memories.add(
+            text=memory["text"],
+            collection=memory["collection"],
+            title=memory["title"],
+            resource_id=memory.get("resource_id"),
+            metadata=self._metadata(memory),
+        )
+
+    @staticmethod
+    def _metadata(memory: Dict[str, Any]) -> Dict[str, str]:
+        daemon_id = memory.get("daemon_id") or memory["collection"].split("-", 1)[-1]
+        return {"daemon_id": daemon_id}
+
+    def add_many(self, memories: Sequence[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """One memories.add_bulk call per 100 records; a failed call fails its records."""
+        client = self._client()
+        errors: List[Optional[Exception]] = []
+        for i in range(0, len(memories), self.bulk_max_items):
+            chunk = memories[i:i + self.bulk_max_items]
+            items = []
+            for memory in chunk:
+                item = {
+                    "text": memory["text"],
+                    "collection": memory["collection"],
+                    "title": memory["title"],
+                    "metadata": self._metadata(memory),
+                }
+                if memory.get("resource_id"):
+                    item["resource_id"] = memory["resource_id"]
+                items.append(item)
+            try:
+                response = client.memories.add_bulk(items=items)
+            except Exception as e:
+                errors.extend([e] * len(chunk))
+                continue
+            for skipped in getattr(response, "skipped", None) or []:
+                # Not retryable: the resource id belongs to another user of the app
+                logger.warning(f"Hyperspell skipped memory {skipped.resource_id}: {skipped.reason}")
+            errors.extend([None] * len(chunk))
+        return errors
+
+    def recent(self, daemon_id: str, limit: int) -> Memories:
+        page = self._client().memories.list(collection=f"daemon-{daemon_id}", size=limit)
+        items = list(getattr(page, "items", None) or [])
+        # The listing order is not documented; callers expect newest first
+        items.sort(key=self._recency, reverse=True)
+        return [self._to_memory(item) for item in items[:limit]]
+
+    def search(self, daemon_id: str, query: str, limit: int) -> Memories:
+        if not query:
+            return self.recent(daemon_id, limit)
+        response = self._client().memories.search(
+            query=query,
+            max_results=limit,
+            options={"filter": {"daemon_id": daemon_id}},
+        )
+        # Older SDKs return `results`, current ones `documents`
+        results = getattr(response, "documents", None) or getattr(response, "results", None) or []
+        return [self._to_memory(r) for r in results[:limit]]
+
+    @staticmethod
+    def _recency(item: Any) -> float:
+        when = getattr(item, "ingested_at", None) or getattr(item, "document_date", None)
+        return when.timestamp() if when else 0.0
+
+    @staticmethod
+    def _to_memory(item: Any) -> Dict[str, Any]:
+        """Flatten a listed or scored Hyperspell document to {"content", "title"}."""
+        document = getattr(item, "document", None)
+        title = getattr(item, "title", None) or getattr(document, "title", None) or ""
+        content = (
+            getattr(item, "content", None)
+            or getattr(document, "text", None)
+            or getattr(item, "summary", None)
+        )
+        if not content and getattr(item, "chunks", None):
+            content = "\n".join(chunk.summary for chunk in item.chunks if chunk.summary)
+        return {"content": content or title, "title": title}
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class SQLiteMemoryStore(MemoryStore):
+    """Local backend: one table indexed by (daemon_id, created_at) plus an FTS5 index."""
+
+    name = "sqlite"
+    # resource_id makes replays of the same memory (spool, retries) no-ops
+    _INSERT = (
+        "INSERT OR IGNORE INTO memories (daemon_id, resource_id, title, content, created_at) "
+        "VALUES (?, ?, ?, ?, ?)"
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS memories (
+                id INTEGER PRIMARY KEY,
+                daemon_id TEXT NOT NULL,
+                resource_id TEXT UNIQUE,
+                title TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_memories_daemon_time ON memories (daemon_id, created_at DESC);
+            """
+        )
+        try:
+            self._conn.executescript(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+                    title, content, content='memories', content_rowid='id'
+                );
+                CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+                    INSERT INTO memories_fts (rowid, title, content) VALUES (new.id, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+                    INSERT INTO memories_fts (memories_fts, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                END;
+                """
+            )
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: search falls back to substring matching
+            logger.warning(f"FTS5 unavailable, memory search will use LIKE: {e}")
+            self.fts = False
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(self._INSERT, self._row(memory))
+
+    @staticmethod
+    def _row(memory: Dict[str, Any]) -> tuple:
+        timestamp = memory.get("timestamp")
+        created_at = timestamp / 1000.0 if timestamp else time.time()
+        return (memory["daemon_id"], memory.get("resource_id"), memory["title"], memory["text"], created_at)
+
+    def add_many(self, memories: Sequence[Dict[str, Any]]) -> List[Optional[Exception]]:
+        """All records in one transaction; if it fails, they all failed."""
+        rows = [self._row(memory) for memory in memories]
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(self._INSERT, rows)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                return [e] * len(rows)
+        return [None] * len(rows)
+
+    def recent(self, daemon_id: str, limit: int) -> Memories:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, content FROM memories WHERE daemon_id = ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (daemon_id, limit),
+            ).fetchall()
+        return [{"content": content, "title": title} for title, content in rows]
+
+    def recent_many(self, daemon_ids: Sequence[str], limit: int) -> Dict[str, Memories]:
+        """One indexed query for all daemons, keeping the newest `limit` of each."""
+        if not daemon_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in daemon_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT daemon_id, title, content FROM ("
+                "  SELECT daemon_id, title, content, created_at, ROW_NUMBER() OVER ("
+                "    PARTITION BY daemon_id ORDER BY created_at DESC"
+                "  ) AS rank FROM memories WHERE daemon_id IN (" + placeholders + ")"
+                ") WHERE rank <= ? ORDER BY daemon_id, created_at DESC",
+                (*daemon_ids, limit),
+            ).fetchall()
+        results: Dict[str, Memories] = {daemon_id: [] for daemon_id in daemon_ids}
+        for daemon_id, title, content in rows:
+            results[daemon_id].append({"content": content, "title": title})
+        return results
+
+    @staticmethod
+    def _match_expression(query: str) -> Optional[str]:
+        # Quote each token so user text cannot inject FTS5 syntax; any token may match
+        tokens = _TOKEN_RE.findall(query)
+        if not tokens:
+            return None
+        return " OR ".join(f'"{t}"' for t in tokens)
+
+    def search(self, daemon_id: str, query: str, limit: int) -> Memories:
+        match = self._match_expression(query or "")
+        if match is None:
+            return self.recent(daemon_id, limit)
+        if not self.fts:
+            return self._search_like(daemon_id, _TOKEN_RE.findall(query), limit)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT m.title, m.content FROM memories_fts "
+                "JOIN memories m ON m.id = memories_fts.rowid "
+                "WHERE memories_fts MATCH ? AND m.daemon_id = ? "
+                "ORDER BY bm25(memories_fts), m.created_at DESC LIMIT ?",
+                (match, daemon_id, limit),
+            ).fetchall()
+        return [{"content": content, "title": title} for title, content in rows]
+
+    def _search_like(self, daemon_id: str, tokens: List[str], limit: int) -> Memories:
+        clause = " OR ".join("content LIKE ?" for _ in tokens)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT title, content FROM memories WHERE daemon_id = ? AND ({clause}) "
+                "ORDER BY created_at DESC LIMIT ?",
+                (daemon_id, *(f"%{t}%" for t in tokens), limit),
+            ).fetchall()
+        return [{"content": content, "title": title} for title, content in rows]
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def default_sqlite_path() -> str:
+    return os.getenv(
+        "MEMORY_SQLITE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "memories.sqlite3"),
+    )
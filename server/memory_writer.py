@@ -0,0 +1,282 @@
+"""
+Background writer for daemon memories.
+
+Request handlers submit memory records and return immediately. A single
+background task collects them into batches, writes each batch with one bulk
+call from a worker thread and retries the records that failed with
+exponential backoff. Records that still
+fail, or that arrive while the in-process queue is full, are appended to a
+JSONL spool file from a worker thread. The spool is replayed on startup,
+whenever a write succeeds again after an outage, and whenever the queue
+drains while records are spooled. Each record carries the trace context it
+was submitted under, so its write is traced as part of that request.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+from tracing import TRACER, current_context
+
+logger = logging.getLogger(__name__)
+
+MEMORY_WRITES = REGISTRY.counter(
+    "memory_writes_total", "Memory records handled by the background writer", ("outcome",),
+)
+
+
+def default_spool_path() -> str:
+    return os.getenv(
+        "MEMORY_SPOOL_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_spool.jsonl"),
+    )
+
+
+class MemoryWriter:
+    """Bounded queue of memory records drained in batches by one background task."""
+
+    def __init__(
+        self,
+        write_fn: Callable[[List[Dict[str, Any]]], List[Optional[Exception]]],
+        spool_path: str,
+        max_queue: int = 1000,
+        batch_size: int = 20,
+        batch_wait: float = 0.5,
+        max_attempts: int = 4,
+        retry_base_seconds: float = 1.0,
+        spool_max_bytes: int = 50 * 1024 * 1024,
+        skip_errors: tuple = (),
+    ):
+        """
+        Args:
+            write_fn: Blocking call that writes a batch of records and returns,
+                per record, None or the exception it failed with
+            spool_path: JSONL file for records that could not be written
+            max_queue: In-memory records before new ones go straight to the spool
+            batch_size: Most records written per worker-thread hop
+            batch_wait: How long to wait for a batch to fill
+            max_attempts: Attempts per batch before spooling what is left
+            retry_base_seconds: First retry delay, doubled per attempt
+            spool_max_bytes: Spool size beyond which records are dropped
+            skip_errors: Exception types that mean "do not retry or spool"
+        """
+        self._write_fn = write_fn
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.spool_max_bytes = spool_max_bytes
+        self._skip_errors = skip_errors
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queue)
+        self._spool_lock = threading.Lock()
+        # Set once records are spooled, cleared when the spool is taken for replay
+        self._spool_dirty = False
+        self._inflight: List[Dict[str, Any]] = []
+        self._overflow: List[Dict[str, Any]] = []
+        self._overflow_task: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        # Cleared after a batch exhausts its retries; while unhealthy, batches
+        # get one attempt and go to the spool instead of backing off again
+        self.healthy = True
+
+    def submit(self, memory: Dict[str, Any]) -> None:
+        """Queue a record without blocking; overflow goes to the spool."""
+        trace = current_context()
+        if trace is not None:
+            memory = {**memory, "_trace": list(trace)}
+        try:
+            self._queue.put_nowait(memory)
+        except asyncio.QueueFull:
+            # Spooling does file I/O; hand it to a worker thread
+            self._overflow.append(memory)
+            if self._overflow_task is None or self._overflow_task.done():
+                self._overflow_task = asyncio.create_task(self._spool_overflow())
+
+    async def _spool_overflow(self) -> None:
+        # Records that overflow while a write is in progress go out with the next one
+        while self._overflow:
+            memories, self._overflow = self._overflow, []
+            await asyncio.to_thread(self._spool, memories)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        await self._replay_spool()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            was_healthy = self.healthy
+            await self._write_batch(batch)
+            if self.healthy and not was_healthy:
+                logger.info("Memory service recovered; replaying spool")
+                await self._replay_spool()
+            elif self.healthy and self._spool_dirty and self._queue.empty():
+                # Caught up after an overload; write what overflowed to the spool
+                await self._replay_spool()
+
+    def _write_all(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Write a batch in one call (worker thread); returns the records that failed."""
+        records = [{k: v for k, v in memory.items() if k != "_trace"} for memory in batch]
+        # The store call is traced under the first submitting request; every
+        # request gets its own memory.write span below
+        first_trace = next((memory["_trace"] for memory in batch if memory.get("_trace")), None)
+        started = time.perf_counter()
+        try:
+            with TRACER.span("memory.write_batch", parent=tuple(first_trace) if first_trace else None, records=len(batch)):
+                errors = self._write_fn(records)
+        except self._skip_errors:
+            MEMORY_WRITES.inc(len(batch), outcome="skipped")
+            return []
+        except Exception as e:
+            errors = [e] * len(batch)
+
+        failed: List[Dict[str, Any]] = []
+        last_error: Optional[Exception] = None
+        for memory, error in zip(batch, errors):
+            trace = memory.get("_trace")
+            TRACER.record(
+                "memory.write", started,
+                error=f"{type(error).__name__}: {error}" if error is not None else None,
+                parent=tuple(trace) if trace else None,
+                batch=len(batch),
+            )
+            if error is None:
+                MEMORY_WRITES.inc(outcome="written")
+            elif isinstance(error, self._skip_errors):
+                MEMORY_WRITES.inc(outcome="skipped")
+            else:
+                last_error = error
+                failed.append(memory)
+        if failed:
+            logger.warning(f"Failed to write {len(failed)}/{len(batch)} memories: {last_error}")
+        return failed
+
+    async def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        # _inflight is cleared only once the batch is written or handed to the spool, so a
+        # close() that cancels this mid-write or mid-backoff still spools it
+        self._inflight = batch
+        pending = batch
+        attempts = self.max_attempts if self.healthy else 1
+        for attempt in range(1, attempts + 1):
+            pending = await asyncio.to_thread(self._write_all, pending)
+            self._inflight = pending
+            if len(pending) < len(batch):
+                # At least one write went through
+                self.healthy = True
+            if not pending:
+                self._inflight = []
+                return
+            if attempt < attempts:
+                MEMORY_WRITES.inc(len(pending), outcome="retried")
+                await asyncio.sleep(self.retry_base_seconds * 2 ** (attempt - 1))
+        self.healthy = False
+        # The spool write finishes in its thread even if close() cancels us here
+        self._inflight = []
+        await asyncio.to_thread(self._spool, pending)
+
+    def _spool(self, memories: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(m, ensure_ascii=False) + "\n" for m in memories)
+        with self._spool_lock:
+            try:
+                size = os.path.getsize(self.spool_path) if os.path.exists(self.spool_path) else 0
+                if size + len(lines) > self.spool_max_bytes:
+                    MEMORY_WRITES.inc(len(memories), outcome="dropped")
+                    logger.error(f"Memory spool full; dropped {len(memories)} memories")
+                    return
+                with open(self.spool_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._spool_dirty = True
+            except OSError as e:
+                MEMORY_WRITES.inc(len(memories), outcome="dropped")
+                logger.error(f"Failed to spool {len(memories)} memories: {e}")
+                return
+        MEMORY_WRITES.inc(len(memories), outcome="spooled")
+
+    def _take_spool(self) -> List[Dict[str, Any]]:
+        """Move the spool aside and return its records (worker thread)."""
+        replay_path = self.spool_path + ".replay"
+        with self._spool_lock:
+            self._spool_dirty = False
+            # A replay interrupted by a crash left its file behind; pick it up first
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spool_path):
+                    return []
+                os.replace(self.spool_path, replay_path)
+        memories: List[Dict[str, Any]] = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    memories.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt memory spool line")
+        return memories
+
+    async def _replay_spool(self) -> None:
+        try:
+            memories = await asyncio.to_thread(self._take_spool)
+        except OSError as e:
+            logger.error(f"Failed to read memory spool: {e}")
+            return
+        if not memories:
+            return
+        logger.info(f"Replaying {len(memories)} spooled memories")
+        for i in range(0, len(memories), self.batch_size):
+            # Failures are spooled again by _write_batch
+            await self._write_batch(memories[i:i + self.batch_size])
+        os.remove(self.spool_path + ".replay")
+
+    async def close(self) -> None:
+        """Stop the writer and spool whatever has not been written yet."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._overflow_task is not None:
+            await asyncio.gather(self._overflow_task, return_exceptions=True)
+            self._overflow_task = None
+        leftover = list(self._inflight) + self._overflow
+        self._inflight = []
+        self._overflow = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+        if leftover:
+            logger.info(f"Spooling {len(leftover)} unwritten memories at shutdown")
+            await asyncio.to_thread(self._spool, leftover)
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            spool_bytes = os.path.getsize(self.spool_path)
+        except OSError:
+            spool_bytes = 0
+        return {
+            "depth": self._queue.qsize(),
+            "inflight": len(self._inflight),
+            "healthy": self.healthy,
+            "spoolBytes": spool_bytes,
+            **{
+                outcome: MEMORY_WRITES.value(outcome=outcome)
+                for outcome in ("written", "retried", "spooled", "dropped", "skipped")
+            },
+        }
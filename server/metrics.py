@@ -0,0 +1,270 @@
+"""
+Lightweight in-process metrics.
+
+Counters, gauges and fixed-bucket histograms keyed by label values. Metrics
+are registered once at import time in the module that owns them, read back
+through `snapshot()` and exported in the Prometheus text format by
+`render_prometheus()`.
+"""
+
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import math
+import threading
+import time
+
+# Seconds; covers sub-millisecond cache hits up to slow LLM calls
+DEFAULT_LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelKey = Tuple[str, ...]
+
+
+class Metric:
+    """Base class holding the name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: LabelKey) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: object) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        with self._lock:
+            items = list(self._values.items())
+        return [{"labels": self._labels(k), "value": v} for k, v in items]
+
+
+class Gauge(Metric):
+    """Value per label set that can go up and down, or be computed at read time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+        self._functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: object) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: object) -> None:
+        """Compute the value with `fn` whenever the gauge is read."""
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def value(self, **labels: object) -> float:
+        key = self._key(labels)
+        fn = self._functions.get(key)
+        return float(fn()) if fn is not None else self._values.get(key, 0.0)
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        out = [{"labels": self._labels(k), "value": v} for k, v in items]
+        for key, fn in functions:
+            try:
+                out.append({"labels": self._labels(key), "value": float(fn())})
+            except Exception:
+                # A broken callback must not break the whole export
+                continue
+        return out
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, num_buckets: int):
+        self.counts = [0] * (num_buckets + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    """Fixed-bucket histogram per label set with quantile estimates."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets))
+            series.counts[idx] += 1
+            series.count += 1
+            series.sum += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """Observe the duration of the block in seconds, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def buckets_snapshot(self) -> List[Tuple[Dict[str, str], List[int], int, float]]:
+        """Per label set: labels, per-bucket counts (last is +Inf), count and sum."""
+        with self._lock:
+            return [(self._labels(k), list(s.counts), s.count, s.sum) for k, s in self._series.items()]
+
+    def quantile(self, q: float, **labels: object) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        series = self._series.get(self._key(labels))
+        if series is None or series.count == 0:
+            return None
+        return self._quantile(series, q)
+
+    def _quantile(self, series: _HistogramSeries, q: float) -> float:
+        rank = q * series.count
+        seen = 0
+        for i, n in enumerate(series.counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        with self._lock:
+            items = [(k, s.count, s.sum, list(s.counts)) for k, s in self._series.items()]
+        out = []
+        for key, count, total, counts in items:
+            series = _HistogramSeries(len(self.buckets))
+            series.counts, series.count, series.sum = counts, count, total
+            out.append({
+                "labels": self._labels(key),
+                "count": count,
+                "sum": round(total, 6),
+                "p50": self._quantile(series, 0.5),
+                "p95": self._quantile(series, 0.95),
+                "p99": self._quantile(series, 0.99),
+            })
+        return out
+
+
+class Registry:
+    """Collection of named metrics; re-registering a name returns the existing metric."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def metrics(self) -> List[Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def render_prometheus(registry: Registry = REGISTRY) -> str:
+    """Render every metric in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for metric in sorted(registry.metrics(), key=lambda m: m.name):
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if isinstance(metric, Histogram):
+            for labels, counts, count, total in metric.buckets_snapshot():
+                cumulative = 0
+                for bound, n in zip(list(metric.buckets) + [math.inf], counts):
+                    cumulative += n
+                    le = "+Inf" if math.isinf(bound) else repr(float(bound))
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+        else:
+            for sample in metric.snapshot():
+                lines.append(f"{metric.name}{_format_labels(sample['labels'])} {_format_value(sample['value'])}")
+    return "\n".join(lines) + "\n"
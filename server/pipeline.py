@@ -0,0 +1,251 @@
+"""
+Small dependency graph runner for request pipelines.
+
+Stages are async callables with named dependencies. Each stage starts as
+soon as everything it depends on has finished, so independent stages run
+concurrently. If a foreground stage fails, the stages still running are
+cancelled and the error propagates to the caller, with `failed_stage`
+identifying where it came from. Background stages are started the same way
+but are not waited for; they are tracked so shutdown can drain them.
+
+Every run produces a timing report: per-stage offsets and durations, plus
+the critical path, i.e. the chain of stages that determined total latency
+and how much each one contributed to it. Reports are published to the
+`collect_timings()` sink of the current context, if any. Each stage also
+runs in a tracing span, so the calls it makes are grouped under it.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Set
+import asyncio
+import logging
+import time
+
+from metrics import REGISTRY
+from tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds", "Duration of pipeline stages", ("pipeline", "stage"),
+)
+STAGE_CRITICAL_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_critical_seconds", "Contribution of a stage to pipeline latency", ("pipeline", "stage"),
+)
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+_timing_sink: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("pipeline_timing_sink", default=None)
+
+# Background stages still running, drained on shutdown
+_background_tasks: Set[asyncio.Task] = set()
+
+
+class PipelineExit(Exception):
+    """Raised by a stage to finish the pipeline early with `value`."""
+
+    def __init__(self, value: Any):
+        super().__init__("pipeline exited early")
+        self.value = value
+
+
+@dataclass
+class _Stage:
+    name: str
+    fn: StageFn
+    deps: Sequence[str]
+    background: bool
+
+
+class StageGraph:
+    """A set of stages wired by dependencies, run once."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[str, _Stage] = {}
+        self._started: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+        self._t0 = 0.0
+        self.elapsed = 0.0
+        self.failed_stage: Optional[str] = None
+
+    def add(self, name: str, fn: StageFn, deps: Sequence[str] = (), background: bool = False) -> None:
+        """
+        Register a stage.
+
+        Args:
+            name: Stage name, also used in timing reports
+            fn: Coroutine function called with the results of completed stages
+            deps: Stages that must finish first
+            background: Start when ready but do not wait for it
+        """
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"stage {name} depends on unknown stage {dep}")
+        self._stages[name] = _Stage(name, fn, tuple(deps), background)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run all stages and return their results keyed by stage name.
+
+        Raises:
+            PipelineExit: If a stage ended the pipeline early
+            Exception: The first foreground stage failure
+        """
+        self._t0 = time.perf_counter()
+        results: Dict[str, Any] = {}
+        waiting = dict(self._stages)
+        running: Dict[asyncio.Task, str] = {}
+
+        def launch_ready() -> None:
+            for name, stage in list(waiting.items()):
+                if all(dep in results for dep in stage.deps):
+                    del waiting[name]
+                    self._started[name] = time.perf_counter()
+                    task = asyncio.create_task(self._run_stage(stage, results))
+                    if stage.background:
+                        _background_tasks.add(task)
+                        task.add_done_callback(lambda t, n=name: self._background_done(n, t))
+                    else:
+                        running[task] = name
+
+        try:
+            launch_ready()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    self._finished[name] = time.perf_counter()
+                    if task.cancelled():
+                        self.failed_stage = name
+                        raise asyncio.CancelledError()
+                    error = task.exception()
+                    if error is not None:
+                        if not isinstance(error, PipelineExit):
+                            self.failed_stage = name
+                        raise error
+                    results[name] = task.result()
+                launch_ready()
+            return results
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            self.elapsed = time.perf_counter() - self._t0
+            self._publish()
+
+    async def _run_stage(self, stage: _Stage, results: Dict[str, Any]) -> Any:
+        exited: Optional[PipelineExit] = None
+        with TRACER.span(f"{self.name}.{stage.name}", background=stage.background) as span:
+            try:
+                return await stage.fn(results)
+            except PipelineExit as e:
+                # An early exit is a result, not an error
+                span.set(exited=True)
+                exited = e
+        raise exited
+
+    def _background_done(self, name: str, task: asyncio.Task) -> None:
+        _background_tasks.discard(task)
+        duration = time.perf_counter() - self._started[name]
+        STAGE_SECONDS.observe(duration, pipeline=self.name, stage=name)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Background stage {self.name}.{name} failed: {task.exception()}")
+
+    def critical_path(self) -> List[Dict[str, Any]]:
+        """
+        Walk back from the last foreground stage to finish.
+
+        Each step follows the dependency that finished last, i.e. the one
+        the stage was actually waiting on. A stage's contribution is the
+        time between that dependency finishing and the stage finishing.
+        """
+        foreground = [n for n in self._finished if not self._stages[n].background]
+        if not foreground:
+            return []
+        path: List[Dict[str, Any]] = []
+        current: Optional[str] = max(foreground, key=lambda n: self._finished[n])
+        while current is not None:
+            deps = [d for d in self._stages[current].deps if d in self._finished]
+            previous = max(deps, key=lambda d: self._finished[d]) if deps else None
+            since = self._finished[previous] if previous else self._t0
+            path.append({"stage": current, "seconds": self._finished[current] - since})
+            current = previous
+        path.reverse()
+        return path
+
+    def report(self) -> Dict[str, Any]:
+        stages = {}
+        for name, started in self._started.items():
+            if self._stages[name].background:
+                continue
+            finished = self._finished.get(name)
+            stages[name] = {
+                "startMs": round((started - self._t0) * 1000, 2),
+                "durationMs": round((finished - started) * 1000, 2) if finished else None,
+            }
+        return {
+            "pipeline": self.name,
+            "totalMs": round(self.elapsed * 1000, 2),
+            "stages": stages,
+            "criticalPath": [
+                {"stage": step["stage"], "ms": round(step["seconds"] * 1000, 2)}
+                for step in self.critical_path()
+            ],
+            "failedStage": self.failed_stage,
+        }
+
+    def _publish(self) -> None:
+        for name, finished in self._finished.items():
+            if not self._stages[name].background:
+                STAGE_SECONDS.observe(finished - self._started[name], pipeline=self.name, stage=name)
+        for step in self.critical_path():
+            STAGE_CRITICAL_SECONDS.observe(step["seconds"], pipeline=self.name, stage=step["stage"])
+        sink = _timing_sink.get()
+        if sink is not None:
+            sink.append(self.report())
+
+
+@contextmanager
+def collect_timings() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the reports of pipelines run in the current context."""
+    sink: List[Dict[str, Any]] = []
+    token = _timing_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _timing_sink.reset(token)
+
+
+def server_timing(reports: List[Dict[str, Any]], extra: Optional[Dict[str, float]] = None) -> str:
+    """
+    Format stage durations as a Server-Timing header value.
+
+    Args:
+        reports: Pipeline reports from collect_timings()
+        extra: Additional metric name -> milliseconds entries
+    """
+    parts = [f"{name};dur={ms:.1f}" for name, ms in (extra or {}).items()]
+    for report in reports:
+        for name, stage in report["stages"].items():
+            if stage["durationMs"] is not None:
+                parts.append(f"{name};dur={stage['durationMs']:.1f}")
+        parts.append(f"{report['pipeline']};dur={report['totalMs']:.1f}")
+        if report.get("failedStage"):
+            parts.append(f'error;desc="{report["failedStage"]}"')
+    return ", ".join(parts)
+
+
+async def drain_background(timeout: float = 10.0) -> None:
+    """Wait for background stages to finish, cancelling any left after `timeout`."""
+    if not _background_tasks:
+        return
+    _done, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Cancelled {len(pending)} background stages at shutdown")
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,207 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it asks for it (see main._profile_trigger) or
+is picked by 1-in-N sampling. Two profilers are available:
+
+- "sample" (default): a background thread records the event loop thread's
+  stack every `interval` seconds into folded stacks ("a;b;c count"), the
+  input format of flamegraph.pl and speedscope. Overhead is one frame walk
+  per interval and nothing when no request is being profiled.
+- "cprofile": deterministic cProfile, much more overhead, one at a time.
+
+Both observe the whole event loop thread, so other requests running
+concurrently on the loop show up in the data. Blocking work handed to
+worker threads appears as the loop waiting ("(idle)").
+
+Finished profiles are kept in a bounded in-memory store for /debug/profiles.
+"""
+
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+
+# Innermost frames that mean the loop thread is waiting for I/O
+_IDLE_FUNCTIONS = {"select", "poll", "epoll", "_run_once"}
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer thread."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        self._thread.join()
+        return self._stacks
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack: List[str] = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack and stack[0].split(" ", 1)[0] in _IDLE_FUNCTIONS:
+                key = "(idle)"
+            else:
+                key = ";".join(reversed(stack))
+            self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+def _top_frames(folded: Dict[str, int], limit: int = 25) -> List[Dict[str, Any]]:
+    """Self and total sample counts per frame, by total."""
+    self_counts: Dict[str, int] = {}
+    total_counts: Dict[str, int] = {}
+    for stack, count in folded.items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] = self_counts.get(frames[-1], 0) + count
+        for frame in set(frames):
+            total_counts[frame] = total_counts.get(frame, 0) + count
+    ranked = sorted(total_counts.items(), key=lambda kv: kv[1], reverse=True)[:limit]
+    return [{"frame": f, "total": n, "self": self_counts.get(f, 0)} for f, n in ranked]
+
+
+def _cprofile_rows(profile: cProfile.Profile, limit: int = 40) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile, stream=io.StringIO())
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _callers) in stats.stats.items():  # type: ignore[attr-defined]
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        })
+    rows.sort(key=lambda r: r["cumtime"], reverse=True)
+    return rows[:limit]
+
+
+class Profiler:
+    """Decides which requests to profile, runs the profiler and keeps the results."""
+
+    def __init__(
+        self,
+        sample_every: int = 0,
+        interval: float = 0.005,
+        store_size: int = 20,
+        max_concurrent: int = 2,
+    ):
+        """
+        Args:
+            sample_every: Profile 1 in N eligible requests (0 disables sampling)
+            interval: Seconds between stack samples
+            store_size: Profiles kept for /debug/profiles
+            max_concurrent: Profiles running at once; extra requests run unprofiled
+        """
+        self.sample_every = sample_every
+        self.interval = interval
+        self.store_size = store_size
+        self.max_concurrent = max_concurrent
+        self._counter = itertools.count(1)
+        self._active = 0
+        self._cprofile_active = False
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.skipped = 0
+
+    def sampled(self) -> bool:
+        """Whether the next eligible request falls on the 1-in-N sample."""
+        return self.sample_every > 0 and next(self._counter) % self.sample_every == 0
+
+    @asynccontextmanager
+    async def profile(self, method: str, path: str, trigger: str, mode: str = "sample") -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Profile the enclosed block.
+
+        Yields the profile record (with its "id"), or None when too many
+        profiles are already running. The record is stored on exit.
+        """
+        if self._active >= self.max_concurrent:
+            self.skipped += 1
+            yield None
+            return
+        if mode == "cprofile" and self._cprofile_active:
+            mode = "sample"
+
+        record: Dict[str, Any] = {
+            "id": uuid.uuid4().hex[:12],
+            "method": method,
+            "path": path,
+            "trigger": trigger,
+            "mode": mode,
+            "startedAt": time.time(),
+        }
+        self._active += 1
+        sampler: Optional[StackSampler] = None
+        profile: Optional[cProfile.Profile] = None
+        if mode == "cprofile":
+            self._cprofile_active = True
+            profile = cProfile.Profile()
+            profile.enable()
+        else:
+            sampler = StackSampler(threading.get_ident(), self.interval)
+            sampler.start()
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["durationMs"] = round((time.perf_counter() - started) * 1000, 2)
+            if profile is not None:
+                profile.disable()
+                self._cprofile_active = False
+                record["functions"] = _cprofile_rows(profile)
+            if sampler is not None:
+                folded = sampler.stop()
+                record["samples"] = sampler.samples
+                record["intervalMs"] = self.interval * 1000
+                record["topFrames"] = _top_frames(folded)
+                record["folded"] = folded
+            self._active -= 1
+            self._store(record)
+
+    def _store(self, record: Dict[str, Any]) -> None:
+        self._profiles[record["id"]] = record
+        while len(self._profiles) > self.store_size:
+            self._profiles.popitem(last=False)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Newest first, without the profile data."""
+        keys = ("id", "method", "path", "trigger", "mode", "startedAt", "durationMs", "samples")
+        return [{k: p.get(k) for k in keys} for p in reversed(self._profiles.values())]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self._profiles.get(profile_id)
+
+    @staticmethod
+    def folded_text(record: Dict[str, Any]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted((record.get("folded") or {}).items()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stored": len(self._profiles),
+            "active": self._active,
+            "skipped": self.skipped,
+            "sampleEvery": self.sample_every,
+        }
@@ -69,6 +69,8 @@ class AnalyzeRequest(BaseModel):
     # If image feed (base64 or URL)
     imageUrl: Optional[str] = None
     imageBase64: Optional[str] = None
+    # Content-hash reference to an attachment already stored server-side
+    imageRef: Optional[str] = None
     currentTraits: PersonalityTraits = Field(default_factory=PersonalityTraits)
     dominantTrait: Optional[TraitKey] = None
     currentArchetypeId: Optional[str] = None
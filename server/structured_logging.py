@@ -0,0 +1,180 @@
+"""
+Structured logging setup and webhook payload capture.
+
+Log records are rendered as JSON lines (or plain text) by a background
+listener thread, so request handlers only pay for putting a record on a
+queue. Message arguments are formatted lazily, only when a record is
+actually emitted; only a traceback is rendered up front, while its frames
+still exist. Raw webhook bodies are kept in a bounded in-memory ring
+buffer instead of being serialized into the log.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from tracing import current_trace_id
+
+# Attributes present on every LogRecord; anything else came in through `extra`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line including `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that hands the record itself to the listener.
+
+    The stock prepare() formats the message on the calling thread and
+    drops exc_info, which loses `extra` fields and tracebacks for the
+    JSON formatter. Here the record keeps its msg, args and extra fields;
+    only the traceback is rendered into exc_text so no frames are kept alive.
+    """
+
+    _formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _add_trace_id(record: logging.LogRecord) -> bool:
+    # Read on the logging thread, before the record is handed to the listener
+    trace_id = current_trace_id()
+    if trace_id is not None and not hasattr(record, "traceId"):
+        record.traceId = trace_id
+    return True
+
+
+def configure_logging() -> None:
+    """
+    Install a queue-backed root handler.
+
+    Reads LOG_LEVEL (default INFO) and LOG_FORMAT ("json" or "text",
+    default "json"). Records logged during a traced request get its
+    `traceId`. Safe to call more than once. Pending records are
+    flushed at interpreter exit.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream.setFormatter(JsonFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    root = logging.getLogger()
+    handler = RecordQueueHandler(log_queue)
+    handler.addFilter(_add_trace_id)
+    root.addHandler(handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush pending records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class Sampler:
+    """Keep roughly `rate` of the events offered to it (0.0 - 1.0)."""
+
+    def __init__(self, rate: float):
+        self.rate = max(0.0, min(1.0, rate))
+
+    def hit(self) -> bool:
+        if self.rate >= 1.0:
+            return True
+        return self.rate > 0.0 and random.random() < self.rate
+
+
+class PayloadRingBuffer:
+    """
+    Bounded store of recent raw webhook bodies.
+
+    Bodies are kept as the original `bytes` objects, so capturing costs a
+    reference rather than a copy or a serialization. The oldest entries are
+    evicted once either the entry count or the total byte budget is exceeded.
+    """
+
+    def __init__(self, capacity: int = 50, max_bytes: int = 16 * 1024 * 1024):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self._entries: Deque[Dict[str, Any]] = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def capture(self, raw: bytes, **meta: Any) -> Optional[Dict[str, Any]]:
+        """
+        Store a raw body.
+
+        Returns:
+            The stored entry, so callers can fill in keys passed in `meta`
+            once they are known, or None if the body was not captured
+        """
+        if self.capacity <= 0 or len(raw) > self.max_bytes:
+            return None
+        entry = {"receivedAt": time.time(), "raw": raw, **meta}
+        with self._lock:
+            self._entries.append(entry)
+            self._bytes += len(raw)
+            while len(self._entries) > self.capacity or self._bytes > self.max_bytes:
+                self._bytes -= len(self._entries.popleft()["raw"])
+        return entry
+
+    def snapshot(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Return entries newest first, decoding bodies only at read time."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        if limit is not None:
+            entries = entries[:limit]
+        out = []
+        for e in entries:
+            item = {k: v for k, v in e.items() if k != "raw"}
+            item["size"] = len(e["raw"])
+            item["body"] = e["raw"].decode("utf-8", errors="replace")
+            out.append(item)
+        return out
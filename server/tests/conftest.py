@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The server modules are imported flat, as main.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,11 @@
+from idempotency import IdempotencyFilter
+
+
+def test_warm_marks_keys_as_possibly_seen():
+    dedup = IdempotencyFilter(lru_size=10, bloom_capacity=100)
+    dedup.warm(["feed-1", "feed-2"])
+    assert dedup.maybe_seen("feed-1")
+    assert dedup.maybe_seen("feed-2")
+    assert not dedup.maybe_seen("feed-3")
+    # Warmed ids have no remembered result; Convex still answers for them
+    assert dedup.lookup("feed-1") is None
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+
+from memory_writer import MemoryWriter
+
+
+def _failing_write(memories):
+    raise RuntimeError("memory service down")
+
+
+def _read_spool(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_close_during_backoff_spools_inflight_batch(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def scenario():
+        writer = MemoryWriter(_failing_write, spool, batch_wait=0.01, retry_base_seconds=30)
+        writer.start()
+        writer.submit({"text": "remember me"})
+        # Wait until the first attempt failed and the batch sits in backoff
+        for _ in range(200):
+            if writer.stats()["retried"] and writer.stats()["inflight"]:
+                break
+            await asyncio.sleep(0.01)
+        assert writer.stats()["inflight"] == 1
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(scenario())
+
+    assert _read_spool(spool) == [{"text": "remember me"}]
+    assert writer.stats()["inflight"] == 0
+
+
+def test_close_spools_queued_records(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+
+    async def scenario():
+        writer = MemoryWriter(_failing_write, spool)
+        writer.submit({"text": "never started"})
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert _read_spool(spool) == [{"text": "never started"}]
+
+
+def test_overflow_is_spooled_and_replayed_once_the_queue_drains(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    written = []
+
+    def slow_write(memories):
+        time.sleep(0.05)
+        written.extend(memory["text"] for memory in memories)
+        return [None] * len(memories)
+
+    async def scenario():
+        writer = MemoryWriter(slow_write, spool, max_queue=1, batch_size=1, batch_wait=0.01)
+        writer.start()
+        for i in range(4):
+            writer.submit({"text": f"m{i}"})
+        for _ in range(300):
+            if len(written) == 4:
+                break
+            await asyncio.sleep(0.01)
+        stats = writer.stats()
+        await writer.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert sorted(written) == ["m0", "m1", "m2", "m3"]
+    assert stats["spooled"] >= 2
+    assert not os.path.exists(spool)
+    assert not os.path.exists(spool + ".replay")
+
+
+def test_batch_is_written_in_one_call_and_only_failures_are_retried(tmp_path):
+    spool = str(tmp_path / "spool.jsonl")
+    calls = []
+
+    def flaky_write(memories):
+        calls.append([memory["text"] for memory in memories])
+        # "bad" fails on its first attempt only
+        return [
+            RuntimeError("rejected") if memory["text"] == "bad" and len(calls) == 1 else None
+            for memory in memories
+        ]
+
+    async def scenario():
+        writer = MemoryWriter(flaky_write, spool, batch_size=3, batch_wait=0.05, retry_base_seconds=0.01)
+        writer.start()
+        for text in ("a", "bad", "c"):
+            writer.submit({"text": text})
+        for _ in range(200):
+            if len(calls) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    assert calls == [["a", "bad", "c"], ["bad"]]
+    assert not os.path.exists(spool)
@@ -0,0 +1,34 @@
+import json
+import logging
+import queue
+
+from structured_logging import JsonFormatter, RecordQueueHandler
+
+
+def _log_through_queue(**kwargs):
+    log_queue = queue.Queue()
+    logger = logging.getLogger("test_structured_logging")
+    logger.propagate = False
+    handler = RecordQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.error("failed %s", "feed-1", **kwargs)
+    finally:
+        logger.removeHandler(handler)
+    return json.loads(JsonFormatter().format(log_queue.get_nowait()))
+
+
+def test_exc_info_survives_the_queue():
+    entry = _log_through_queue(exc_info=True, extra={"feedId": "feed-1"})
+    assert entry["msg"] == "failed feed-1"
+    assert entry["feedId"] == "feed-1"
+    assert "exc" in entry
+    assert "ValueError: boom" in entry["exc"]
+
+
+def test_record_without_exc_info_has_no_exc():
+    entry = _log_through_queue()
+    assert "exc" not in entry
@@ -0,0 +1,19 @@
+import json
+
+from tracing import JsonlExporter, Tracer
+
+
+def test_jsonl_exporter_writes_queued_spans_on_close(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    exporter = JsonlExporter(str(path))
+    tracer = Tracer()
+    tracer.add_exporter(exporter)
+    for i in range(200):
+        with tracer.span("work", index=i):
+            pass
+    tracer.close()
+
+    with open(path) as f:
+        spans = [json.loads(line) for line in f]
+    assert sorted(s["attributes"]["index"] for s in spans) == list(range(200))
+    assert exporter.dropped == 0
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import time
+
+from trait_coalescer import PendingDeltas, TraitCoalescer
+
+
+class FlakyConvex:
+    def __init__(self, fail: bool):
+        self.fail = fail
+        self.calls = []
+
+    async def mutation(self, name, args):
+        if self.fail:
+            raise RuntimeError("convex down")
+        self.calls.append((name, args))
+
+
+def test_close_spools_failed_flush_and_start_replays_it(tmp_path):
+    spool = str(tmp_path / "trait_spool.jsonl")
+
+    async def shutdown_while_down():
+        coalescer = TraitCoalescer(FlakyConvex(fail=True), window=30, spool_path=spool)
+        coalescer.add("d1", {"humor": 2}, 1000)
+        coalescer.add("d1", {"humor": 1, "chaos": 1}, 2000)
+        await coalescer.close()
+        return coalescer.stats()["daemons"]
+
+    assert asyncio.run(shutdown_while_down()) == 0
+    with open(spool) as f:
+        records = [json.loads(line) for line in f]
+    assert [(r["daemonId"], r["traits_delta"], r["feed_count"]) for r in records] == [
+        ("d1", {"humor": 3, "chaos": 1}, 2),
+    ]
+
+    convex = FlakyConvex(fail=False)
+
+    async def restart():
+        coalescer = TraitCoalescer(convex, window=30, spool_path=spool)
+        coalescer.start()
+        deadline = time.monotonic() + 5
+        while not convex.calls and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await coalescer.close()
+
+    asyncio.run(restart())
+    assert convex.calls == [(
+        "daemons:applyFeedDeltas",
+        {"daemonId": "d1", "traitsDelta": {"humor": 3, "chaos": 1}, "feedCount": 2, "now": 2000},
+    )]
+    assert not (tmp_path / "trait_spool.jsonl").exists()
+    assert not (tmp_path / "trait_spool.jsonl.replay").exists()
+
+
+def test_requeue_keeps_max_staleness(tmp_path):
+    coalescer = TraitCoalescer(
+        None, window=30, max_staleness=10, spool_path=str(tmp_path / "spool.jsonl"),
+    )
+    first_at = time.monotonic() - 5
+    coalescer._requeue("d1", PendingDeltas(traits_delta={"humor": 1}, feed_count=1, first_at=first_at))
+    assert coalescer._pending["d1"].due_at == first_at + 10
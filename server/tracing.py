@@ -0,0 +1,310 @@
+"""
+Request tracing with span timing.
+
+Every HTTP request opens a root span; code running under it opens child
+spans for the work worth seeing on a timeline (analysis, LLM provider
+calls, Convex queries and mutations, memory store calls). The current span
+lives in a context variable, so spans nest without being passed around,
+and asyncio tasks and asyncio.to_thread workers (which copy the context)
+attach to the request that started them. Work that outlives the request,
+such as background memory writes, carries the submitting span's
+(trace id, span id) and is parented to it explicitly.
+
+Finished spans go to the exporters: an in-memory store of recent traces
+for /debug/traces and, optionally, a JSONL file with one span per line.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import functools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# (trace id, span id) of a span, enough to parent work to it elsewhere
+SpanContext = Tuple[str, str]
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "duration_ms", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration_ms: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @property
+    def context(self) -> SpanContext:
+        return (self.trace_id, self.span_id)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentId": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "durationMs": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_context() -> Optional[SpanContext]:
+    span = _current_span.get()
+    return span.context if span is not None else None
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def annotate(**attributes: Any) -> None:
+    """Set attributes on the current span, if there is one."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """Read a W3C traceparent header ("00-<trace id>-<span id>-<flags>")."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return (parts[1], parts[2])
+
+
+class MemoryExporter:
+    """Keeps the spans of the most recent traces."""
+
+    def __init__(self, max_traces: int = 100):
+        self.max_traces = max_traces
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    def export(self, span: Span) -> None:
+        record = span.to_dict()
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(record)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Newest first: root span name, start, duration, span and error counts."""
+        with self._lock:
+            traces = [(trace_id, list(spans)) for trace_id, spans in self._traces.items()]
+        summaries = []
+        for trace_id, spans in reversed(traces):
+            root = next((s for s in spans if s["parentId"] is None), None) or min(spans, key=lambda s: s["start"])
+            summaries.append({
+                "traceId": trace_id,
+                "name": root["name"],
+                "start": root["start"],
+                "durationMs": root["durationMs"],
+                "spans": len(spans),
+                "errors": sum(1 for s in spans if s["status"] == "error"),
+            })
+        return summaries
+
+    def get(self, trace_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Spans of one trace ordered by start time."""
+        with self._lock:
+            spans = self._traces.get(trace_id)
+            return sorted(spans, key=lambda s: s["start"]) if spans is not None else None
+
+
+class JsonlExporter:
+    """
+    Appends each finished span as a JSON line to a file.
+
+    export() only puts the span on a bounded queue; a writer thread
+    serializes queued spans and appends them in batches through one open
+    file handle. Spans that arrive while the queue is full are dropped and
+    counted. close() writes out what is queued and stops the thread.
+    """
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(max_queue)
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span.to_dict())
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            while records[-1] is not None:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = records[-1] is None
+            lines = [json.dumps(r, default=str, ensure_ascii=False) + "\n" for r in records if r is not None]
+            try:
+                self._file.writelines(lines)
+                self._file.flush()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to write {len(lines)} spans to {self.path}: {e}")
+            if stop:
+                return
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out queued spans and close the file."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._file.close()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to the exporters."""
+
+    def __init__(self):
+        self.exporters: List[Any] = []
+        self.export_errors = 0
+
+    def add_exporter(self, exporter: Any) -> None:
+        self.exporters.append(exporter)
+
+    def close(self) -> None:
+        """Close the exporters that hold resources (files, threads)."""
+        for exporter in self.exporters:
+            close = getattr(exporter, "close", None)
+            if close is not None:
+                close()
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, **attributes: Any) -> Iterator[Span]:
+        """
+        Time the enclosed block as a span.
+
+        Args:
+            name: Span name, e.g. "convex.query"
+            parent: Explicit parent context; defaults to the current span.
+                A context from another service starts a local span in its trace.
+            **attributes: Initial span attributes
+
+        An exception escaping the block marks the span as an error and is re-raised.
+        """
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        trace_id = parent[0] if parent else uuid.uuid4().hex
+        span = Span(name, trace_id, parent[1] if parent else None, attributes)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            _current_span.reset(token)
+            self._export(span)
+
+    def record(
+        self,
+        name: str,
+        started: float,
+        error: Optional[str] = None,
+        parent: Optional[SpanContext] = None,
+        **attributes: Any,
+    ) -> Span:
+        """
+        Record an already finished operation as a child of the current span.
+
+        Args:
+            name: Span name
+            started: time.perf_counter() at the start of the operation
+            error: Error message if the operation failed
+            parent: Explicit parent context; defaults to the current span
+        """
+        elapsed = time.perf_counter() - started
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+        if parent is not None:
+            span = Span(name, parent[0], parent[1], attributes)
+        else:
+            span = Span(name, uuid.uuid4().hex, None, attributes)
+        span.start -= elapsed
+        span.duration_ms = round(elapsed * 1000, 3)
+        if error is not None:
+            span.status = "error"
+            span.error = error
+        self._export(span)
+        return span
+
+    def _export(self, span: Span) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                # Tracing must never fail the traced operation
+                self.export_errors += 1
+                if self.export_errors == 1:
+                    logger.warning(f"Span export failed: {e}")
+
+
+def traced(name: str, **attributes: Any) -> Callable:
+    """Decorator running a coroutine function inside a span."""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with TRACER.span(name, **attributes):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+TRACER = Tracer()
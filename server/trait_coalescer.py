@@ -0,0 +1,255 @@
+"""
+Write-behind coalescing of daemon trait deltas.
+
+With write-behind enabled, each feed is committed with
+`deferDaemonUpdate`, which records the completed feed but leaves the daemon
+document alone. Its trait deltas are merged here per daemon and applied with
+a single `daemons:applyFeedDeltas` mutation that carries the number of feeds,
+so the evolution counter still advances once per feed.
+
+A daemon's pending deltas are flushed once no new feed has arrived for
+`window` seconds, and never later than `max_staleness` seconds after the
+first unflushed feed; a failed flush is retried on the same schedule.
+`close()` flushes everything that is left and appends what still cannot be
+written to a JSONL spool, which the next `start()` replays.
+"""
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TRAIT_FLUSHES = REGISTRY.counter(
+    "trait_flushes_total", "Coalesced daemon trait writes", ("outcome",),
+)
+TRAIT_FLUSH_FEEDS = REGISTRY.histogram(
+    "trait_flush_feeds", "Feeds merged into one daemon trait write", (),
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+
+
+@dataclass
+class PendingDeltas:
+    traits_delta: Dict[str, int] = field(default_factory=dict)
+    feed_count: int = 0
+    first_at: float = 0.0
+    due_at: float = 0.0
+    now_ms: int = 0
+
+
+def default_spool_path() -> str:
+    return os.getenv(
+        "TRAIT_SPOOL_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "trait_spool.jsonl"),
+    )
+
+
+class TraitCoalescer:
+    """Per-daemon accumulator of trait deltas with a background flusher."""
+
+    def __init__(
+        self,
+        convex: Any,
+        index: Any = None,
+        window: float = 2.0,
+        max_staleness: float = 10.0,
+        spool_path: Optional[str] = None,
+        retry_seconds: float = 1.0,
+    ):
+        """
+        Args:
+            convex: AsyncConvex used for the flush mutation
+            index: Optional DaemonIndex told about unflushed deltas so that
+                subscription updates do not roll its cached traits back
+            window: Quiet period after the last feed before a flush
+            max_staleness: Upper bound on how long a delta may stay unflushed
+            spool_path: JSONL file for deltas that could not be flushed at shutdown
+            retry_seconds: Minimum gap between flush attempts for a daemon
+                whose writes keep failing past max_staleness
+        """
+        self._convex = convex
+        self._index = index
+        self.window = window
+        self.max_staleness = max_staleness
+        self.spool_path = spool_path or default_spool_path()
+        self.retry_seconds = retry_seconds
+        self._pending: Dict[str, PendingDeltas] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, daemon_id: str, traits_delta: Dict[str, int], now_ms: int) -> None:
+        """Merge one completed feed's deltas."""
+        mono = time.monotonic()
+        pending = self._pending.get(daemon_id)
+        if pending is None:
+            pending = self._pending[daemon_id] = PendingDeltas(first_at=mono)
+        self._merge(pending, traits_delta, 1, now_ms)
+        pending.due_at = min(mono + self.window, pending.first_at + self.max_staleness)
+        if self._index is not None:
+            self._index.hold(daemon_id, traits_delta)
+        self._wakeup.set()
+
+    @staticmethod
+    def _merge(pending: PendingDeltas, traits_delta: Dict[str, int], feed_count: int, now_ms: int) -> None:
+        for key, delta in traits_delta.items():
+            pending.traits_delta[key] = pending.traits_delta.get(key, 0) + delta
+        pending.feed_count += feed_count
+        pending.now_ms = max(pending.now_ms, now_ms)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        await self._replay_spool()
+        while True:
+            now = time.monotonic()
+            due = [d for d, p in self._pending.items() if p.due_at <= now]
+            if due:
+                await asyncio.gather(*(self._flush(d) for d in due))
+                continue
+            self._wakeup.clear()
+            next_due = min((p.due_at for p in self._pending.values()), default=None)
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=None if next_due is None else max(0.0, next_due - now),
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush(self, daemon_id: str) -> bool:
+        pending = self._pending.pop(daemon_id, None)
+        if pending is None:
+            return True
+        # Release before writing: a subscription update that lands after the
+        # commit must not have the deltas applied on top a second time
+        if self._index is not None:
+            self._index.release(daemon_id, pending.traits_delta)
+        args: Dict[str, Any] = {
+            "daemonId": daemon_id,
+            "traitsDelta": pending.traits_delta,
+            "feedCount": pending.feed_count,
+            "now": pending.now_ms,
+        }
+        try:
+            await self._convex.mutation("daemons:applyFeedDeltas", args)
+        except asyncio.CancelledError:
+            self._requeue(daemon_id, pending)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to flush {pending.feed_count} feeds for daemon {daemon_id}: {e}")
+            TRAIT_FLUSHES.inc(outcome="error")
+            self._requeue(daemon_id, pending)
+            return False
+        TRAIT_FLUSHES.inc(outcome="ok")
+        TRAIT_FLUSH_FEEDS.observe(pending.feed_count)
+        return True
+
+    def _requeue(self, daemon_id: str, failed: PendingDeltas) -> None:
+        """Put a failed flush back, merged with anything that arrived meanwhile."""
+        pending = self._pending.get(daemon_id)
+        if pending is None:
+            pending = self._pending[daemon_id] = PendingDeltas(first_at=failed.first_at)
+        else:
+            pending.first_at = min(pending.first_at, failed.first_at)
+        self._merge(pending, failed.traits_delta, failed.feed_count, failed.now_ms)
+        # Keep the staleness bound; once past it, retry at a steady pace
+        # instead of hammering a backend that is down
+        now = time.monotonic()
+        pending.due_at = max(
+            min(now + self.window, pending.first_at + self.max_staleness),
+            now + min(self.retry_seconds, self.window),
+        )
+        if self._index is not None:
+            self._index.hold(daemon_id, failed.traits_delta)
+
+    def _spool(self, pending: Dict[str, PendingDeltas]) -> None:
+        """Append unflushed deltas to the spool (worker thread)."""
+        lines = "".join(
+            json.dumps({"daemonId": daemon_id, **asdict(p)}, ensure_ascii=False) + "\n"
+            for daemon_id, p in pending.items()
+        )
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _take_spool(self) -> List[Dict[str, Any]]:
+        """Move the spool aside and return its records (worker thread)."""
+        replay_path = self.spool_path + ".replay"
+        # A replay interrupted by a crash left its file behind; pick it up first
+        if not os.path.exists(replay_path):
+            if not os.path.exists(self.spool_path):
+                return []
+            os.replace(self.spool_path, replay_path)
+        records: List[Dict[str, Any]] = []
+        with open(replay_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning("Skipping corrupt trait spool line")
+        return records
+
+    async def _replay_spool(self) -> None:
+        try:
+            records = await asyncio.to_thread(self._take_spool)
+        except OSError as e:
+            logger.error(f"Failed to read trait spool: {e}")
+            return
+        if not records:
+            return
+        logger.info(f"Replaying spooled trait deltas for {len(records)} daemons")
+        now = time.monotonic()
+        for record in records:
+            daemon_id = record["daemonId"]
+            failed = PendingDeltas(
+                traits_delta=record["traits_delta"],
+                feed_count=record["feed_count"],
+                first_at=now,
+                now_ms=record.get("now_ms", 0),
+            )
+            self._requeue(daemon_id, failed)
+            self._pending[daemon_id].due_at = now
+        # The deltas are pending in memory now, and close() spools them again
+        # if they still cannot be written
+        os.remove(self.spool_path + ".replay")
+
+    async def close(self) -> None:
+        """Stop the flusher, write out everything pending and spool what fails."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for daemon_id in list(self._pending):
+            await self._flush(daemon_id)
+        if not self._pending:
+            return
+        leftovers, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._spool, leftovers)
+        except OSError as e:
+            logger.error(f"Failed to spool trait deltas for {len(leftovers)} daemons: {e}")
+            return
+        logger.warning(f"Spooled unflushed trait deltas for {len(leftovers)} daemons")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "daemons": len(self._pending),
+            "feeds": sum(p.feed_count for p in self._pending.values()),
+            "oldestSeconds": round(max((now - p.first_at for p in self._pending.values()), default=0.0), 3),
+            "flushed": TRAIT_FLUSHES.value(outcome="ok"),
+            "failed": TRAIT_FLUSHES.value(outcome="error"),
+        }